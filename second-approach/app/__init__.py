@@ -54,6 +54,78 @@ def create_app():
     app.config['MAIL_PASSWORD'] = os.environ.get('MAIL_PASSWORD')
     app.config['MAIL_DEFAULT_SENDER'] = os.environ.get('MAIL_DEFAULT_SENDER')
 
+    # Per-process cache of the users Flask-Login loads on every request
+    app.config['USER_CACHE_SIZE'] = int(os.environ.get('USER_CACHE_SIZE') or 1024)
+    app.config['USER_CACHE_TTL'] = int(os.environ.get('USER_CACHE_TTL') or 300)  # seconds
+    app.config['MEMBERSHIP_CACHE_SIZE'] = int(os.environ.get('MEMBERSHIP_CACHE_SIZE') or 4096)
+    app.config['MEMBERSHIP_CACHE_TTL'] = int(os.environ.get('MEMBERSHIP_CACHE_TTL') or 30)  # seconds
+
+    # Drain the outbound mail queue in process every N seconds; 0 leaves delivery to `flask send-mail`
+    app.config['MAIL_QUEUE_INTERVAL'] = int(os.environ.get('MAIL_QUEUE_INTERVAL') or 10)
+
+    # Token-bucket limits per endpoint as (per user, per IP) rules, e.g. RATE_LIMIT_BOT_MESSAGE="10/minute,30/minute"
+    from .services.rate_limiter import DEFAULT_LIMITS
+    app.config['RATE_LIMIT_ENABLED'] = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    app.config['RATE_LIMIT_BACKEND'] = os.environ.get('RATE_LIMIT_BACKEND', 'memory')  # memory or database
+    app.config['RATE_LIMITS'] = {}
+    for name, rules in DEFAULT_LIMITS.items():
+        override = os.environ.get(f'RATE_LIMIT_{name.upper()}')
+        if override:
+            user_rule, _, ip_rule = override.partition(',')
+            rules = (user_rule, ip_rule or None)
+        app.config['RATE_LIMITS'][name] = rules
+
+    # Bounded concurrency, queue and wait per expensive pool, e.g. ADMISSION_BOT_GENERATION="8,32,10"
+    from .services.admission import DEFAULT_POOLS, parse_pool
+    app.config['ADMISSION_ENABLED'] = os.environ.get('ADMISSION_ENABLED', 'true').lower() == 'true'
+    app.config['ADMISSION_POOLS'] = {
+        name: parse_pool(os.environ[f'ADMISSION_{name.upper()}']) if os.environ.get(f'ADMISSION_{name.upper()}') else limits
+        for name, limits in DEFAULT_POOLS.items()
+    }
+
+    # Bearer token for /metrics; the endpoint is disabled (404) without one
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+
+    # Users allowed to use admin-only ops endpoints
+    app.config['ADMIN_EMAILS'] = {
+        email.strip().lower() for email in os.environ.get('ADMIN_EMAILS', '').split(',') if email.strip()
+    }
+
+    # Opt-in sampling profiler: a share of requests, slow requests, or the next N on demand
+    app.config['PROFILE_ENABLED'] = os.environ.get('PROFILE_ENABLED', 'false').lower() == 'true'
+    app.config['PROFILE_SAMPLE_RATE'] = float(os.environ.get('PROFILE_SAMPLE_RATE') or 0)
+    app.config['PROFILE_SLOW_MS'] = int(os.environ.get('PROFILE_SLOW_MS') or 0)  # 0 = off
+    app.config['PROFILE_INTERVAL_MS'] = float(os.environ.get('PROFILE_INTERVAL_MS') or 5)
+    app.config['PROFILE_MAX_FILES'] = int(os.environ.get('PROFILE_MAX_FILES') or 200)
+    app.config['PROFILE_DIR'] = os.environ.get('PROFILE_DIR', os.path.join(app.instance_path, 'profiles'))
+
+    # Bot DM memory: the last N exchanges verbatim plus a rolling summary, within a token budget
+    app.config['BOT_MEMORY_TURNS'] = int(os.environ.get('BOT_MEMORY_TURNS') or 4)
+    app.config['BOT_MEMORY_TOKENS'] = int(os.environ.get('BOT_MEMORY_TOKENS') or 1200)
+
+    # Per-process buffer of each hot channel's newest serialized messages for polls (0 = off)
+    app.config['MESSAGE_BUFFER_SIZE'] = int(os.environ.get('MESSAGE_BUFFER_SIZE') or 200)  # messages per channel
+    app.config['MESSAGE_BUFFER_MAX_BYTES'] = int(os.environ.get('MESSAGE_BUFFER_MAX_BYTES') or 64 * 1024 * 1024)
+
+    # Upper bound on items accepted by one bulk message request
+    app.config['BULK_MAX_MESSAGES'] = int(os.environ.get('BULK_MAX_MESSAGES') or 5000)
+
+    # Cold storage for months of messages older than the retention window
+    app.config['MESSAGE_ARCHIVE_DIR'] = os.environ.get(
+        'MESSAGE_ARCHIVE_DIR', os.path.join(app.instance_path, 'archive')
+    )
+    app.config['MESSAGE_RETENTION_MONTHS'] = int(os.environ.get('MESSAGE_RETENTION_MONTHS') or 12)
+    app.config['MESSAGE_PARTITIONS_AHEAD'] = int(os.environ.get('MESSAGE_PARTITIONS_AHEAD') or 3)
+
+    # Background maintenance: purge expired links and tombstones, refresh statistics
+    app.config['TOMBSTONE_GRACE_DAYS'] = int(os.environ.get('TOMBSTONE_GRACE_DAYS') or 7)
+    app.config['MAIL_RETENTION_DAYS'] = int(os.environ.get('MAIL_RETENTION_DAYS') or 7)  # sent/failed outbox rows
+    app.config['MAINTENANCE_INTERVAL'] = int(os.environ.get('MAINTENANCE_INTERVAL') or 0)  # seconds, 0 = off
+
+    # Fingerprinted, precompressed CSS/JS; built at startup unless ASSETS_BUILD=false
+    app.config['ASSETS_BUILD'] = os.environ.get('ASSETS_BUILD', 'true').lower() == 'true'
+    app.config['ASSETS_DIR'] = os.environ.get('ASSETS_DIR', os.path.join(app.instance_path, 'assets'))
+
     # Initialize extensions
     db.init_app(app)
     login_manager.init_app(app)
@@ -62,7 +134,8 @@ def create_app():
     login_manager.login_message = "Please log in to access this page."
 
     # Import models to ensure they are registered with SQLAlchemy
-    from .models import User, Channel, Message, MagicLink, ChannelMembership
+    from .models import User, Channel, Message, MagicLink, ChannelMembership, OutboundEmail, RateLimitBucket, BotConversation
+    from .models import AnalyticsRollup, AnalyticsChannelRollup, AnalyticsActiveUser, AnalyticsWatermark
 
     # Initialize database tables
     with app.app_context():
@@ -70,27 +143,85 @@ def create_app():
             app.logger.info("Creating database tables...")
             db.create_all()
             app.logger.info("Database tables created successfully")
-            # Ensure bot exists
-            ensure_bot_exists()
+            # Ensure bot exists and resolve its identity once per process
+            bot = ensure_bot_exists()
+            app.config['BOT_USER_ID'] = bot.id
+
+            from .migrations import upgrade_schema
+            upgrade_schema(app)
+
+            from .services.message_search import init_app as init_message_search
+            init_message_search(app)
         except Exception as e:
             app.logger.error(f"Error during database initialization: {e}")
             db.session.rollback()
             raise
 
+    from .services.user_cache import user_cache, init_app as init_user_cache
+    init_user_cache(app)
+
+    from .services.membership_cache import init_app as init_membership_cache
+    init_membership_cache(app)
+
+    from .services.rate_limiter import init_app as init_rate_limiter
+    init_rate_limiter(app)
+
+    from .services.bot_memory import init_app as init_bot_memory
+    init_bot_memory(app)
+
+    from .services.message_buffer import init_app as init_message_buffer
+    init_message_buffer(app)
+
+    from .services.admission import init_app as init_admission
+    init_admission(app)
+
     @login_manager.user_loader
     def load_user(user_id):
-        from .models import User
-        return User.query.get(int(user_id))
+        return user_cache.get(int(user_id), lambda uid: User.query.get(uid))
 
     # Import routes INSIDE create_app to avoid circular imports.
     from .routes.channel_routes import channel_bp
     from .routes.message_routes import message_bp
     from .routes.auth_routes import auth_bp
+    from .routes.ops_routes import ops_bp
+    from .routes.search_routes import search_bp
+    from .routes.analytics_routes import analytics_bp
     
     # Register blueprints
     app.register_blueprint(channel_bp, url_prefix='/api')
     app.register_blueprint(message_bp, url_prefix='/api')
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
+    app.register_blueprint(ops_bp, url_prefix='/api/ops')
+    app.register_blueprint(search_bp, url_prefix='/api')
+    app.register_blueprint(analytics_bp, url_prefix='/api/analytics')
+
+    # Request timing, query counts and /metrics; must come before compression
+    from .metrics import init_app as init_metrics
+    init_metrics(app)
+
+    from .profiling import init_app as init_profiling
+    init_profiling(app)
+
+    # Compress JSON responses
+    from .compression import init_app as init_compression
+    init_compression(app)
+
+    from .assets import init_app as init_assets
+    init_assets(app)
+
+    # Register CLI commands
+    from .cli import register_commands
+    register_commands(app)
+
+    # Start the background mail sender if enabled
+    if app.config['MAIL_QUEUE_INTERVAL'] > 0:
+        from .services.mail_queue import sender
+        sender.start(app, app.config['MAIL_QUEUE_INTERVAL'])
+
+    # Start the in-process maintenance scheduler if enabled
+    if app.config['MAINTENANCE_INTERVAL'] > 0:
+        from .services.maintenance import scheduler
+        scheduler.start(app, app.config['MAINTENANCE_INTERVAL'])
 
     # Define routes
     @app.route('/')
@@ -0,0 +1,142 @@
+# app/assets.py
+# Fingerprinted, precompressed static assets
+
+"""
+build_assets() copies every CSS/JS file under app/static to ASSETS_DIR as
+<name>.<content hash><ext>, next to .gz and (when brotli is installed) .br
+variants, and records logical -> hashed names in manifest.json. It runs at
+startup (ASSETS_BUILD) and as `flask build-assets`; unchanged files are not
+rewritten.
+
+Templates link assets with asset_url('js/main.js'). /assets/ serves the
+best precompressed variant the client accepts with a one-year immutable
+Cache-Control: a new build changes the URL, so browsers never revalidate.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import tempfile
+
+from flask import abort, request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = ('.css', '.js')
+MANIFEST = 'manifest.json'
+MAX_AGE = 365 * 24 * 3600
+
+
+def _write_atomic(path, data):
+    """Workers may build concurrently at startup; never expose a partial file"""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def build_assets(static_folder, output_dir):
+    """Fingerprint and precompress the static files; returns the manifest"""
+    previous = load_manifest(output_dir)
+    manifest = {}
+    for root, _, files in os.walk(static_folder):
+        for name in sorted(files):
+            if not name.endswith(EXTENSIONS):
+                continue
+            source = os.path.join(root, name)
+            logical = os.path.relpath(source, static_folder).replace(os.sep, '/')
+            with open(source, 'rb') as f:
+                data = f.read()
+
+            stem, ext = os.path.splitext(logical)
+            hashed = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+            manifest[logical] = hashed
+
+            target = os.path.join(output_dir, hashed)
+            if os.path.exists(target) and (brotli is None or os.path.exists(target + '.br')):
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            # mtime=0 keeps the .gz bytes identical across builds
+            _write_atomic(target + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli is not None:
+                _write_atomic(target + '.br', brotli.compress(data, quality=11))
+            _write_atomic(target, data)
+            logger.info(f"Built asset {logical} -> {hashed}")
+
+    os.makedirs(output_dir, exist_ok=True)
+    _write_atomic(os.path.join(output_dir, MANIFEST), json.dumps(manifest, indent=2).encode('utf-8'))
+    # Keep the previous build too: pages rendered before a deploy still reference it
+    prune(output_dir, set(manifest.values()) | set(previous.values()))
+    return manifest
+
+
+def prune(output_dir, keep):
+    for root, _, files in os.walk(output_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            base = os.path.relpath(path, output_dir).replace(os.sep, '/')
+            for suffix in ('.gz', '.br'):
+                if base.endswith(suffix):
+                    base = base[:-len(suffix)]
+            if name != MANIFEST and not name.startswith('.tmp-') and base not in keep:
+                os.remove(path)
+
+
+def load_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def init_app(app):
+    app.config.setdefault('ASSETS_DIR', os.path.join(app.instance_path, 'assets'))
+    app.config.setdefault('ASSETS_BUILD', True)
+    output_dir = app.config['ASSETS_DIR']
+
+    if app.config['ASSETS_BUILD']:
+        manifest = build_assets(app.static_folder, output_dir)
+    else:
+        manifest = load_manifest(output_dir)
+    hashed_names = set(manifest.values())
+
+    @app.template_global()
+    def asset_url(filename):
+        """URL of the fingerprinted file; plain /static/ if it wasn't built"""
+        hashed = manifest.get(filename)
+        if hashed is None:
+            return url_for('static', filename=filename)
+        return url_for('assets', filename=hashed)
+
+    @app.route('/assets/<path:filename>', endpoint='assets')
+    def serve_asset(filename):
+        if filename not in hashed_names:
+            abort(404)
+
+        accepted = request.accept_encodings
+        encoding = None
+        if accepted['br'] and os.path.exists(os.path.join(output_dir, filename + '.br')):
+            encoding = 'br'
+        elif accepted['gzip'] and os.path.exists(os.path.join(output_dir, filename + '.gz')):
+            encoding = 'gzip'
+        suffix = {'br': '.br', 'gzip': '.gz'}.get(encoding, '')
+
+        response = send_from_directory(
+            output_dir, filename + suffix,
+            mimetype=mimetypes.guess_type(filename)[0],
+            max_age=MAX_AGE
+        )
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = f'public, max-age={MAX_AGE}, immutable'
+        return response
@@ -0,0 +1,231 @@
+# app/cli.py
+# Operator commands, run with `flask --app app.main <command>`
+
+import json
+import sys
+import time
+from itertools import chain
+
+import click
+
+from . import db
+
+
+def register_commands(app):
+    """Attach the CLI commands to the app"""
+
+    @app.cli.command('import-messages')
+    @click.argument('channel_id', type=int)
+    @click.argument('path', type=click.File('r', encoding='utf-8'))
+    @click.option('--batch-size', default=1000, show_default=True,
+                  help='Messages per INSERT/commit.')
+    @click.option('--create-users', is_flag=True,
+                  help='Create users for unknown user_email values.')
+    @click.option('--max-errors', default=20, show_default=True,
+                  help='How many item errors to print.')
+    def import_messages(channel_id, path, batch_size, create_users, max_errors):
+        """
+        Import messages into a channel from NDJSON (one object per line) or a
+        JSON array. Each object takes content, created_at and user_email;
+        items without user_email are authored by the channel creator.
+        """
+        from .models import Channel
+        from .services.message_ingest import ingest_messages
+
+        channel = db.session.get(Channel, channel_id)
+        if channel is None:
+            raise click.ClickException(f"Channel {channel_id} not found")
+
+        started = time.perf_counter()
+        inserted = failed = 0
+        errors = []
+
+        for offset, items in _read_chunks(path, batch_size):
+            results = ingest_messages(
+                channel_id,
+                items,
+                default_user_id=channel.creator_id,
+                allow_authors=True,
+                create_users=create_users,
+                batch_size=batch_size
+            )
+            for result in results:
+                if 'id' in result:
+                    inserted += 1
+                else:
+                    failed += 1
+                    if len(errors) < max_errors:
+                        errors.append((offset + result['index'], result['error']))
+            click.echo(f"{inserted + failed} processed ({inserted} inserted, {failed} failed)", err=True)
+
+        elapsed = time.perf_counter() - started
+        for index, error in errors:
+            click.echo(f"item {index}: {error}", err=True)
+        click.echo(json.dumps({
+            "channel_id": channel_id,
+            "inserted": inserted,
+            "failed": failed,
+            "seconds": round(elapsed, 3),
+            "messages_per_second": round(inserted / elapsed, 1) if elapsed else None
+        }))
+
+    @app.cli.command('export-messages')
+    @click.argument('channel_id', type=int)
+    @click.option('--output', '-o', type=click.Path(dir_okay=False),
+                  help='File to write; defaults to stdout.')
+    @click.option('--gzip', 'use_gzip', is_flag=True, help='Gzip the output.')
+    @click.option('--include-deleted', is_flag=True, help='Include soft-deleted messages.')
+    @click.option('--chunk-size', default=1000, show_default=True,
+                  help='Rows fetched per cursor round-trip.')
+    def export_messages(channel_id, output, use_gzip, include_deleted, chunk_size):
+        """Stream a channel's messages, with authors and reactions, as NDJSON"""
+        from .models import Channel
+        from .services.message_archive import iter_archived_records
+        from .services.message_export import iter_export_records, iter_ndjson, iter_gzip
+
+        if db.session.get(Channel, channel_id) is None:
+            raise click.ClickException(f"Channel {channel_id} not found")
+
+        started = time.perf_counter()
+        count = 0
+
+        def counted(records):
+            nonlocal count
+            for record in records:
+                count += 1
+                yield record
+
+        records = chain(
+            iter_archived_records(app.config['MESSAGE_ARCHIVE_DIR'], channel_id),
+            iter_export_records(channel_id, chunk_size=chunk_size, include_deleted=include_deleted)
+        )
+        chunks = iter_ndjson(counted(records))
+        if use_gzip:
+            chunks = iter_gzip(chunks)
+
+        out = open(output, 'wb') if output else sys.stdout.buffer
+        try:
+            for chunk in chunks:
+                out.write(chunk)
+        finally:
+            if output:
+                out.close()
+            else:
+                out.flush()
+
+        elapsed = time.perf_counter() - started
+        click.echo(f"Exported {count} messages in {elapsed:.2f}s", err=True)
+
+    @app.cli.command('partition-messages')
+    def partition_messages():
+        """
+        One-off: convert messages into a monthly partitioned table (Postgres only).
+        Takes an exclusive lock on messages while rows are copied.
+        """
+        from .services.message_partitions import convert_to_partitioned, is_supported
+
+        if not is_supported():
+            raise click.ClickException("Message partitioning requires Postgres")
+
+        started = time.perf_counter()
+        if convert_to_partitioned(months_ahead=app.config['MESSAGE_PARTITIONS_AHEAD']):
+            click.echo(f"Partitioned messages in {time.perf_counter() - started:.2f}s")
+        else:
+            click.echo("messages is already partitioned")
+
+    @app.cli.command('ensure-partitions')
+    def ensure_message_partitions():
+        """Create monthly message partitions for the coming months"""
+        from .services.message_partitions import ensure_partitions
+
+        created = ensure_partitions(months_ahead=app.config['MESSAGE_PARTITIONS_AHEAD'])
+        click.echo(json.dumps({"created": created}))
+
+    @app.cli.command('archive-messages')
+    @click.option('--retention-months', type=int, default=None,
+                  help='Keep this many whole months hot (default MESSAGE_RETENTION_MONTHS).')
+    def archive_messages(retention_months):
+        """Move months older than the retention window to compressed archive files"""
+        from .services.message_archive import archive_older_than
+
+        if retention_months is None:
+            retention_months = app.config['MESSAGE_RETENTION_MONTHS']
+
+        started = time.perf_counter()
+        summaries = archive_older_than(app.config['MESSAGE_ARCHIVE_DIR'], retention_months)
+        click.echo(json.dumps({
+            "months": summaries,
+            "seconds": round(time.perf_counter() - started, 3)
+        }))
+
+    @app.cli.command('maintenance')
+    def maintenance():
+        """Purge expired magic links and old tombstones, then refresh statistics"""
+        from .services.maintenance import run_maintenance
+
+        click.echo(json.dumps(run_maintenance(app)))
+
+    @app.cli.command('rollup-analytics')
+    def rollup_analytics_command():
+        """Fold every settled new message and reaction into the analytics rollups"""
+        from .services.analytics import rollup_analytics
+
+        started = time.perf_counter()
+        folded = rollup_analytics(app, max_batches=None)
+        click.echo(json.dumps({"rows": folded, "seconds": round(time.perf_counter() - started, 3)}))
+
+    @app.cli.command('send-mail')
+    def send_mail():
+        """Deliver every due email in the outbox"""
+        from .services.mail_queue import drain_outbox, queue_depth
+
+        sent = drain_outbox(app)
+        click.echo(json.dumps({"sent": sent, "pending": queue_depth()}))
+
+    @app.cli.command('build-assets')
+    def build_assets_command():
+        """Fingerprint and precompress static CSS/JS into ASSETS_DIR"""
+        from .assets import build_assets
+
+        click.echo(json.dumps(build_assets(app.static_folder, app.config['ASSETS_DIR'])))
+
+
+def _read_chunks(stream, size):
+    """Yield (offset, items) chunks from an NDJSON stream or a JSON array"""
+    first = stream.read(1)
+    while first and first.isspace():
+        first = stream.read(1)
+
+    if first == '[':
+        items = json.loads(first + stream.read())
+        for start in range(0, len(items), size):
+            yield start, items[start:start + size]
+        return
+
+    chunk = []
+    offset = 0
+    lines = _prepend(first, stream)
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            chunk.append(json.loads(line))
+        except ValueError:
+            # Keep the slot so indexes still line up; validation rejects it
+            chunk.append(None)
+        if len(chunk) >= size:
+            yield offset, chunk
+            offset += len(chunk)
+            chunk = []
+    if chunk:
+        yield offset, chunk
+
+
+def _prepend(first, stream):
+    """Iterate lines of stream with an already-consumed first character restored"""
+    if not first:
+        return
+    rest = stream.readline()
+    yield first + rest
+    yield from stream
@@ -0,0 +1,44 @@
+# app/compression.py
+# Compress JSON API responses for clients that accept it
+
+import gzip
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+MIN_SIZE = 512
+COMPRESSIBLE = ('application/json', 'text/html', 'text/plain')
+
+
+def init_app(app):
+    app.config.setdefault('COMPRESS_LEVEL', 6)
+
+    @app.after_request
+    def compress_response(response):
+        if (response.status_code != 200
+                or response.direct_passthrough
+                or response.is_streamed
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE):
+            return response
+
+        data = response.get_data()
+        if len(data) < MIN_SIZE:
+            return response
+
+        accepted = request.accept_encodings
+        if brotli is not None and accepted['br']:
+            response.set_data(brotli.compress(data, quality=4))
+            response.headers['Content-Encoding'] = 'br'
+        elif accepted['gzip']:
+            response.set_data(gzip.compress(data, compresslevel=app.config['COMPRESS_LEVEL']))
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            return response
+
+        response.vary.add('Accept-Encoding')
+        return response
@@ -0,0 +1,337 @@
+# app/metrics.py
+# Per-request timing, SQL query counts and a Prometheus /metrics endpoint
+
+"""
+Every request records its latency, SQL query count and time, and response
+size per route. Totals go to in-process histograms, and a Server-Timing
+header reports the current request: `db` is the time spent in SQL and
+`json` the time spent serializing.
+
+GET /metrics renders those histograms together with the existing cache,
+mail queue, rate limiter and maintenance stats in Prometheus text format.
+It is served only to scrapers sending `Authorization: Bearer <token>`
+with METRICS_TOKEN; without a configured token it answers 404.
+
+The hooks add a couple of perf_counter() calls per query and a few dict
+updates per request, so they stay on in production. Other modules publish
+their own series with registry.histogram() / registry.counter().
+"""
+
+import bisect
+import hmac
+import threading
+import time
+
+from flask import Response, abort, current_app, g, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            series = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._series.items()]
+        for labels, counts, total, count in sorted(series):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = _format_labels(self.labelnames, labels, ('le', _format_value(float(bound))))
+                yield f"{self.name}_bucket{le} {cumulative}"
+            le = _format_labels(self.labelnames, labels, ('le', '+Inf'))
+            yield f"{self.name}_bucket{le} {count}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}"
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Registry:
+    """Owned metrics plus collectors that turn other modules' stats into samples"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._get_or_create(Histogram, name, help, labelnames, buckets)
+
+    def counter(self, name, help, labelnames=()):
+        return self._get_or_create(Counter, name, help, labelnames)
+
+    def add_collector(self, collector):
+        """
+        collector() yields (name, type, help, samples) where each sample is
+        (labels dict, value) or (labels dict, value, name suffix such as '_bucket')
+        """
+        if collector not in self._collectors:
+            self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.collect())
+        for collector in self._collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                current_app.logger.error(f"Metrics collector {collector.__name__} failed: {str(e)}")
+                continue
+            for name, kind, help, samples in families:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for sample in samples:
+                    labels, value = sample[0], sample[1]
+                    if value is None:
+                        continue
+                    suffix = sample[2] if len(sample) > 2 else ''
+                    names = tuple(labels)
+                    formatted = _format_labels(names, tuple(labels[n] for n in names))
+                    lines.append(f"{name}{suffix}{formatted} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+request_latency = registry.histogram(
+    'chat_http_request_duration_seconds', 'Time spent handling a request', ('method', 'route', 'status')
+)
+request_queries = registry.histogram(
+    'chat_http_request_queries', 'SQL statements executed per request', ('method', 'route'), QUERY_BUCKETS
+)
+request_query_time = registry.histogram(
+    'chat_http_request_query_seconds', 'Time spent in SQL per request', ('method', 'route')
+)
+response_size = registry.histogram(
+    'chat_http_response_size_bytes', 'Response body size after compression', ('method', 'route'), SIZE_BUCKETS
+)
+background_queries = registry.counter(
+    'chat_background_queries_total', 'SQL statements executed outside requests'
+)
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Default JSON provider that adds the time spent in dumps() to the request"""
+
+    def dumps(self, obj, **kwargs):
+        if not has_request_context():
+            return super().dumps(obj, **kwargs)
+        started = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            g._metrics_json = g.get('_metrics_json', 0.0) + time.perf_counter() - started
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_metrics_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['_metrics_started'].pop()
+    if has_request_context() and '_metrics_start' in g:
+        g._metrics_queries += 1
+        g._metrics_query_time += time.perf_counter() - started
+    else:
+        background_queries.inc()
+
+
+def _handle_error(exception_context):
+    # after_cursor_execute doesn't fire for failed statements; keep the stack balanced
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('_metrics_started'):
+        connection.info['_metrics_started'].pop()
+
+
+def collect_service_stats():
+    """Expose the stats the ops endpoints already compute"""
+    from .services.user_cache import user_cache
+    from .services.channel_flags import bot_dm_flags
+    from .services.membership_cache import membership_cache
+    from .services.message_buffer import message_buffer
+    from .services.rate_limiter import rate_limiter
+    from .services.maintenance import scheduler
+    from .services.admission import admission
+
+    caches = {
+        'user': user_cache.stats(),
+        'bot_dm_flags': bot_dm_flags.stats(),
+        'membership': membership_cache.stats(),
+        'message_buffer': message_buffer.stats(),
+    }
+    for key, kind in (('hits', 'counter'), ('misses', 'counter'), ('evictions', 'counter'),
+                      ('invalidations', 'counter'), ('reloads', 'counter'),
+                      ('size', 'gauge'), ('max_size', 'gauge')):
+        samples = [({'cache': name}, stats[key]) for name, stats in caches.items() if key in stats]
+        suffix = '_total' if kind == 'counter' else ''
+        yield f'chat_cache_{key}{suffix}', kind, f'Per-process cache {key.replace("_", " ")}', samples
+
+    pools = admission.stats()['pools']
+    yield 'chat_admission_in_flight', 'gauge', 'Jobs holding an admission slot', [
+        ({'pool': name}, pool['in_flight']) for name, pool in sorted(pools.items())
+    ]
+    yield 'chat_admission_queue_depth', 'gauge', 'Jobs waiting for an admission slot', [
+        ({'pool': name}, pool['waiting']) for name, pool in sorted(pools.items())
+    ]
+
+    limits = rate_limiter.stats()
+    yield 'chat_rate_limit_allowed_total', 'counter', 'Requests allowed by the rate limiter', [({}, limits['allowed'])]
+    yield 'chat_rate_limit_limited_total', 'counter', 'Requests refused with 429', [
+        ({'limit': name}, count) for name, count in sorted(limits['limited'].items())
+    ]
+
+    status = scheduler.status()
+    yield 'chat_maintenance_leader', 'gauge', 'Whether this worker runs maintenance', [({}, int(status['is_leader']))]
+    report = status['last_report'] or {'tasks': []}
+    yield 'chat_maintenance_task_seconds', 'gauge', 'Duration of each task in the last maintenance run', [
+        ({'task': task['task']}, task['seconds']) for task in report['tasks']
+    ]
+    yield 'chat_maintenance_task_rows', 'gauge', 'Rows handled by each task in the last maintenance run', [
+        ({'task': task['task']}, task.get('rows')) for task in report['tasks']
+    ]
+
+
+def collect_mail_stats():
+    from .services import mail_queue
+
+    snapshot = mail_queue.stats.snapshot()
+    yield 'chat_mail_sent_total', 'counter', 'Emails delivered by this process', [({}, snapshot['sent'])]
+    yield 'chat_mail_retried_total', 'counter', 'Email attempts scheduled for retry', [({}, snapshot['retried'])]
+    yield 'chat_mail_failed_total', 'counter', 'Emails given up on', [({}, snapshot['failed'])]
+    yield 'chat_mail_queue_depth', 'gauge', 'Pending emails in the outbox', [({}, mail_queue.queue_depth())]
+
+    # The mail queue keeps a non-cumulative histogram; Prometheus wants cumulative buckets
+    with mail_queue.stats._lock:
+        buckets = list(mail_queue.stats.latency_buckets)
+        total = mail_queue.stats.latency_sum
+    cumulative = 0
+    samples = []
+    for bound, count in zip(mail_queue.LATENCY_BUCKETS, buckets):
+        cumulative += count
+        samples.append(({'le': _format_value(float(bound))}, cumulative, '_bucket'))
+    samples.append(({'le': '+Inf'}, sum(buckets), '_bucket'))
+    samples.append(({}, total, '_sum'))
+    samples.append(({}, sum(buckets), '_count'))
+    yield 'chat_mail_delivery_seconds', 'histogram', 'Time from enqueue to delivery', samples
+
+
+def init_app(app):
+    app.config.setdefault('METRICS_TOKEN', None)
+    app.json = TimedJSONProvider(app)
+
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+
+    registry.add_collector(collect_service_stats)
+    registry.add_collector(collect_mail_stats)
+
+    @app.before_request
+    def start_timer():
+        g._metrics_start = time.perf_counter()
+        g._metrics_queries = 0
+        g._metrics_query_time = 0.0
+
+    # Registered before compression, so it runs after it and sees the final size
+    @app.after_request
+    def record_request(response):
+        started = g.pop('_metrics_start', None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        route = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+        method = request.method
+
+        request_latency.observe(elapsed, method, route, str(response.status_code))
+        request_queries.observe(g._metrics_queries, method, route)
+        request_query_time.observe(g._metrics_query_time, method, route)
+        if response.content_length is not None:
+            response_size.observe(response.content_length, method, route)
+
+        timings = [
+            f'app;dur={elapsed * 1000:.2f}',
+            f'db;dur={g._metrics_query_time * 1000:.2f};desc="{g._metrics_queries} queries"',
+        ]
+        if '_metrics_json' in g:
+            timings.append(f'json;dur={g._metrics_json * 1000:.2f}')
+        response.headers.add('Server-Timing', ', '.join(timings))
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        token = app.config['METRICS_TOKEN']
+        if not token:
+            # Deny by default: route names, queue depths and user counts aren't public
+            abort(404)
+        supplied = request.headers.get('Authorization', '').encode()
+        if not hmac.compare_digest(supplied, f'Bearer {token}'.encode()):
+            abort(401)
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
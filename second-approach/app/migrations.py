@@ -0,0 +1,71 @@
+# app/migrations.py
+
+"""
+Idempotent schema upgrades applied at startup.
+
+db.create_all() only creates missing tables, so databases created before a
+column or index existed need it added here. Each COLUMNS entry is (table,
+column, DDL type, backfill); backfill runs once, right after the column is
+added. INDEXES entries are (name, table, columns).
+"""
+
+import logging
+from sqlalchemy import inspect, text
+
+from . import db
+
+logger = logging.getLogger(__name__)
+
+
+def backfill_bot_dm_flags(app):
+    """Flag existing DM channels that include the bot user"""
+    db.session.execute(text(
+        "UPDATE channels SET is_bot_dm = :flag "
+        "WHERE is_dm = :flag AND id IN ("
+        "  SELECT channel_id FROM channel_memberships WHERE user_id = :bot_id"
+        ")"
+    ), {"flag": True, "bot_id": app.config['BOT_USER_ID']})
+
+
+def backfill_read_watermarks(app):
+    """Treat everything already posted as read, so upgrading doesn't flood users with unread counts"""
+    db.session.execute(text(
+        "UPDATE channel_memberships SET last_read_message_id = ("
+        "  SELECT MAX(id) FROM messages WHERE messages.channel_id = channel_memberships.channel_id"
+        ")"
+    ))
+
+
+COLUMNS = [
+    ('channels', 'is_bot_dm', 'BOOLEAN DEFAULT FALSE', backfill_bot_dm_flags),
+    ('channels', 'change_seq', 'INTEGER NOT NULL DEFAULT 0', None),
+    ('channel_memberships', 'last_read_message_id', 'INTEGER', backfill_read_watermarks),
+    ('messages', 'generation_ms', 'INTEGER', None),
+]
+
+INDEXES = [
+    ('ix_messages_channel_created', 'messages', 'channel_id, created_at'),
+    ('ix_messages_channel_id', 'messages', 'channel_id, id'),
+]
+
+
+def upgrade_schema(app):
+    """Add any columns and indexes missing from existing tables"""
+    inspector = inspect(db.engine)
+    existing = {}
+    for table, column, ddl, backfill in COLUMNS:
+        if table not in existing:
+            existing[table] = {col['name'] for col in inspector.get_columns(table)}
+        if column in existing[table]:
+            continue
+
+        logger.info(f"Adding column {table}.{column}")
+        db.session.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+        if backfill:
+            backfill(app)
+        db.session.commit()
+        existing[table].add(column)
+
+    for name, table, columns in INDEXES:
+        db.session.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+    db.session.commit()
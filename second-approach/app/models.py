@@ -33,6 +33,11 @@ class Channel(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     deleted_at = db.Column(db.DateTime, nullable=True)
     is_dm = db.Column(db.Boolean, default=False)
+    # Set at creation for DMs that include the bot, so posting doesn't have to
+    # look up memberships to decide whether the bot should answer
+    is_bot_dm = db.Column(db.Boolean, default=False)
+    # Bumped with every message/reaction write; validator for message polling
+    change_seq = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     def __repr__(self):
         return f'<Channel {self.id} - {self.name} (is_dm={self.is_dm})>'
@@ -50,6 +55,8 @@ class ChannelMembership(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     channel_id = db.Column(db.Integer, db.ForeignKey('channels.id'), nullable=False)
     joined_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Newest message this user has read here; see services/read_state.py
+    last_read_message_id = db.Column(db.Integer, nullable=True)
 
     def __repr__(self):
         return f'<ChannelMembership user={self.user_id}, channel={self.channel_id}>'
@@ -64,10 +71,19 @@ class Message(db.Model):
     content = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     deleted_at = db.Column(db.DateTime, nullable=True)
+    # Bot replies only: how long the LLM took to answer, for analytics rollups
+    generation_ms = db.Column(db.Integer, nullable=True)
 
     # Add relationship to reactions
     reactions = db.relationship('MessageReaction', backref='message', lazy='dynamic')
 
+    __table_args__ = (
+        # Channel history reads (polling, export) are ordered by time within a channel
+        db.Index('ix_messages_channel_created', 'channel_id', 'created_at'),
+        # Unread counts range-scan ids above each member's read watermark
+        db.Index('ix_messages_channel_id', 'channel_id', 'id'),
+    )
+
     def __repr__(self):
         return f'<Message {self.id} by User {self.user_id} in Channel {self.channel_id}>'
 
@@ -103,3 +119,109 @@ class MagicLink(db.Model):
     def __repr__(self):
         return f'<MagicLink {self.id} - User {self.user_id}>'
 
+
+
+class OutboundEmail(db.Model):
+    """
+    Durable outbox for mail. Requests enqueue rows here and return; the
+    background sender in services/mail_queue.py delivers them with retries.
+    """
+    __tablename__ = 'outbound_emails'
+
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.Text, nullable=False)  # blanked once sent or failed
+    status = db.Column(db.String(16), nullable=False, default='pending')  # pending, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_outbound_emails_due', 'status', 'next_attempt_at'),
+    )
+
+    def __repr__(self):
+        return f'<OutboundEmail {self.id} to {self.recipient} ({self.status})>'
+
+
+class BotConversation(db.Model):
+    """Rolling summary of a bot DM's older turns; see services/bot_memory.py"""
+    __tablename__ = 'bot_conversations'
+
+    channel_id = db.Column(db.Integer, db.ForeignKey('channels.id'), primary_key=True)
+    summary = db.Column(db.Text, nullable=False, default='')
+    # Id of the newest message folded into the summary
+    summarized_through_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<BotConversation channel={self.channel_id} through={self.summarized_through_id}>'
+
+
+class RateLimitBucket(db.Model):
+    """Token buckets shared by every worker when RATE_LIMIT_BACKEND=database"""
+    __tablename__ = 'rate_limit_buckets'
+
+    key = db.Column(db.String(255), primary_key=True)
+    tokens = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.Float, nullable=False)  # unix time of the last take
+    allowed = db.Column(db.Boolean, nullable=False, default=True)  # outcome of the last take
+
+    def __repr__(self):
+        return f'<RateLimitBucket {self.key} ({self.tokens:.2f})>'
+
+
+class AnalyticsRollup(db.Model):
+    """Usage totals per hour or day; maintained by services/analytics.py"""
+    __tablename__ = 'analytics_rollups'
+
+    period = db.Column(db.String(8), primary_key=True)  # hour or day
+    start = db.Column(db.DateTime, primary_key=True)
+    messages = db.Column(db.Integer, nullable=False, default=0)
+    reactions = db.Column(db.Integer, nullable=False, default=0)
+    active_users = db.Column(db.Integer, nullable=False, default=0)
+    bot_replies = db.Column(db.Integer, nullable=False, default=0)
+    # Latency covers the replies that recorded generation_ms
+    bot_latency_count = db.Column(db.Integer, nullable=False, default=0)
+    bot_latency_ms_total = db.Column(db.BigInteger, nullable=False, default=0)
+    bot_latency_ms_max = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<AnalyticsRollup {self.period} {self.start}>'
+
+
+class AnalyticsChannelRollup(db.Model):
+    """Messages and reactions per channel per hour"""
+    __tablename__ = 'analytics_channel_rollups'
+
+    channel_id = db.Column(db.Integer, primary_key=True)
+    start = db.Column(db.DateTime, primary_key=True)
+    messages = db.Column(db.Integer, nullable=False, default=0)
+    reactions = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<AnalyticsChannelRollup channel={self.channel_id} {self.start}>'
+
+
+class AnalyticsActiveUser(db.Model):
+    """Who was already counted as active in a period; pruned once the period is settled"""
+    __tablename__ = 'analytics_active_users'
+
+    period = db.Column(db.String(8), primary_key=True)
+    start = db.Column(db.DateTime, primary_key=True)
+    user_id = db.Column(db.Integer, primary_key=True)
+
+
+class AnalyticsWatermark(db.Model):
+    """Highest row id of a source table already folded into the rollups"""
+    __tablename__ = 'analytics_watermarks'
+
+    source = db.Column(db.String(32), primary_key=True)
+    last_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<AnalyticsWatermark {self.source} through {self.last_id}>'
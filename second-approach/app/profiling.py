@@ -0,0 +1,291 @@
+# app/profiling.py
+# Opt-in sampling profiler for production requests
+
+"""
+With PROFILE_ENABLED set, a sampler thread snapshots the stacks of requests
+in flight every PROFILE_INTERVAL_MS. A request is kept and written out when
+it was picked by PROFILE_SAMPLE_RATE, took longer than PROFILE_SLOW_MS, or
+was claimed by an admin through POST /api/ops/profile ("profile the next N
+requests"). Everything else is discarded when it finishes.
+
+Profiles go to PROFILE_DIR as collapsed-stack files (<name>.folded, one
+"frame;frame;frame count" line per stack), readable by flamegraph.pl and
+speedscope, each with a <name>.json sidecar holding the route, timing and
+reason. Only the newest PROFILE_MAX_FILES profiles are kept.
+
+Under gevent all requests share one OS thread, so a request that is parked
+on I/O is sampled from its greenlet's suspended frame; time spent waiting
+on the database or OpenAI therefore shows up in its own stacks.
+"""
+
+import json
+import logging
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+from flask import g, request
+from flask_login import current_user
+
+logger = logging.getLogger(__name__)
+
+try:
+    from gevent import monkey as _monkey
+except ImportError:  # gevent is only installed for the production server
+    _monkey = None
+
+
+def _original(module, name):
+    """The unpatched stdlib object, so the sampler is a real OS thread even under gevent"""
+    if _monkey is not None and _monkey.is_module_patched(module):
+        return _monkey.get_original(module, name)
+    return getattr(__import__(module), name)
+
+
+def _current_greenlet():
+    if _monkey is None or not _monkey.is_module_patched('threading'):
+        return None
+    import greenlet
+    return greenlet.getcurrent()
+
+
+class ProfiledRequest:
+    def __init__(self, thread_id, greenlet, reason):
+        self.thread_id = thread_id
+        self.greenlet = greenlet
+        self.reason = reason
+        self.stacks = {}
+        self.samples = 0
+
+
+class StackSampler:
+    """Samples the stacks of every tracked request on a fixed interval"""
+
+    def __init__(self):
+        self.interval = 0.005
+        self._active = {}
+        self._lock = _original('_thread', 'allocate_lock')()
+        self._thread = None
+        self._labels = {}
+
+    def start(self, interval):
+        self.interval = interval
+        if self._thread is not None:
+            return
+        self._thread = _original('threading', 'Thread')(
+            target=self._loop, name='profiler', daemon=True
+        )
+        self._thread.start()
+
+    def track(self, reason):
+        tracked = ProfiledRequest(_original('_thread', 'get_ident')(), _current_greenlet(), reason)
+        with self._lock:
+            self._active[id(tracked)] = tracked
+        return tracked
+
+    def untrack(self, tracked):
+        with self._lock:
+            self._active.pop(id(tracked), None)
+
+    def _loop(self):
+        sleep = _original('time', 'sleep')
+        while True:
+            sleep(self.interval)
+            # Held while sampling so untrack() never sees a request's stacks mid-update
+            with self._lock:
+                if self._active:
+                    self.sample(list(self._active.values()))
+
+    def sample(self, active):
+        frames = sys._current_frames()
+        for tracked in active:
+            frame = None
+            if tracked.greenlet is not None:
+                # A parked greenlet keeps its frame; a running one is the thread's current frame
+                frame = tracked.greenlet.gr_frame
+            if frame is None:
+                frame = frames.get(tracked.thread_id)
+            if frame is None:
+                continue
+            stack = self._collapse(frame)
+            tracked.stacks[stack] = tracked.stacks.get(stack, 0) + 1
+            tracked.samples += 1
+
+    def _collapse(self, frame):
+        labels = []
+        while frame is not None:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                filename = code.co_filename
+                for prefix in sys.path:
+                    if prefix and filename.startswith(prefix):
+                        filename = filename[len(prefix):].lstrip(os.sep)
+                        break
+                label = self._labels[code] = f"{code.co_name} ({filename}:{code.co_firstlineno})"
+            labels.append(label)
+            frame = frame.f_back
+        labels.reverse()
+        return ';'.join(labels)
+
+
+class Profiler:
+    def __init__(self):
+        self.sampler = StackSampler()
+        self.enabled = False
+        self.sample_rate = 0.0
+        self.slow_seconds = 0.0
+        self.directory = None
+        self.max_files = 200
+        self._forced = 0
+        self._forced_route = None
+        self._lock = _original('_thread', 'allocate_lock')()
+
+    def configure(self, enabled, sample_rate, slow_ms, interval_ms, directory, max_files):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_ms / 1000
+        self.directory = directory
+        self.max_files = max_files
+        if enabled:
+            os.makedirs(directory, exist_ok=True)
+            self.sampler.start(interval_ms / 1000)
+
+    def profile_next(self, count, route=None):
+        """Force profiling of the next `count` requests, optionally only for one route"""
+        with self._lock:
+            self._forced = count
+            self._forced_route = route
+
+    def _claim_forced(self, route):
+        with self._lock:
+            if self._forced <= 0 or (self._forced_route and self._forced_route != route):
+                return False
+            self._forced -= 1
+            return True
+
+    def begin(self, route):
+        if self._claim_forced(route):
+            return self.sampler.track('requested')
+        if self.sample_rate and random.random() < self.sample_rate:
+            return self.sampler.track('sampled')
+        if self.slow_seconds:
+            return self.sampler.track('watch')
+        return None
+
+    def finish(self, tracked, elapsed, metadata):
+        self.sampler.untrack(tracked)
+        reason = tracked.reason
+        if reason == 'watch':
+            if elapsed < self.slow_seconds:
+                return None
+            reason = 'slow'
+        if not tracked.samples:
+            return None
+        return self.write(tracked, reason, elapsed, metadata)
+
+    def write(self, tracked, reason, elapsed, metadata):
+        stamp = datetime.utcnow()
+        slug = ''.join(c if c.isalnum() else '_' for c in metadata['route']).strip('_') or 'root'
+        name = f"{stamp:%Y%m%dT%H%M%S%f}-{metadata['method'].lower()}-{slug}-{int(elapsed * 1000)}ms"
+        base = os.path.join(self.directory, name)
+
+        with open(base + '.folded', 'w') as f:
+            for stack, count in sorted(tracked.stacks.items()):
+                f.write(f"{stack} {count}\n")
+        with open(base + '.json', 'w') as f:
+            json.dump(dict(
+                metadata,
+                name=name,
+                reason=reason,
+                duration_ms=round(elapsed * 1000, 2),
+                samples=tracked.samples,
+                interval_ms=round(self.sampler.interval * 1000, 2),
+                recorded_at=stamp.isoformat(),
+            ), f)
+
+        from .metrics import registry
+        registry.counter('chat_profiles_written_total', 'Request profiles written', ('reason',)).inc(1, reason)
+        self._prune()
+        logger.info(f"Wrote {reason} profile {name} ({tracked.samples} samples)")
+        return name
+
+    def _prune(self):
+        names = sorted(n[:-len('.json')] for n in os.listdir(self.directory) if n.endswith('.json'))
+        for name in names[:-self.max_files] if len(names) > self.max_files else []:
+            for ext in ('.folded', '.json'):
+                try:
+                    os.remove(os.path.join(self.directory, name + ext))
+                except FileNotFoundError:
+                    pass
+
+    def recent(self, limit=50):
+        """Metadata of the newest profiles, newest first"""
+        if not self.directory or not os.path.isdir(self.directory):
+            return []
+        names = sorted((n for n in os.listdir(self.directory) if n.endswith('.json')), reverse=True)[:limit]
+        results = []
+        for name in names:
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    results.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return results
+
+    def status(self):
+        with self._lock:
+            forced, route = self._forced, self._forced_route
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "slow_ms": self.slow_seconds * 1000,
+            "pending_requested": forced,
+            "requested_route": route,
+        }
+
+
+def init_app(app):
+    profiler.configure(
+        enabled=app.config['PROFILE_ENABLED'],
+        sample_rate=app.config['PROFILE_SAMPLE_RATE'],
+        slow_ms=app.config['PROFILE_SLOW_MS'],
+        interval_ms=app.config['PROFILE_INTERVAL_MS'],
+        directory=app.config['PROFILE_DIR'],
+        max_files=app.config['PROFILE_MAX_FILES'],
+    )
+    if not profiler.enabled:
+        return
+
+    @app.before_request
+    def start_profile():
+        route = request.url_rule.rule if request.url_rule is not None else None
+        if route is None or route.startswith('/static') or route == '/metrics':
+            return
+        tracked = profiler.begin(route)
+        if tracked is not None:
+            g._profile = (tracked, time.perf_counter(), route)
+
+    @app.teardown_request
+    def finish_profile(exc):
+        state = g.pop('_profile', None)
+        if state is None:
+            return
+        tracked, started, route = state
+        try:
+            profiler.finish(tracked, time.perf_counter() - started, {
+                "route": route,
+                "method": request.method,
+                "path": request.path,
+                "query": request.query_string.decode('utf-8', 'replace'),
+                "user_id": current_user.get_id() if current_user else None,
+                "error": repr(exc) if exc else None,
+            })
+        except Exception as e:
+            logger.error(f"Could not write profile: {str(e)}")
+
+
+# Create a singleton instance
+profiler = Profiler()
@@ -0,0 +1,59 @@
+# app/routes/analytics_routes.py
+
+from flask import Blueprint, request, jsonify, current_app
+from flask_login import login_required, current_user
+
+from ..services.analytics import MAX_BUCKETS, PERIODS, usage_series, channel_series, freshness
+from ..services.membership_cache import membership_cache
+from .ops_routes import admin_required
+
+analytics_bp = Blueprint('analytics_bp', __name__)
+
+def bucket_count(period):
+    """Parse ?count= for a period; returns (count, error response)"""
+    try:
+        count = int(request.args.get('count', 24 if period == 'hour' else 30))
+    except ValueError:
+        return None, (jsonify({"error": "count must be an integer"}), 400)
+    if not 1 <= count <= MAX_BUCKETS[period]:
+        return None, (jsonify({"error": f"count must be between 1 and {MAX_BUCKETS[period]}"}), 400)
+    return count, None
+
+@analytics_bp.route('/usage', methods=['GET'])
+@login_required
+@admin_required
+def usage():
+    """
+    Messages, reactions, active users and bot reply volume and latency per
+    period, read from the rollup tables. Query params: period (hour or day,
+    default hour), count (number of periods, newest last).
+    """
+    period = request.args.get('period', 'hour')
+    if period not in PERIODS:
+        return jsonify({"error": "period must be hour or day"}), 400
+    count, error = bucket_count(period)
+    if error:
+        return error
+
+    return jsonify({
+        "period": period,
+        "rolled_up": freshness(),
+        "buckets": usage_series(period, count)
+    }), 200
+
+@analytics_bp.route('/channels/<int:channel_id>', methods=['GET'])
+@login_required
+def channel_usage(channel_id):
+    """Hourly messages and reactions of one channel; members and admins only"""
+    is_admin = current_user.email.lower() in current_app.config['ADMIN_EMAILS']
+    if not is_admin and not membership_cache.is_member(current_user.id, channel_id):
+        return jsonify({"error": "Not authorized to access this channel"}), 403
+    count, error = bucket_count('hour')
+    if error:
+        return error
+
+    return jsonify({
+        "channel_id": channel_id,
+        "period": "hour",
+        "buckets": channel_series(channel_id, count)
+    }), 200
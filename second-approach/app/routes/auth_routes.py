@@ -4,11 +4,12 @@ import secrets
 import logging
 from flask import Blueprint, request, jsonify, current_app, redirect, url_for, render_template
 from flask_login import login_user, logout_user, login_required, current_user
-from flask_mail import Message
 from sqlalchemy import or_
 
-from .. import db, mail
+from .. import db
 from ..models import User, MagicLink
+from ..services.mail_queue import enqueue_email, deliver_soon
+from ..services.rate_limiter import rate_limit
 
 auth_bp = Blueprint('auth_bp', __name__)
 logger = logging.getLogger(__name__)
@@ -29,16 +30,13 @@ def create_magic_link(user):
     db.session.commit()
     return token
 
-def send_magic_link_email(user_email, verify_url):
-    """Send magic link email with proper logging"""
-    try:
-        logger.info(f"Attempting to send magic link email to {user_email}")
-        
-        msg = Message(
-            "Your Chat Genius Login Link",
-            recipients=[user_email]
-        )
-        msg.body = f"""
+def enqueue_magic_link_email(user_email, verify_url):
+    """Queue the magic link email; the mail sender delivers it in the background"""
+    logger.info(f"Queueing magic link email to {user_email}")
+    enqueue_email(
+        user_email,
+        "Your Chat Genius Login Link",
+        f"""
         Hello!
 
         Click the following link to log in to Chat Genius:
@@ -48,16 +46,10 @@ def send_magic_link_email(user_email, verify_url):
 
         If you didn't request this link, you can safely ignore this email.
         """
-        
-        mail.send(msg)
-        logger.info(f"Successfully sent magic link email to {user_email}")
-        return True
-        
-    except Exception as e:
-        logger.error(f"Failed to send magic link email to {user_email}: {str(e)}")
-        return False
+    )
 
 @auth_bp.route('/magic-link', methods=['POST'])
+@rate_limit('magic_link')
 def request_magic_link():
     """Request a magic link for authentication"""
     if not current_app.config['AUTH_REQUIRED']:
@@ -97,12 +89,18 @@ def request_magic_link():
             "debug_verify_url": verify_url
         }), 200
 
-    # Send email in production
-    if send_magic_link_email(email, verify_url):
-        return jsonify({"message": "Magic link sent to your email"}), 200
-    else:
+    # Queue the email in production; delivery happens outside the request
+    try:
+        enqueue_magic_link_email(email, verify_url)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Failed to queue magic link email to {email}: {str(e)}")
         return jsonify({"error": "Failed to send magic link email"}), 500
 
+    deliver_soon(current_app._get_current_object())
+    return jsonify({"message": "Magic link sent to your email"}), 200
+
 @auth_bp.route('/verify/<token>')
 def verify_token(token):
     """Verify a magic link token and log the user in"""
@@ -7,10 +7,12 @@ from datetime import datetime
 from sqlalchemy import or_
 
 from .. import db
-from ..models import Channel, User, ChannelMembership
-
-# Constants
-ECHO_BOT_EMAIL = "echo.bot@gauntletai.com"
+from ..models import Channel, User, ChannelMembership, Message
+from ..services.channel_flags import bot_dm_flags
+from ..services.membership_cache import membership_cache
+from ..services.poll_validators import channel_list_etag, not_modified, tag_response
+from ..services.rate_limiter import rate_limit
+from ..services.read_state import latest_message_id, mark_read, unread_counts
 
 channel_bp = Blueprint('channel_bp', __name__)
 
@@ -45,11 +47,15 @@ def create_channel():
             current_app.logger.error(f"Missing required fields. Received: {data}")
             return jsonify({'error': 'name is required for channels'}), 400
 
+    bot_id = current_app.config['BOT_USER_ID']
+    is_bot_dm = is_dm and bot_id in (current_user.id, participant.id)
+
     try:
         new_channel = Channel(
             name=data.get('name'),
             creator_id=current_user.id,
-            is_dm=is_dm
+            is_dm=is_dm,
+            is_bot_dm=is_bot_dm
         )
         db.session.add(new_channel)
         db.session.flush()  # Get channel ID without committing
@@ -70,6 +76,10 @@ def create_channel():
             db.session.add(participant_membership)
         
         db.session.commit()
+        bot_dm_flags.remember(new_channel.id, is_bot_dm)
+        membership_cache.invalidate_user(current_user.id)
+        if is_dm and participant:
+            membership_cache.invalidate_user(participant.id)
         
         response_data = {
             "id": new_channel.id,
@@ -96,7 +106,13 @@ def list_channels():
     """
     Return a list of all channels and DMs the current user is a member of.
     Includes IDs of recently deleted channels.
+    Answers 304 when nothing about the user's channel list changed.
     """
+    etag = channel_list_etag(current_user.id, request.query_string)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+
     # Get timestamp filter from query params for polling
     after_timestamp = request.args.get('after')
     
@@ -115,6 +131,7 @@ def list_channels():
     
     # Get active channels
     channels = base_query.all()
+    read_state = unread_counts(current_user.id)
     results = []
     for ch in channels:
         # For DMs, get the other participants
@@ -135,7 +152,9 @@ def list_channels():
             "creator_id": ch.creator_id,
             "is_dm": ch.is_dm,
             "created_at": ch.created_at.isoformat(),
-            "participants": participants if ch.is_dm else []
+            "participants": participants if ch.is_dm else [],
+            "last_read_message_id": read_state.get(ch.id, (None, 0))[0],
+            "unread_count": read_state.get(ch.id, (None, 0))[1]
         })
 
     # Get IDs of channels deleted since last poll
@@ -149,9 +168,39 @@ def list_channels():
         )
     deleted_channel_ids = [ch.id for ch in deleted_channels_query.all()]
     
-    return jsonify({
+    return tag_response(jsonify({
         "channels": results,
         "deleted_channel_ids": deleted_channel_ids
+    }), etag), 200
+
+@channel_bp.route('/channels/<int:channel_id>/read', methods=['POST'])
+@login_required
+def mark_channel_read(channel_id):
+    """
+    Advance the current user's read watermark. Expects optional JSON
+    { "message_id": 123 }; without it, everything in the channel is marked read.
+    """
+    if not membership_cache.is_member(current_user.id, channel_id):
+        return jsonify({"error": "Not authorized to access this channel"}), 403
+
+    data = request.get_json(silent=True) or {}
+    message_id = data.get('message_id')
+    if message_id is None:
+        message_id = latest_message_id(channel_id)
+        if message_id is None:
+            return jsonify({"channel_id": channel_id, "last_read_message_id": None, "unread_count": 0}), 200
+    elif not isinstance(message_id, int) or isinstance(message_id, bool):
+        return jsonify({"error": "message_id must be an integer"}), 400
+    elif not Message.query.filter_by(id=message_id, channel_id=channel_id).first():
+        return jsonify({"error": "Message not found in this channel"}), 404
+
+    last_read = mark_read(current_user.id, channel_id, message_id)
+    db.session.commit()
+
+    return jsonify({
+        "channel_id": channel_id,
+        "last_read_message_id": last_read,
+        "unread_count": unread_counts(current_user.id, channel_id).get(channel_id, (None, 0))[1]
     }), 200
 
 @channel_bp.route('/channels/<int:channel_id>', methods=['DELETE'])
@@ -163,12 +212,7 @@ def delete_channel(channel_id):
     channel = Channel.query.get_or_404(channel_id)
     
     # Check if user is a member of the channel
-    membership = ChannelMembership.query.filter_by(
-        channel_id=channel.id,
-        user_id=current_user.id
-    ).first()
-    
-    if not membership:
+    if not membership_cache.is_member(current_user.id, channel.id):
         return jsonify({"error": "Not authorized to access this channel"}), 403
         
     # For regular channels, only creator can delete
@@ -178,6 +222,7 @@ def delete_channel(channel_id):
     # Soft delete the channel
     channel.deleted_at = datetime.utcnow()
     db.session.commit()
+    membership_cache.discard_channel(channel_id)
 
     return jsonify({
         "message": f"Channel {channel_id} deleted.",
@@ -186,6 +231,7 @@ def delete_channel(channel_id):
 
 @channel_bp.route('/users', methods=['GET'])
 @login_required
+@rate_limit('user_search')
 def list_available_users():
     """
     List all users available for DMs, including the current user for self-DMs.
@@ -198,11 +244,12 @@ def list_available_users():
         query = query.filter(User.email.ilike(f'%{search}%'))
     
     users = query.order_by(User.email).all()
+    bot_id = current_app.config['BOT_USER_ID']
     
     return jsonify({
         "users": [{
             "id": user.id,
             "email": user.email,
-            "is_bot": user.email == ECHO_BOT_EMAIL
+            "is_bot": user.id == bot_id
         } for user in users]
     }), 200
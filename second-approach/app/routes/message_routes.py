@@ -1,41 +1,48 @@
 # app/routes/message_routes.py
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
 from flask_login import login_required, current_user
-import asyncio
 from .. import db
 from ..models import Message, Channel, User, MessageReaction, ChannelMembership
 from ..services.bot_service import bot_service
+from ..services.bot_memory import conversation_memory
+from ..services.channel_flags import bot_dm_flags
+from ..services.membership_cache import membership_cache
+from ..services.message_ingest import ingest_messages
+from ..services.message_export import iter_export_records, iter_ndjson, iter_gzip
+from ..services.message_archive import iter_archived_records, channel_archive_months
+from ..services.message_buffer import message_buffer, serialize_message
+from ..services.rate_limiter import check_rate_limit, refund_rate_limit
+from ..services.admission import admission, Overloaded, overloaded_response
+from ..services.poll_validators import bump_channel_seq, channel_seq, messages_etag, not_modified, tag_response
 from datetime import datetime
+from itertools import chain
 import logging
+import re
+import time
 
 message_bp = Blueprint('message_bp', __name__)
 logger = logging.getLogger(__name__)
 
-# Constants
-ECHO_BOT_EMAIL = "bot@gauntletai.com"
+def is_bot_dm(channel_id):
+    """Check if this is a DM channel with the bot (memoized per process)"""
+    return bot_dm_flags.is_bot_dm(channel_id)
 
-def get_bot_user():
-    """Helper function to get the bot user"""
-    return User.query.filter_by(email=ECHO_BOT_EMAIL).first()
+def check_membership(channel_id):
+    """Return a 403 response if the current user isn't a member of the channel, else None"""
+    if not membership_cache.is_member(current_user.id, channel_id):
+        return jsonify({"error": "Not authorized to access this channel"}), 403
+    return None
 
-def is_bot_dm(channel_id):
-    """Check if this is a DM channel with the bot"""
-    channel = Channel.query.get(channel_id)
-    if not channel or not channel.is_dm:
-        return False
-    
-    # Check if bot is a member
-    bot = get_bot_user()
-    if not bot:
-        return False
-        
-    bot_membership = ChannelMembership.query.filter_by(
-        channel_id=channel_id,
-        user_id=bot.id
-    ).first()
-    
-    return bool(bot_membership)
+def find_member_message(message_id):
+    """
+    The message if the current user can see its channel, else None; answering
+    404 either way doesn't reveal which message ids exist elsewhere
+    """
+    message = db.session.get(Message, message_id)
+    if message is None or not membership_cache.is_member(current_user.id, message.channel_id):
+        return None
+    return message
 
 @message_bp.route('/channels/<int:channel_id>/messages', methods=['POST'])
 @login_required
@@ -43,14 +50,31 @@ def create_message(channel_id):
     """Create a new message and handle bot responses"""
     data = request.get_json()
     logger.info(f"Received message in channel {channel_id}")
-    
+
+    denied = check_membership(channel_id)
+    if denied:
+        return denied
+
     if not data or 'content' not in data:
         return jsonify({"error": "Missing content field"}), 400
         
     if not data.get("content").strip():
         return jsonify({"error": "Message content cannot be empty"}), 400
 
+    # Every bot DM message also costs an LLM call; nothing is spent unless both allow it,
+    # and only for requests that passed validation
+    limits = ('message_post', 'bot_message') if is_bot_dm(channel_id) else ('message_post',)
+    limited = check_rate_limit(*limits)
+    if limited is not None:
+        return limited
+
     try:
+        # If this is a bot DM, get the bot's response before writing anything
+        bot_dm = is_bot_dm(channel_id)
+        if bot_dm:
+            logger.info("Channel is a bot DM, getting bot response")
+            bot_response, generation_ms = generate_bot_reply(channel_id, data['content'])
+
         # Create user message
         message = Message(
             channel_id=channel_id,
@@ -59,34 +83,18 @@ def create_message(channel_id):
         )
         db.session.add(message)
         
-        # If this is a bot DM, create the bot's response
-        logger.info(f"Checking if channel {channel_id} is a bot DM")
-        if is_bot_dm(channel_id):
-            logger.info("Channel is a bot DM, getting bot response")
-            bot = get_bot_user()
-            if bot:
-                logger.info(f"Found bot user with id {bot.id}")
-                # Get response from LangChain
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                bot_response = loop.run_until_complete(
-                    bot_service.get_response(data['content'])
-                )
-                loop.close()
-                
-                # Create bot message
-                bot_message = Message(
-                    channel_id=channel_id,
-                    user_id=bot.id,
-                    content=bot_response
-                )
-                db.session.add(bot_message)
-            else:
-                logger.error("Bot user not found in database")
-        else:
-            logger.info("Channel is not a bot DM")
+        if bot_dm:
+            # Create bot message
+            bot_message = Message(
+                channel_id=channel_id,
+                user_id=current_app.config['BOT_USER_ID'],
+                content=bot_response,
+                generation_ms=generation_ms
+            )
+            db.session.add(bot_message)
         
-        db.session.commit()
+        # Flush so the id and timestamp are known without re-reading the row after commit
+        db.session.flush()
 
         # Format response
         response_data = {
@@ -97,41 +105,134 @@ def create_message(channel_id):
             "content": data['content'],
             "created_at": message.created_at.isoformat()
         }
+        buffered = [(message.created_at, serialize_message(message, current_user.email))]
+        if bot_dm:
+            bot_user = db.session.get(User, bot_message.user_id)
+            buffered.append((bot_message.created_at, serialize_message(bot_message, bot_user.email if bot_user else None)))
+        seq = bump_channel_seq(channel_id)
+        db.session.commit()
+        message_buffer.message_created(channel_id, seq, buffered)
+        if bot_dm:
+            conversation_memory.schedule(current_app._get_current_object(), channel_id, bot_service.summarize)
         
         return jsonify({
             "message": "Message created",
-            "message_id": message.id,
+            "message_id": response_data["id"],
             "data": response_data
         }), 201
-        
+
+    except Overloaded as e:
+        logger.warning(f"Shed bot message in channel {channel_id}: {str(e)}")
+        # Nothing was stored; the client is told to retry, so don't charge it for this attempt
+        refund_rate_limit(*limits)
+        return overloaded_response(e)
     except Exception as e:
         logger.error(f"Error creating message: {str(e)}")
         db.session.rollback()
         return jsonify({"error": str(e)}), 400
 
+def generate_bot_reply(channel_id, question):
+    """
+    Answer a bot DM question inside the bot_generation admission pool.
+    Returns (reply, generation_ms); raises Overloaded when the pool sheds it.
+    """
+    # Nothing is written yet: don't sit on a DB connection while queued or generating
+    db.session.commit()
+    with admission.slot('bot_generation'):
+        # Earlier turns only; the new message is the question itself
+        history = conversation_memory.history(channel_id, current_app.config['BOT_USER_ID'])
+        db.session.commit()
+
+        # Get response from LangChain; a plain blocking call that the gevent worker
+        # overlaps with other requests at the socket level
+        started = time.perf_counter()
+        reply = bot_service.get_response(question, history=history)
+        return reply, round((time.perf_counter() - started) * 1000)
+
+@message_bp.route('/channels/<int:channel_id>/messages/bulk', methods=['POST'])
+@login_required
+def bulk_create_messages(channel_id):
+    """
+    Insert many messages in one call. Expects JSON with:
+    { "messages": [{ "content": "...", "created_at": "<iso>" }, ...] }
+    created_at defaults to now. Messages are always authored by the caller;
+    importing history on behalf of other users is only possible through
+    `flask import-messages`.
+    Returns one result per item, in order. Bot DMs are not answered.
+    """
+    denied = check_membership(channel_id)
+    if denied:
+        return denied
+
+    limited = check_rate_limit('message_bulk')
+    if limited is not None:
+        return limited
+
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data.get('messages'), list):
+        return jsonify({"error": "messages must be a list"}), 400
+
+    items = data['messages']
+    max_items = current_app.config['BULK_MAX_MESSAGES']
+    if len(items) > max_items:
+        return jsonify({"error": f"At most {max_items} messages per request"}), 400
+
+    results = ingest_messages(channel_id, items, default_user_id=current_user.id)
+    inserted = sum(1 for result in results if 'id' in result)
+    logger.info(f"Bulk inserted {inserted}/{len(items)} messages into channel {channel_id}")
+
+    return jsonify({
+        "inserted": inserted,
+        "failed": len(items) - inserted,
+        "results": results
+    }), 200
+
 @message_bp.route('/channels/<int:channel_id>/messages', methods=['GET'])
 @login_required
 def list_messages(channel_id):
     """
     List all messages for a given channel, with optional timestamp filter for polling.
     Also returns IDs of messages that were deleted since the last poll.
+    Answers 304 when the client's If-None-Match matches the channel's change_seq,
+    and from the in-process message buffer when the cursor falls inside it.
     """
-    channel = Channel.query.get_or_404(channel_id)
+    denied = check_membership(channel_id)
+    if denied:
+        return denied
+
+    seq = channel_seq(channel_id)
+    etag = messages_etag(channel_id, request.query_string, seq=seq)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
     
     # Get timestamp filter from query params for polling
     after_timestamp = request.args.get('after')
-    query = Message.query.filter_by(channel_id=channel.id)
-    
-    # Get new messages (not deleted)
+    after_dt = None
     if after_timestamp:
         try:
             after_dt = datetime.fromisoformat(after_timestamp)
-            query = query.filter(
-                Message.created_at > after_dt,
-                Message.deleted_at.is_(None)
-            )
         except ValueError:
             return jsonify({"error": "Invalid timestamp format"}), 400
+
+    # Stored timestamps are naive UTC; offset-aware cursors go to the database
+    if after_dt is None or after_dt.tzinfo is None:
+        buffered = message_buffer.read(channel_id, seq, after_dt)
+        if buffered is not None:
+            result, deleted_message_ids = buffered
+            return tag_response(jsonify({
+                "messages": result,
+                "deleted_message_ids": deleted_message_ids
+            }), etag), 200
+
+    query = Message.query.filter_by(channel_id=channel_id)
+    
+    # Get new messages (not deleted)
+    if after_timestamp:
+        query = query.filter(
+            Message.created_at > after_dt,
+            Message.deleted_at.is_(None)
+        )
     else:
         query = query.filter(Message.deleted_at.is_(None))
     
@@ -139,7 +240,7 @@ def list_messages(channel_id):
 
     # Get IDs of messages deleted since last poll
     deleted_messages_query = Message.query.filter(
-        Message.channel_id == channel.id,
+        Message.channel_id == channel_id,
         Message.deleted_at.isnot(None)
     )
     if after_timestamp:
@@ -150,25 +251,92 @@ def list_messages(channel_id):
 
     result = [format_message_with_reactions(msg) for msg in messages]
     
-    return jsonify({
+    return tag_response(jsonify({
         "messages": result,
         "deleted_message_ids": deleted_message_ids
+    }), etag), 200
+
+@message_bp.route('/channels/<int:channel_id>/export', methods=['GET'])
+@login_required
+def export_messages(channel_id):
+    """
+    Stream every message in a channel, with authors and reactions, as NDJSON.
+    Archived months come first, followed by the live table.
+    The body is gzipped on the fly when the client accepts it.
+    """
+    denied = check_membership(channel_id)
+    if denied:
+        return denied
+
+    chunks = iter_ndjson(chain(
+        iter_archived_records(current_app.config['MESSAGE_ARCHIVE_DIR'], channel_id),
+        iter_export_records(channel_id)
+    ))
+    headers = {
+        "Content-Disposition": f'attachment; filename="channel-{channel_id}.ndjson"',
+        "Vary": "Accept-Encoding",
+    }
+    if 'gzip' in request.accept_encodings:
+        chunks = iter_gzip(chunks)
+        headers["Content-Encoding"] = "gzip"
+
+    return Response(
+        stream_with_context(chunks),
+        mimetype='application/x-ndjson',
+        headers=headers
+    )
+
+@message_bp.route('/channels/<int:channel_id>/history', methods=['GET'])
+@login_required
+def list_archived_months(channel_id):
+    """List the archived months (YYYY-MM) that hold messages for a channel"""
+    denied = check_membership(channel_id)
+    if denied:
+        return denied
+
+    return jsonify({
+        "months": channel_archive_months(current_app.config['MESSAGE_ARCHIVE_DIR'], channel_id)
+    }), 200
+
+@message_bp.route('/channels/<int:channel_id>/history/<month>', methods=['GET'])
+@login_required
+def get_archived_month(channel_id, month):
+    """Return one archived month of a channel's messages, read from cold storage"""
+    denied = check_membership(channel_id)
+    if denied:
+        return denied
+
+    if not re.fullmatch(r'\d{4}-\d{2}', month):
+        return jsonify({"error": "month must be YYYY-MM"}), 400
+
+    messages = list(iter_archived_records(
+        current_app.config['MESSAGE_ARCHIVE_DIR'], channel_id, months=[month]
+    ))
+    return jsonify({
+        "month": month,
+        "messages": messages
     }), 200
 
 @message_bp.route('/channels/<int:channel_id>/messages/<int:message_id>', methods=['DELETE'])
 @login_required
 def delete_message(channel_id, message_id):
     """Delete a message by ID within a specific channel."""
-    channel = Channel.query.get_or_404(channel_id)
-    message = Message.query.filter_by(id=message_id, channel_id=channel.id).first_or_404()
+    denied = check_membership(channel_id)
+    if denied:
+        return denied
+
+    message = Message.query.filter_by(id=message_id, channel_id=channel_id).first_or_404()
     
     # Check if current user is the message author
     if message.user_id != current_user.id:
         return jsonify({"error": "Not authorized to delete this message"}), 403
 
     # Soft delete the message
-    message.deleted_at = datetime.utcnow()
+    deleted_at = datetime.utcnow()
+    message.deleted_at = deleted_at
+    seq = bump_channel_seq(channel_id)
     db.session.commit()
+    message_buffer.message_deleted(channel_id, seq, message_id, deleted_at)
     
     return jsonify({
         "message": f"Message {message_id} deleted.",
@@ -179,7 +347,9 @@ def delete_message(channel_id, message_id):
 @login_required
 def add_reaction(message_id):
     """Add a reaction to a message"""
-    message = Message.query.get_or_404(message_id)
+    message = find_member_message(message_id)
+    if message is None:
+        return jsonify({"error": "Message not found"}), 404
     data = request.get_json()
 
     if not data or 'emoji' not in data:
@@ -208,7 +378,10 @@ def add_reaction(message_id):
             emoji=emoji
         )
         db.session.add(reaction)
+        channel_id = message.channel_id
+        seq = bump_channel_seq(channel_id)
         db.session.commit()
+        message_buffer.reaction_changed(channel_id, seq, message_id, emoji, current_user.id, added=True)
         logger.info(f"Successfully added reaction {emoji} to message {message_id}")
 
         # Get updated reaction counts for this emoji
@@ -233,7 +406,9 @@ def add_reaction(message_id):
 @login_required
 def remove_reaction(message_id, emoji):
     """Remove a user's reaction from a message"""
-    message = Message.query.get_or_404(message_id)
+    message = find_member_message(message_id)
+    if message is None:
+        return jsonify({"error": "Message not found"}), 404
     
     # URL decode the emoji parameter
     from urllib.parse import unquote
@@ -248,7 +423,10 @@ def remove_reaction(message_id, emoji):
 
     try:
         db.session.delete(reaction)
+        channel_id = message.channel_id
+        seq = bump_channel_seq(channel_id)
         db.session.commit()
+        message_buffer.reaction_changed(channel_id, seq, message_id, emoji, current_user.id, added=False)
         logger.info(f"Successfully removed reaction {emoji} from message {message_id}")
 
         # Get updated reaction count for this emoji
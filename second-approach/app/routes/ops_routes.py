@@ -0,0 +1,100 @@
+# app/routes/ops_routes.py
+
+from functools import wraps
+
+from flask import Blueprint, jsonify, request, current_app, send_from_directory
+from flask_login import login_required, current_user
+
+from ..services.user_cache import user_cache
+from ..services.channel_flags import bot_dm_flags
+from ..services.membership_cache import membership_cache
+from ..services.message_buffer import message_buffer
+from ..services.maintenance import scheduler
+from ..services import mail_queue
+from ..services.rate_limiter import rate_limiter
+from ..services.admission import admission
+from ..profiling import profiler
+
+ops_bp = Blueprint('ops_bp', __name__)
+
+def admin_required(view):
+    """Allow only users listed in ADMIN_EMAILS; use below @login_required"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if current_user.email.lower() not in current_app.config['ADMIN_EMAILS']:
+            return jsonify({"error": "Admin access required"}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+@ops_bp.before_request
+@login_required
+@admin_required
+def require_admin():
+    """Every ops endpoint exposes process internals, so the whole blueprint is admin-only"""
+    return None
+
+@ops_bp.route('/caches', methods=['GET'])
+def cache_stats():
+    """Report size and hit rate of the per-process caches"""
+    return jsonify({
+        "user_cache": user_cache.stats(),
+        "bot_dm_flags": bot_dm_flags.stats(),
+        "membership_cache": membership_cache.stats(),
+        "message_buffer": message_buffer.stats()
+    }), 200
+
+@ops_bp.route('/maintenance', methods=['GET'])
+def maintenance_status():
+    """Report whether this worker leads maintenance and what the last run did"""
+    return jsonify(scheduler.status()), 200
+
+@ops_bp.route('/mail', methods=['GET'])
+def mail_queue_status():
+    """Report outbox depth and delivery latency"""
+    return jsonify({
+        "pending": mail_queue.queue_depth(),
+        "sender_running": mail_queue.sender.running,
+        **mail_queue.stats.snapshot()
+    }), 200
+
+@ops_bp.route('/rate-limits', methods=['GET'])
+def rate_limit_stats():
+    """Report allowed and refused requests per limit"""
+    return jsonify(rate_limiter.stats()), 200
+
+@ops_bp.route('/admission', methods=['GET'])
+def admission_stats():
+    """Report in-flight, queued, admitted and shed jobs per admission pool"""
+    return jsonify(admission.stats()), 200
+
+@ops_bp.route('/profile', methods=['POST'])
+def request_profiles():
+    """Profile the next N requests, optionally only those matching one route rule"""
+    if not profiler.enabled:
+        return jsonify({"error": "Profiling is disabled (set PROFILE_ENABLED)"}), 409
+
+    data = request.get_json(silent=True) or {}
+    try:
+        count = int(data.get('requests', 10))
+    except (TypeError, ValueError):
+        return jsonify({"error": "requests must be an integer"}), 400
+    if not 1 <= count <= 1000:
+        return jsonify({"error": "requests must be between 1 and 1000"}), 400
+
+    profiler.profile_next(count, route=data.get('route'))
+    return jsonify(profiler.status()), 202
+
+@ops_bp.route('/profiles', methods=['GET'])
+def list_profiles():
+    """List the newest request profiles"""
+    return jsonify({
+        **profiler.status(),
+        "profiles": profiler.recent(limit=min(request.args.get('limit', 50, type=int), 500))
+    }), 200
+
+@ops_bp.route('/profiles/<name>', methods=['GET'])
+def download_profile(name):
+    """Download a profile's collapsed stacks (<name>.folded) or metadata (<name>.json)"""
+    if not profiler.directory:
+        return jsonify({"error": "Profile not found"}), 404
+    return send_from_directory(profiler.directory, name, mimetype='text/plain')
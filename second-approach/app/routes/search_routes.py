@@ -0,0 +1,47 @@
+# app/routes/search_routes.py
+
+from flask import Blueprint, request, jsonify
+from flask_login import login_required, current_user
+
+from ..services.membership_cache import membership_cache
+from ..services.message_search import search_messages, InvalidCursor
+
+search_bp = Blueprint('search_bp', __name__)
+
+MAX_LIMIT = 100
+
+@search_bp.route('/search', methods=['GET'])
+@login_required
+def search():
+    """
+    Search messages in the current user's channels.
+    Query params: q (required), channel_id (optional), limit (default 20), cursor.
+    Results are ranked best first; pass next_cursor back as cursor for the next page.
+    """
+    q = request.args.get('q', '').strip()
+    if not q:
+        return jsonify({"error": "q is required"}), 400
+
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), MAX_LIMIT)
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+
+    channel_ids = membership_cache.channel_ids(current_user.id)
+    channel_id = request.args.get('channel_id', type=int)
+    if channel_id is not None:
+        if not membership_cache.is_member(current_user.id, channel_id):
+            return jsonify({"error": "Not authorized to access this channel"}), 403
+        channel_ids = {channel_id}
+
+    try:
+        results, next_cursor = search_messages(
+            q, channel_ids, limit=limit, cursor=request.args.get('cursor')
+        )
+    except InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({
+        "results": results,
+        "next_cursor": next_cursor
+    }), 200
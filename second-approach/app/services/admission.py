@@ -0,0 +1,191 @@
+# app/services/admission.py
+
+"""
+Admission control for expensive work.
+
+Each pool runs at most `concurrency` jobs at once. Up to `queue` more wait
+their turn in arrival order for at most `timeout` seconds (a freed slot is
+handed straight to the oldest waiter, so newcomers can't jump the queue), and anything
+beyond that is shed, which the routes answer with 503 and a Retry-After
+hint. Only the expensive paths take a slot, so a burst of bot questions
+queues against its own pool while polls and other cheap requests go
+straight through. Bot requests also hand their DB connection back while
+they wait and generate (see message_routes.generate_bot_reply), so the
+queue can't drain the connection pool either.
+
+Pools are per process. With gevent the threading primitives are
+monkey-patched, so waiting yields to other greenlets.
+"""
+
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from flask import jsonify
+
+from ..metrics import registry
+
+# name -> (concurrency, queue, timeout seconds); override with ADMISSION_<NAME>="8,32,10"
+DEFAULT_POOLS = {
+    'bot_generation': (8, 32, 10.0),
+}
+
+admitted_total = registry.counter(
+    'chat_admission_admitted_total', 'Jobs admitted by the admission controller', ('pool',)
+)
+shed_total = registry.counter(
+    'chat_admission_shed_total', 'Jobs refused with 503', ('pool', 'reason')
+)
+wait_seconds = registry.histogram(
+    'chat_admission_wait_seconds', 'Time admitted jobs spent queued', ('pool',)
+)
+
+
+class Overloaded(Exception):
+    """Raised when a pool sheds a job; retry_after is a hint in seconds"""
+
+    def __init__(self, pool, reason, retry_after):
+        super().__init__(f"{pool} is over capacity ({reason})")
+        self.pool = pool
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def parse_pool(value):
+    """'8,32,10' -> (8, 32, 10.0)"""
+    concurrency, queue, timeout = (part.strip() for part in value.split(','))
+    return int(concurrency), int(queue), float(timeout)
+
+
+class Pool:
+    def __init__(self, name, concurrency, queue, timeout):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue = queue
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        # One Event per queued job, oldest first; release() sets the head's
+        self._waiters = deque()
+        self.in_flight = 0
+        self.admitted = 0
+        self.shed = {'queue_full': 0, 'timeout': 0}
+        # Moving average of how long a job holds its slot, for Retry-After
+        self.hold_seconds = None
+
+    @property
+    def waiting(self):
+        return len(self._waiters)
+
+    def acquire(self):
+        """Take a slot, queueing if needed; returns seconds waited or raises Overloaded"""
+        started = time.monotonic()
+        with self._lock:
+            # Newcomers queue behind existing waiters instead of barging in
+            if self.in_flight < self.concurrency and not self._waiters:
+                self.in_flight += 1
+                self.admitted += 1
+                waiter = None
+            else:
+                if len(self._waiters) >= self.queue:
+                    raise self._shed('queue_full')
+                waiter = threading.Event()
+                self._waiters.append(waiter)
+
+        if waiter is not None:
+            if not waiter.wait(self.timeout):
+                with self._lock:
+                    # A slot handed over just as the wait timed out is still ours
+                    if not waiter.is_set():
+                        self._waiters.remove(waiter)
+                        raise self._shed('timeout')
+            with self._lock:
+                self.admitted += 1
+        waited = time.monotonic() - started
+        admitted_total.inc(1, self.name)
+        wait_seconds.observe(waited, self.name)
+        return waited
+
+    def release(self, held):
+        with self._lock:
+            self.hold_seconds = held if self.hold_seconds is None else 0.8 * self.hold_seconds + 0.2 * held
+            if self._waiters:
+                # The slot passes straight to the oldest waiter; in_flight is unchanged
+                self._waiters.popleft().set()
+            else:
+                self.in_flight -= 1
+
+    def _shed(self, reason):
+        self.shed[reason] += 1
+        shed_total.inc(1, self.name, reason)
+        return Overloaded(self.name, reason, self._retry_after())
+
+    def _retry_after(self):
+        """Roughly when the current queue will have drained"""
+        hold = self.hold_seconds if self.hold_seconds is not None else self.timeout
+        rounds = (self.in_flight + self.waiting) / max(self.concurrency, 1)
+        return max(1, min(60, math.ceil(hold * rounds)))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "concurrency": self.concurrency,
+                "queue": self.queue,
+                "timeout": self.timeout,
+                "in_flight": self.in_flight,
+                "waiting": self.waiting,
+                "admitted": self.admitted,
+                "shed": dict(self.shed),
+                "hold_seconds": round(self.hold_seconds, 3) if self.hold_seconds is not None else None,
+            }
+
+
+class AdmissionController:
+    def __init__(self):
+        self.pools = {name: Pool(name, *limits) for name, limits in DEFAULT_POOLS.items()}
+        self.enabled = True
+
+    def configure(self, pools, enabled=True):
+        """Apply app config: {name: (concurrency, queue, timeout)}"""
+        self.pools = {name: Pool(name, *limits) for name, limits in pools.items()}
+        self.enabled = enabled
+
+    @contextmanager
+    def slot(self, name):
+        """Hold a slot of pool `name` for the block; raises Overloaded when shed"""
+        pool = self.pools.get(name)
+        if not self.enabled or pool is None:
+            yield 0
+            return
+        waited = pool.acquire()
+        started = time.monotonic()
+        try:
+            yield waited
+        finally:
+            pool.release(time.monotonic() - started)
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "pools": {name: pool.stats() for name, pool in self.pools.items()},
+        }
+
+
+def overloaded_response(error):
+    """503 for a shed job, with the pool's Retry-After hint"""
+    response = jsonify({"error": "The server is busy, please retry shortly"})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+
+def init_app(app):
+    admission.configure(
+        app.config['ADMISSION_POOLS'],
+        enabled=app.config['ADMISSION_ENABLED'],
+    )
+
+
+# Create a singleton instance
+admission = AdmissionController()
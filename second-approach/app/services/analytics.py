@@ -0,0 +1,267 @@
+# app/services/analytics.py
+
+"""
+Incrementally maintained usage rollups.
+
+rollup_analytics() folds messages and reactions created since its last run
+into hourly and daily totals (messages, reactions, active users, bot replies
+and their generation latency) and into per-channel hourly counts. Each
+source table has a watermark, the highest id already folded in, so a run
+reads only new rows through the primary key and never rescans history. The
+increments, the watermark and the active-user markers commit together. A
+run that loses a race with another runner rolls back instead of counting
+twice.
+
+Ids are assigned before commit, so a lower id can become visible after a
+higher one. Rows younger than SETTLE_SECONDS wait for the next run.
+Messages are counted as posted; deleting one later doesn't subtract it.
+
+The maintenance job runs this; `flask rollup-analytics` runs it by hand (and
+catches up a fresh install in one go). usage_series() reads a bounded range
+of rollup rows by primary key, so dashboards cost the same at any history size.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, update
+
+from .. import db
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 5000
+# Per maintenance run; the next run picks up where this one stopped
+MAX_BATCHES = 20
+SETTLE_SECONDS = 60
+# Active-user markers older than this are dropped; a row arriving later for
+# such a period (a history import) may count its author again
+ACTIVE_USER_RETENTION = timedelta(days=2)
+
+PERIODS = {
+    'hour': lambda ts: ts.replace(minute=0, second=0, microsecond=0),
+    'day': lambda ts: ts.replace(hour=0, minute=0, second=0, microsecond=0),
+}
+PERIOD_LENGTH = {'hour': timedelta(hours=1), 'day': timedelta(days=1)}
+MAX_BUCKETS = {'hour': 24 * 14, 'day': 366}
+
+TOTAL_COLUMNS = ('messages', 'reactions', 'active_users', 'bot_replies',
+                 'bot_latency_count', 'bot_latency_ms_total', 'bot_latency_ms_max')
+
+
+def _watermark(source):
+    from ..models import AnalyticsWatermark
+
+    mark = db.session.get(AnalyticsWatermark, source)
+    if mark is None:
+        mark = AnalyticsWatermark(source=source, last_id=0)
+        db.session.add(mark)
+        db.session.commit()
+    return mark.last_id
+
+
+def _advance(source, old, new, now):
+    """Move the watermark only if nobody else did meanwhile"""
+    from ..models import AnalyticsWatermark
+
+    result = db.session.execute(
+        update(AnalyticsWatermark)
+        .where(AnalyticsWatermark.source == source, AnalyticsWatermark.last_id == old)
+        .values(last_id=new, updated_at=now)
+    )
+    return result.rowcount == 1
+
+
+def _settled_upper_bound(model, last_id, cutoff):
+    """Highest id that can be folded in without skipping a row that may still be in flight"""
+    unsettled = db.session.query(func.min(model.id)).filter(
+        model.id > last_id, model.created_at >= cutoff
+    ).scalar()
+    if unsettled is not None:
+        return unsettled - 1
+    return db.session.query(func.max(model.id)).scalar() or last_id
+
+
+def _read_messages(last_id, upper):
+    from ..models import Message
+
+    return db.session.query(
+        Message.id, Message.channel_id, Message.user_id, Message.created_at, Message.generation_ms
+    ).filter(
+        Message.id > last_id, Message.id <= upper
+    ).order_by(Message.id).limit(BATCH_SIZE).all()
+
+
+def _read_reactions(last_id, upper):
+    from ..models import Message, MessageReaction
+
+    # Reactions of purged messages still count toward the totals, just not a channel
+    return db.session.query(
+        MessageReaction.id, Message.channel_id, MessageReaction.user_id, MessageReaction.created_at
+    ).outerjoin(
+        Message, Message.id == MessageReaction.message_id
+    ).filter(
+        MessageReaction.id > last_id, MessageReaction.id <= upper
+    ).order_by(MessageReaction.id).limit(BATCH_SIZE).all()
+
+
+class Batch:
+    """Increments from one batch of source rows, before they're written"""
+
+    def __init__(self, bot_user_id):
+        self.bot_user_id = bot_user_id
+        self.totals = defaultdict(lambda: defaultdict(int))  # (period, start) -> column -> delta
+        self.channels = defaultdict(lambda: defaultdict(int))  # (channel_id, hour) -> column -> delta
+        self.users = defaultdict(set)  # (period, start) -> user ids
+
+    def add(self, column, channel_id, user_id, created_at, generation_ms=None):
+        for period, truncate in PERIODS.items():
+            key = (period, truncate(created_at))
+            totals = self.totals[key]
+            totals[column] += 1
+            if user_id == self.bot_user_id:
+                if column == 'messages':
+                    totals['bot_replies'] += 1
+                if generation_ms is not None:
+                    totals['bot_latency_count'] += 1
+                    totals['bot_latency_ms_total'] += generation_ms
+                    totals['bot_latency_ms_max'] = max(totals['bot_latency_ms_max'], generation_ms)
+            else:
+                self.users[key].add(user_id)
+        if channel_id is not None:
+            self.channels[(channel_id, PERIODS['hour'](created_at))][column] += 1
+
+    def write(self):
+        from ..models import AnalyticsActiveUser, AnalyticsChannelRollup, AnalyticsRollup
+
+        for (period, start), user_ids in self.users.items():
+            seen = {row[0] for row in db.session.query(AnalyticsActiveUser.user_id).filter(
+                AnalyticsActiveUser.period == period,
+                AnalyticsActiveUser.start == start,
+                AnalyticsActiveUser.user_id.in_(user_ids)
+            ).all()}
+            new = user_ids - seen
+            db.session.add_all(AnalyticsActiveUser(period=period, start=start, user_id=u) for u in new)
+            if new:
+                self.totals[(period, start)]['active_users'] += len(new)
+
+        for key, deltas in self.totals.items():
+            _increment(AnalyticsRollup, key, deltas, period=key[0], start=key[1])
+        for key, deltas in self.channels.items():
+            _increment(AnalyticsChannelRollup, key, deltas, channel_id=key[0], start=key[1])
+
+
+def _increment(model, key, deltas, **identity):
+    row = db.session.get(model, key)
+    if row is None:
+        row = model(**identity)
+        db.session.add(row)
+    for column, delta in deltas.items():
+        current = getattr(row, column) or 0
+        setattr(row, column, max(current, delta) if column.endswith('_max') else current + delta)
+
+
+def _rollup_source(source, model, read, bot_user_id, cutoff, now, max_batches):
+    folded = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        last_id = _watermark(source)
+        upper = _settled_upper_bound(model, last_id, cutoff)
+        if upper <= last_id:
+            break
+        rows = read(last_id, upper)
+        # A short batch means everything up to `upper` was read (the rest are deleted ids)
+        new_last = rows[-1][0] if len(rows) == BATCH_SIZE else upper
+
+        batch = Batch(bot_user_id)
+        for row in rows:
+            batch.add(source, *row[1:])
+        batch.write()
+        if not _advance(source, last_id, new_last, now):
+            db.session.rollback()
+            logger.warning(f"Analytics rollup of {source} raced another run; stopping")
+            break
+        db.session.commit()
+        folded += len(rows)
+        batches += 1
+    return folded
+
+
+def prune_active_users(now):
+    from ..models import AnalyticsActiveUser
+
+    removed = AnalyticsActiveUser.query.filter(
+        AnalyticsActiveUser.start < now - ACTIVE_USER_RETENTION
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return removed
+
+
+def rollup_analytics(app, now=None, max_batches=MAX_BATCHES):
+    """Fold settled new messages and reactions into the rollups; returns rows folded"""
+    from ..models import Message, MessageReaction
+
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(seconds=SETTLE_SECONDS)
+    bot_user_id = app.config['BOT_USER_ID']
+
+    folded = _rollup_source('messages', Message, _read_messages, bot_user_id, cutoff, now, max_batches)
+    folded += _rollup_source('reactions', MessageReaction, _read_reactions, bot_user_id, cutoff, now, max_batches)
+    prune_active_users(now)
+    return folded
+
+
+def _bucket_starts(period, count, now):
+    latest = PERIODS[period](now)
+    return [latest - PERIOD_LENGTH[period] * i for i in range(count - 1, -1, -1)]
+
+
+def usage_series(period, count, now=None):
+    """Totals for the newest `count` periods, oldest first; periods without activity are zeros"""
+    from ..models import AnalyticsRollup
+
+    starts = _bucket_starts(period, count, now or datetime.utcnow())
+    rows = {row.start: row for row in AnalyticsRollup.query.filter(
+        AnalyticsRollup.period == period,
+        AnalyticsRollup.start >= starts[0]
+    ).all()}
+
+    series = []
+    for start in starts:
+        row = rows.get(start)
+        values = {column: (getattr(row, column) or 0) if row else 0 for column in TOTAL_COLUMNS}
+        latency_count = values.pop('bot_latency_count')
+        total = values.pop('bot_latency_ms_total')
+        values['bot_latency_ms_avg'] = round(total / latency_count) if latency_count else None
+        series.append({"start": start.isoformat(), **values})
+    return series
+
+
+def channel_series(channel_id, count, now=None):
+    """Hourly messages and reactions of one channel for the newest `count` hours"""
+    from ..models import AnalyticsChannelRollup
+
+    starts = _bucket_starts('hour', count, now or datetime.utcnow())
+    rows = {row.start: row for row in AnalyticsChannelRollup.query.filter(
+        AnalyticsChannelRollup.channel_id == channel_id,
+        AnalyticsChannelRollup.start >= starts[0]
+    ).all()}
+    return [{
+        "start": start.isoformat(),
+        "messages": rows[start].messages if start in rows else 0,
+        "reactions": rows[start].reactions if start in rows else 0,
+    } for start in starts]
+
+
+def freshness():
+    """When each source was last rolled up, and through which id"""
+    from ..models import AnalyticsWatermark
+
+    return {
+        mark.source: {
+            "last_id": mark.last_id,
+            "updated_at": mark.updated_at.isoformat() if mark.updated_at else None,
+        }
+        for mark in AnalyticsWatermark.query.all()
+    }
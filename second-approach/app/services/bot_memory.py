@@ -0,0 +1,184 @@
+# app/services/bot_memory.py
+
+"""
+Bounded conversation memory for bot DMs.
+
+The bot sees the last BOT_MEMORY_TURNS exchanges of a DM verbatim plus a
+rolling summary of everything older, stored per channel in
+bot_conversations. Messages that slide out of the verbatim window are folded
+into the summary by a background worker after the reply has been sent, and
+each fold reads only the messages past the previous one. Summary and turns
+together are trimmed to BOT_MEMORY_TOKENS, so prompt size stays flat however
+long the conversation runs.
+"""
+
+import logging
+import queue
+import threading
+from datetime import datetime
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+from .. import db
+from ..metrics import registry
+from .bot_tracing import count_tokens
+
+logger = logging.getLogger(__name__)
+
+FOLD_BATCH = 40  # messages folded per summarization call
+
+folds = registry.counter(
+    'chat_bot_memory_folds_total', 'Bot DM summary updates', ('outcome',)
+)
+
+
+def trim_history(summary, turns, budget):
+    """
+    Drop the oldest turns, then the summary, until everything fits in
+    `budget` tokens. A summary that can't fit on its own is dropped and the
+    newest turns that fit are kept instead. `turns` is a list of
+    (role, content) pairs.
+    """
+    if budget <= 0:
+        return '', []
+    sizes = [count_tokens(content) for _, content in turns]
+    summary_size = count_tokens(summary) if summary else 0
+    if summary_size > budget:
+        summary, summary_size = '', 0
+    start = 0
+    while start < len(turns) and summary_size + sum(sizes[start:]) > budget:
+        start += 1
+    return summary, turns[start:]
+
+
+class ConversationMemory:
+    def __init__(self):
+        self.turns = 4
+        self.token_budget = 1200
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def configure(self, turns, token_budget):
+        self.turns = turns
+        self.token_budget = token_budget
+
+    @property
+    def window(self):
+        """Messages kept verbatim: a user message and the bot's reply per turn"""
+        return self.turns * 2
+
+    def history(self, channel_id, bot_id):
+        """Return (summary, turns) for the channel, turns oldest first as ('human'|'ai', content)"""
+        from ..models import BotConversation, Message
+
+        conversation = db.session.get(BotConversation, channel_id)
+        summary = conversation.summary if conversation else ''
+        since = conversation.summarized_through_id if conversation else 0
+
+        rows = db.session.query(Message.user_id, Message.content).filter(
+            Message.channel_id == channel_id,
+            Message.id > since,
+            Message.deleted_at.is_(None)
+        ).order_by(Message.id.desc()).limit(self.window).all()
+
+        turns = [('ai' if user_id == bot_id else 'human', content) for user_id, content in reversed(rows)]
+        return trim_history(summary, turns, self.token_budget)
+
+    def schedule(self, app, channel_id, summarize):
+        """Fold the channel's older messages into its summary in the background"""
+        with self._lock:
+            if channel_id in self._pending:
+                return
+            self._pending.add(channel_id)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._worker, args=(app,), name='bot-memory', daemon=True)
+                self._thread.start()
+        self._queue.put((channel_id, summarize))
+
+    def _worker(self, app):
+        while True:
+            channel_id, summarize = self._queue.get()
+            with self._lock:
+                self._pending.discard(channel_id)
+            with app.app_context():
+                try:
+                    while self.fold(channel_id, app.config['BOT_USER_ID'], summarize):
+                        pass
+                except Exception as e:
+                    db.session.rollback()
+                    folds.inc(1, 'error')
+                    logger.error(f"Could not update bot memory for channel {channel_id}: {str(e)}", exc_info=True)
+                finally:
+                    db.session.remove()
+
+    def fold(self, channel_id, bot_id, summarize):
+        """
+        Summarize up to FOLD_BATCH messages that are older than the verbatim
+        window and not yet in the summary. Returns True if there may be more.
+        """
+        from ..models import BotConversation, Message
+
+        conversation = db.session.get(BotConversation, channel_id)
+        summary = conversation.summary if conversation else ''
+        since = conversation.summarized_through_id if conversation else 0
+
+        # Oldest message still inside the verbatim window
+        window_start = db.session.query(Message.id).filter(
+            Message.channel_id == channel_id,
+            Message.deleted_at.is_(None)
+        ).order_by(Message.id.desc()).offset(self.window - 1).limit(1).scalar()
+        if window_start is None:
+            return False
+
+        rows = db.session.query(Message.id, Message.user_id, Message.content).filter(
+            Message.channel_id == channel_id,
+            Message.id > since,
+            Message.id < window_start,
+            Message.deleted_at.is_(None)
+        ).order_by(Message.id).limit(FOLD_BATCH).all()
+        if not rows:
+            return False
+
+        turns = [('ai' if user_id == bot_id else 'human', content) for _, user_id, content in rows]
+        # Don't sit idle in a transaction for the length of an LLM call
+        db.session.commit()
+        new_summary = summarize(summary, turns)
+        through = rows[-1][0]
+
+        if conversation is None:
+            db.session.add(BotConversation(
+                channel_id=channel_id, summary=new_summary, summarized_through_id=through
+            ))
+        else:
+            # Only advance from the state we summarized; another worker may have folded meanwhile
+            result = db.session.execute(
+                update(BotConversation)
+                .where(
+                    BotConversation.channel_id == channel_id,
+                    BotConversation.summarized_through_id == since
+                )
+                .values(summary=new_summary, summarized_through_id=through, updated_at=datetime.utcnow())
+            )
+            if result.rowcount == 0:
+                db.session.rollback()
+                folds.inc(1, 'conflict')
+                return False
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            folds.inc(1, 'conflict')
+            return False
+        folds.inc(1, 'ok')
+        return len(rows) == FOLD_BATCH
+
+
+# Create a singleton instance
+conversation_memory = ConversationMemory()
+
+
+def init_app(app):
+    conversation_memory.configure(app.config['BOT_MEMORY_TURNS'], app.config['BOT_MEMORY_TOKENS'])
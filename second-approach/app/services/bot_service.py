@@ -1,14 +1,21 @@
 import os
+import hashlib
 import logging
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain.schema import Document
+from langchain.schema import Document, AIMessage, HumanMessage, SystemMessage
 from langchain_pinecone import PineconeVectorStore
-from langchain.prompts import ChatPromptTemplate
-from pinecone import Pinecone
-from openai import OpenAI
+from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
+
+from .bot_memory import trim_history
+from .bot_tracing import tracer, count_tokens
+from .http_clients import clients
+from .single_flight import SingleFlight, normalize_question
 
 logger = logging.getLogger(__name__)
 
+# Wrappers around the retrieved documents and the DM summary; they count against the cap
+CONTEXT_HEADER = "Context information is below:\n"
+SUMMARY_HEADER = "Summary of the earlier conversation:\n"
+
 class BotService:
     def __init__(self):
         api_key = os.environ.get('OPENAI_API_KEY')
@@ -22,22 +29,35 @@ class BotService:
 
         logger.info(f"Initializing BotService with index: {index_name}")
 
-        # Initialize Pinecone with new syntax
-        pc = Pinecone(api_key=pinecone_api_key)
-        
-        # Initialize components
-        self.embeddings = OpenAIEmbeddings(api_key=api_key)
+        # Bump BOT_KB_VERSION after reloading documents so identical questions
+        # asked across a reload don't share an answer
+        self.kb_version = os.environ.get('BOT_KB_VERSION', index_name)
+        self.flights = SingleFlight('bot_response')
+
+        # Initialize components on the shared, pooled transports
+        self.embeddings = clients.embeddings(api_key=api_key)
         self.vectorstore = PineconeVectorStore(
-            index=pc.Index(index_name),
+            index=clients.pinecone_index(index_name, api_key=pinecone_api_key),
             embedding=self.embeddings,
             text_key="text"
         )
         
-        self.chat = ChatOpenAI(
+        self.chat = clients.chat_model(
             model_name="gpt-3.5-turbo",
             temperature=0.7,
             api_key=api_key
         )
+
+        # Everything sent to the model (system prompt, retrieved context, DM
+        # history, question) is kept under BOT_PROMPT_TOKEN_CAP
+        self.prompt_token_cap = int(os.environ.get('BOT_PROMPT_TOKEN_CAP') or 6000)
+        self.summary_tokens = int(os.environ.get('BOT_SUMMARY_TOKENS') or 300)
+        self.summarizer = clients.chat_model(
+            model_name="gpt-3.5-turbo",
+            temperature=0,
+            max_tokens=self.summary_tokens,
+            api_key=api_key
+        )
         
         # Read system prompt from file
         prompt_path = os.path.join(os.path.dirname(__file__), 'bot_system_prompt.md')
@@ -49,37 +69,131 @@ class BotService:
             logger.error(f"Error reading system prompt file: {str(e)}")
             raise ValueError("Failed to read system prompt file")
 
+        self.system_tokens = count_tokens(self.system_prompt)
+
         self.rag_prompt = ChatPromptTemplate.from_messages([
             ("system", self.system_prompt),
-            ("system", "Context information is below:\n{context}"),
+            ("system", CONTEXT_HEADER + "{context}"),
+            MessagesPlaceholder("history"),
             ("human", "{question}")
         ])
 
-    async def get_response(self, message_content: str) -> str:
-        """Get a response from the LangChain chat model with RAG"""
+        self.summary_prompt = ChatPromptTemplate.from_messages([
+            ("system",
+             "You keep a running summary of a conversation between a user and an assistant. "
+             "Merge the new lines into the current summary. Keep the names, facts, questions and "
+             "answers a follow-up question might refer to, and drop small talk. "
+             "Reply with the updated summary only, in under {max_words} words."),
+            ("human", "Current summary:\n{summary}\n\nNew lines:\n{lines}")
+        ])
+
+    def get_response(self, message_content: str, history=None) -> str:
+        """
+        Get a response from the LangChain chat model with RAG. `history` is the
+        DM's (summary, turns) from bot_memory. Identical questions asked with the
+        same history while one is already being answered share that answer.
+        """
+        summary, turns = history or ('', [])
+        key = (self.kb_version, normalize_question(message_content), self._history_key(summary, turns))
+        return self.flights.do(key, lambda: self._generate_response(message_content, summary, turns))
+
+    @staticmethod
+    def _history_key(summary, turns):
+        if not summary and not turns:
+            return None
+        digest = hashlib.sha1(summary.encode('utf-8'))
+        for role, content in turns:
+            digest.update(f"\0{role}\0{content}".encode('utf-8'))
+        return digest.hexdigest()
+
+    def summarize(self, summary: str, turns: list) -> str:
+        """Fold (role, content) turns into a conversation summary; used by bot_memory"""
+        trace = tracer.start('bot.summarize')
+        try:
+            lines = "\n".join(f"{'User' if role == 'human' else 'Assistant'}: {content}" for role, content in turns)
+            with trace.span("summarize") as span:
+                response = self.summarizer.invoke(self.summary_prompt.invoke({
+                    "summary": summary or "(none yet)",
+                    "lines": lines,
+                    "max_words": self.summary_tokens * 3 // 4
+                }))
+                usage = getattr(response, "usage_metadata", None) or {}
+                span["turns"] = len(turns)
+                span["prompt_tokens"] = usage.get("input_tokens")
+                span["completion_tokens"] = usage.get("output_tokens")
+                tracer.record_tokens("summarize", "input", span["prompt_tokens"])
+                tracer.record_tokens("summarize", "output", span["completion_tokens"])
+            trace.finish()
+            return response.content.strip()
+        except Exception as e:
+            trace.finish(error=e)
+            raise
+
+    def _generate_response(self, message_content: str, summary: str = '', turns=()) -> str:
+        trace = tracer.start()
+        trace.attributes["question_chars"] = len(message_content)
         try:
             logger.info(f"Processing question: {message_content}")
+
+            # Plain blocking calls on the pooled sync clients (see http_clients.py);
+            # under the gevent worker their sockets yield to other requests.
+            # Embed the question separately so its cost is visible on its own
+            with trace.span("embedding") as span:
+                embedding = self.embeddings.embed_query(message_content)
+                span["tokens"] = count_tokens(message_content)
+                tracer.record_tokens("embedding", "input", span["tokens"])
             
             # Search for relevant documents
-            docs = await self.vectorstore.asimilarity_search_with_score(message_content, k=3)
+            with trace.span("vector_search") as span:
+                docs = self.vectorstore.similarity_search_by_vector_with_score(embedding, k=3)
+                span["documents"] = len(docs)
+                span["scores"] = [round(float(score), 4) for _, score in docs]
+                tracer.record_scores(span["scores"])
             logger.info(f"Found {len(docs)} relevant documents")
             
             # Extract just the documents without scores
             docs_only = [doc[0] for doc in docs]
-            context = "\n".join(doc.page_content for doc in docs_only)
-            logger.debug(f"Retrieved context: {context[:200]}...")  # Log first 200 chars of context
             
-            # Create messages with context
-            prompt_value = await self.rag_prompt.ainvoke({
-                "context": context,
-                "question": message_content
-            })
+            # Create messages with context, fitting history into what the cap leaves
+            with trace.span("prompt") as span:
+                # Count the message texts as sent, headers included, so the cap holds exactly
+                fixed_tokens = self.system_tokens + count_tokens(message_content)
+                context = "\n".join(doc.page_content for doc in docs_only)
+                while docs_only and fixed_tokens + count_tokens(CONTEXT_HEADER + context) > self.prompt_token_cap:
+                    docs_only.pop()
+                    context = "\n".join(doc.page_content for doc in docs_only)
+                logger.debug(f"Retrieved context: {context[:200]}...")  # Log first 200 chars of context
+
+                summary, turns = trim_history(
+                    SUMMARY_HEADER + summary if summary else '', list(turns),
+                    self.prompt_token_cap - fixed_tokens - count_tokens(CONTEXT_HEADER + context)
+                )
+                history = [SystemMessage(content=summary)] if summary else []
+                history += [HumanMessage(content=c) if role == 'human' else AIMessage(content=c) for role, c in turns]
+
+                prompt_value = self.rag_prompt.invoke({
+                    "context": context,
+                    "history": history,
+                    "question": message_content
+                })
+                span["context_chars"] = len(context)
+                span["context_documents"] = len(docs_only)
+                span["history_turns"] = len(turns)
+                span["history_tokens"] = (count_tokens(summary) if summary else 0) + sum(count_tokens(c) for _, c in turns)
             
-            response = await self.chat.ainvoke(prompt_value)
+            with trace.span("llm") as span:
+                response = self.chat.invoke(prompt_value)
+                usage = getattr(response, "usage_metadata", None) or {}
+                span["prompt_tokens"] = usage.get("input_tokens")
+                span["completion_tokens"] = usage.get("output_tokens")
+                tracer.record_tokens("llm", "input", span["prompt_tokens"])
+                tracer.record_tokens("llm", "output", span["completion_tokens"])
             logger.info("Generated response successfully")
+            trace.finish()
             return response.content
             
         except Exception as e:
+            trace.finish(error=e)
             logger.error(f"Error in get_response: {str(e)}", exc_info=True)
             return "I apologize, but I encountered an error while processing your question. Please try again."
 
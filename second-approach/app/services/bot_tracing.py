@@ -0,0 +1,132 @@
+# app/services/bot_tracing.py
+
+"""
+Stage-level tracing for the RAG bot.
+
+BotService.get_response wraps each stage (embedding, vector search, prompt
+formatting, LLM call) in a span that records its duration plus attributes
+such as token counts and retrieved-document scores. Finished traces feed
+per-stage histograms on /metrics; set BOT_TRACE_FILE to also append every
+trace as one JSON line to that file.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+from ..metrics import registry
+
+logger = logging.getLogger(__name__)
+
+STAGE_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32)
+SCORE_BUCKETS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+
+stage_seconds = registry.histogram(
+    'chat_bot_stage_seconds', 'Time spent in each bot pipeline stage', ('stage', 'outcome'), STAGE_BUCKETS
+)
+bot_tokens = registry.counter(
+    'chat_bot_tokens_total', 'Tokens sent to and received from OpenAI', ('stage', 'kind')
+)
+top_score = registry.histogram(
+    'chat_bot_retrieval_top_score', 'Similarity score of the best retrieved document', (), SCORE_BUCKETS
+)
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding('cl100k_base')
+except Exception:  # tiktoken ships with langchain-openai; fall back to a rough estimate
+    _encoding = None
+
+
+def count_tokens(text):
+    if _encoding is None:
+        return max(1, len(text) // 4)
+    return len(_encoding.encode(text, disallowed_special=()))
+
+
+class Trace:
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = uuid.uuid4().hex
+        self.started_at = datetime.utcnow()
+        self._started = time.perf_counter()
+        self.spans = []
+        self.attributes = {}
+        self.error = None
+
+    @contextmanager
+    def span(self, stage):
+        """Time a stage; the yielded dict collects attributes for it"""
+        attributes = {}
+        started = time.perf_counter()
+        outcome = 'ok'
+        try:
+            yield attributes
+        except BaseException as e:
+            outcome = 'error'
+            attributes['error'] = repr(e)
+            raise
+        finally:
+            duration = time.perf_counter() - started
+            self.spans.append({
+                "stage": stage,
+                "offset_ms": round((started - self._started) * 1000, 3),
+                "duration_ms": round(duration * 1000, 3),
+                **attributes,
+            })
+            stage_seconds.observe(duration, stage, outcome)
+
+    def finish(self, error=None):
+        self.error = repr(error) if error is not None else None
+        duration = time.perf_counter() - self._started
+        stage_seconds.observe(duration, 'total', 'error' if error is not None else 'ok')
+        self.tracer.export(self.as_dict(duration))
+
+    def as_dict(self, duration):
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": round(duration * 1000, 3),
+            "error": self.error,
+            **self.attributes,
+            "spans": self.spans,
+        }
+
+
+class BotTracer:
+    def __init__(self, export_path=None):
+        self.export_path = export_path
+        self._lock = threading.Lock()
+
+    def start(self, name='bot.get_response'):
+        return Trace(self, name)
+
+    def record_tokens(self, stage, kind, count):
+        if count:
+            bot_tokens.inc(count, stage, kind)
+
+    def record_scores(self, scores):
+        if scores:
+            top_score.observe(max(scores))
+
+    def export(self, trace):
+        if not self.export_path:
+            return
+        line = json.dumps(trace, ensure_ascii=False) + "\n"
+        try:
+            with self._lock:
+                with open(self.export_path, 'a', encoding='utf-8') as f:
+                    f.write(line)
+        except OSError as e:
+            logger.error(f"Could not export bot trace to {self.export_path}: {str(e)}")
+
+
+# Create a singleton instance
+tracer = BotTracer(export_path=os.environ.get('BOT_TRACE_FILE'))
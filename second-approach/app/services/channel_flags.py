@@ -0,0 +1,67 @@
+# app/services/channel_flags.py
+
+import threading
+from collections import OrderedDict
+
+from .. import db
+
+
+class BotDMFlagCache:
+    """
+    Per-process memo of Channel.is_bot_dm keyed by channel id.
+    The flag is fixed when a channel is created, so entries never go stale and
+    only need LRU bounding. Channels that don't exist are not cached.
+    """
+
+    def __init__(self, max_size=4096):
+        self.max_size = max_size
+        self._flags = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def is_bot_dm(self, channel_id):
+        with self._lock:
+            flag = self._flags.get(channel_id)
+            if flag is not None:
+                self._flags.move_to_end(channel_id)
+                self.hits += 1
+                return flag
+            self.misses += 1
+
+        from ..models import Channel
+        row = db.session.query(Channel.is_bot_dm).filter(Channel.id == channel_id).first()
+        if row is None:
+            return False
+
+        flag = bool(row[0])
+        self.remember(channel_id, flag)
+        return flag
+
+    def remember(self, channel_id, flag):
+        """Seed the memo, e.g. right after a channel is created"""
+        with self._lock:
+            self._flags[channel_id] = flag
+            self._flags.move_to_end(channel_id)
+            while len(self._flags) > self.max_size:
+                self._flags.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._flags.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._flags),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+# Create a singleton instance
+bot_dm_flags = BotDMFlagCache()
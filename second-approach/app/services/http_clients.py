@@ -0,0 +1,152 @@
+# app/services/http_clients.py
+
+"""
+Shared, pooled HTTP clients for OpenAI and Pinecone.
+
+Every OpenAI chat/embedding model and every Pinecone index comes from the
+`clients` registry, which builds them on one long-lived transport per
+process: an httpx.Client (HTTP/2 through httpx[http2]; HTTP2=false opts out) for
+OpenAI and a urllib3 pool per Pinecone index. Connections stay open between
+bot answers, so a question pays for a TLS handshake only when the pool is
+cold.
+
+The bot answers synchronously on the request's own greenlet (or thread), so
+the app uses the pooled *sync* clients. The gevent worker monkey-patches
+sockets, so a request blocked on OpenAI or Pinecone yields to the others;
+nothing in the request path may run an asyncio loop, since a second
+greenlet can't start one while the first is parked inside its own. Scripts
+that keep one loop for their whole run can ask for async_http_client().
+
+Tuned with HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE, HTTP_KEEPALIVE_EXPIRY,
+HTTP_TIMEOUT, HTTP2 and PINECONE_POOL_THREADS.
+"""
+
+import importlib.util
+import logging
+import os
+import threading
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name) or default)
+
+
+def _env_float(name, default):
+    return float(os.environ.get(name) or default)
+
+
+class ClientRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._http = None
+        self._async_http = None
+        self._pinecone = None
+        self._indexes = {}
+        self.configure()
+
+    def configure(self, **overrides):
+        """Read pool settings from the environment; keyword arguments win"""
+        h2_available = importlib.util.find_spec('h2') is not None
+        settings = {
+            'max_connections': _env_int('HTTP_MAX_CONNECTIONS', 20),
+            'max_keepalive': _env_int('HTTP_MAX_KEEPALIVE', 20),
+            'keepalive_expiry': _env_float('HTTP_KEEPALIVE_EXPIRY', 90),
+            'timeout': _env_float('HTTP_TIMEOUT', 60),
+            'http2': os.environ.get('HTTP2', 'auto').lower() in ('auto', 'true') and h2_available,
+            'pinecone_pool_threads': _env_int('PINECONE_POOL_THREADS', 4),
+        }
+        settings.update(overrides)
+        self.settings = settings
+
+    def _limits(self):
+        return httpx.Limits(
+            max_connections=self.settings['max_connections'],
+            max_keepalive_connections=self.settings['max_keepalive'],
+            keepalive_expiry=self.settings['keepalive_expiry'],
+        )
+
+    def http_client(self):
+        """The process-wide httpx.Client behind every OpenAI call"""
+        with self._lock:
+            if self._http is None:
+                self._http = httpx.Client(
+                    limits=self._limits(),
+                    timeout=self.settings['timeout'],
+                    http2=self.settings['http2'],
+                )
+                logger.info(f"Created pooled HTTP client ({self.settings})")
+            return self._http
+
+    def async_http_client(self):
+        """An httpx.AsyncClient; only for code that runs one event loop for its whole life"""
+        with self._lock:
+            if self._async_http is None:
+                self._async_http = httpx.AsyncClient(
+                    limits=self._limits(),
+                    timeout=self.settings['timeout'],
+                    http2=self.settings['http2'],
+                )
+            return self._async_http
+
+    def chat_model(self, async_http=False, **kwargs):
+        from langchain_openai import ChatOpenAI
+
+        if async_http:
+            kwargs['http_async_client'] = self.async_http_client()
+        return ChatOpenAI(http_client=self.http_client(), **kwargs)
+
+    def embeddings(self, async_http=False, **kwargs):
+        from langchain_openai import OpenAIEmbeddings
+
+        if async_http:
+            kwargs['http_async_client'] = self.async_http_client()
+        return OpenAIEmbeddings(http_client=self.http_client(), **kwargs)
+
+    def pinecone(self, api_key=None):
+        from pinecone import Pinecone
+
+        with self._lock:
+            if self._pinecone is None:
+                self._pinecone = Pinecone(
+                    api_key=api_key or os.environ.get('PINECONE_API_KEY'),
+                    pool_threads=self.settings['pinecone_pool_threads'],
+                )
+            return self._pinecone
+
+    def pinecone_index(self, name, api_key=None):
+        """A cached Index whose urllib3 pool keeps connections to the index host alive"""
+        client = self.pinecone(api_key)
+        with self._lock:
+            index = self._indexes.get(name)
+            if index is None:
+                index = self._indexes[name] = client.Index(
+                    name,
+                    pool_threads=self.settings['pinecone_pool_threads'],
+                    connection_pool_maxsize=self.settings['max_connections'],
+                )
+            return index
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self.settings,
+                "http_client": self._http is not None,
+                "pinecone_indexes": sorted(self._indexes),
+            }
+
+    def close(self):
+        with self._lock:
+            if self._http is not None:
+                self._http.close()
+                self._http = None
+            self._async_http = None
+            self._indexes.clear()
+            self._pinecone = None
+
+
+# Create a singleton instance
+clients = ClientRegistry()
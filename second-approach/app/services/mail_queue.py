@@ -0,0 +1,261 @@
+# app/services/mail_queue.py
+
+"""
+Asynchronous outbound mail.
+
+enqueue_email() writes to the outbound_emails table inside the caller's
+transaction, so requests never talk to SMTP. drain_outbox() delivers due
+rows over a single SMTP connection per drain, retrying failures with
+exponential backoff. Rows are claimed with FOR UPDATE SKIP LOCKED, so any
+number of workers can drain concurrently.
+
+Bodies carry live magic-link tokens, so a row's body is blanked as soon as
+it is sent or given up on; maintenance deletes finished rows after
+MAIL_RETENTION_DAYS.
+
+The in-process sender runs every MAIL_QUEUE_INTERVAL seconds and is woken
+as soon as a request queues mail. Requests never deliver themselves: with
+MAIL_QUEUE_INTERVAL=0, run `flask send-mail` (cron, sidecar) instead.
+"""
+
+import logging
+import smtplib
+import threading
+from datetime import datetime, timedelta
+
+from flask_mail import Message as MailMessage
+
+from .. import db, mail
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 6
+BACKOFF_BASE = 30  # seconds; doubles per attempt
+BACKOFF_MAX = 3600
+LATENCY_BUCKETS = (0.5, 1, 2, 5, 10, 30, 60, 300, 900)
+
+
+class MailQueueStats:
+    """In-process delivery counters and a latency histogram (enqueue to sent)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.latency_sum = 0.0
+        self.latency_buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def record_sent(self, latency):
+        with self._lock:
+            self.sent += 1
+            self.latency_sum += latency
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if latency <= bound:
+                    self.latency_buckets[i] += 1
+                    break
+            else:
+                self.latency_buckets[-1] += 1
+
+    def record_retry(self):
+        with self._lock:
+            self.retried += 1
+
+    def record_failed(self):
+        with self._lock:
+            self.failed += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "sent": self.sent,
+                "retried": self.retried,
+                "failed": self.failed,
+                "latency_avg_seconds": round(self.latency_sum / self.sent, 3) if self.sent else None,
+                "latency_histogram": {
+                    **{f"le_{bound}": count for bound, count in zip(LATENCY_BUCKETS, self.latency_buckets)},
+                    "le_inf": self.latency_buckets[-1],
+                },
+            }
+
+
+stats = MailQueueStats()
+
+
+def enqueue_email(recipient, subject, body):
+    """Add an email to the outbox. The caller commits, then calls deliver_soon()."""
+    from ..models import OutboundEmail
+
+    email = OutboundEmail(recipient=recipient, subject=subject, body=body)
+    db.session.add(email)
+    return email
+
+
+def deliver_soon(app):
+    """Nudge the background sender; without one, `flask send-mail` picks the email up"""
+    if sender.running:
+        sender.wake()
+
+
+def queue_depth():
+    from ..models import OutboundEmail
+
+    return OutboundEmail.query.filter_by(status='pending').count()
+
+
+def purge_finished(now, retention):
+    """Delete sent and failed rows older than `retention`; pending rows are never touched"""
+    from ..models import OutboundEmail
+
+    removed = OutboundEmail.query.filter(
+        OutboundEmail.status.in_(('sent', 'failed')),
+        OutboundEmail.created_at < now - retention
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return removed
+
+
+def backoff(attempts):
+    return timedelta(seconds=min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX))
+
+
+def _claim_batch(now):
+    from ..models import OutboundEmail
+
+    return OutboundEmail.query.filter(
+        OutboundEmail.status == 'pending',
+        OutboundEmail.next_attempt_at <= now
+    ).order_by(OutboundEmail.next_attempt_at).limit(BATCH_SIZE).with_for_update(skip_locked=True).all()
+
+
+def drain_outbox(app):
+    """Deliver every due email over one SMTP connection. Returns the number sent."""
+    sent = 0
+    with app.app_context():
+        batch = _claim_batch(datetime.utcnow())
+        if not batch:
+            db.session.rollback()
+            return 0
+
+        try:
+            connection = mail.connect().__enter__()
+        except Exception as e:
+            # Server unreachable: the whole batch counts as one failed attempt
+            logger.error(f"Could not connect to SMTP server: {str(e)}")
+            for email in batch:
+                _mark_failed_attempt(email, f"connect: {e}")
+            db.session.commit()
+            return 0
+
+        try:
+            while batch:
+                for position, email in enumerate(batch):
+                    try:
+                        connection.send(MailMessage(
+                            email.subject,
+                            recipients=[email.recipient],
+                            body=email.body
+                        ))
+                    except smtplib.SMTPServerDisconnected as e:
+                        _mark_failed_attempt(email, str(e))
+                        try:
+                            connection = _reconnect(connection)
+                        except Exception as e:
+                            # Server gone: the rest of the batch counts as one failed attempt
+                            logger.error(f"Could not reconnect to SMTP server: {str(e)}")
+                            for remaining in batch[position + 1:]:
+                                _mark_failed_attempt(remaining, f"connect: {e}")
+                            batch = None
+                            break
+                        continue
+                    except Exception as e:
+                        _mark_failed_attempt(email, str(e))
+                        continue
+
+                    email.status = 'sent'
+                    email.body = ''
+                    email.sent_at = datetime.utcnow()
+                    email.attempts += 1
+                    stats.record_sent((email.sent_at - email.created_at).total_seconds())
+                    sent += 1
+                db.session.commit()
+                batch = _claim_batch(datetime.utcnow()) if batch else None
+            db.session.rollback()
+        finally:
+            try:
+                connection.__exit__(None, None, None)
+            except Exception:
+                pass
+    if sent:
+        logger.info(f"Delivered {sent} queued emails")
+    return sent
+
+
+def _reconnect(connection):
+    try:
+        connection.__exit__(None, None, None)
+    except Exception:
+        pass
+    return mail.connect().__enter__()
+
+
+def _mark_failed_attempt(email, error):
+    email.attempts += 1
+    email.last_error = error[:1000]
+    if email.attempts >= MAX_ATTEMPTS:
+        email.status = 'failed'
+        email.body = ''
+        stats.record_failed()
+        logger.error(f"Giving up on email {email.id} to {email.recipient}: {error}")
+    else:
+        email.next_attempt_at = datetime.utcnow() + backoff(email.attempts)
+        stats.record_retry()
+        logger.warning(f"Email {email.id} attempt {email.attempts} failed: {error}")
+
+
+class MailSender:
+    """Background loop that drains the outbox every interval, or sooner when woken"""
+
+    def __init__(self):
+        self._thread = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, app, interval):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self._loop, args=(app, interval), name='mail-sender', daemon=True
+        )
+        self._thread.start()
+        logger.info(f"Mail sender started (every {interval}s)")
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _loop(self, app, interval):
+        while not self._stop.is_set():
+            self._wake.wait(interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+            try:
+                drain_outbox(app)
+            except Exception as e:
+                logger.error(f"Mail sender drain failed: {str(e)}", exc_info=True)
+
+
+# Create a singleton instance
+sender = MailSender()
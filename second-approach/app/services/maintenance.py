@@ -0,0 +1,291 @@
+# app/services/maintenance.py
+
+"""
+Periodic database maintenance.
+
+Each run folds new messages and reactions into the analytics rollups,
+purges used or expired magic links and old sent or failed outbound mail,
+hard-deletes message and
+channel tombstones once their grace period has passed (clients polling with
+`after` have seen the deletion by then), creates upcoming message partitions
+and refreshes planner statistics. Every task reports rows removed and time.
+
+Run it with `flask maintenance`, or set MAINTENANCE_INTERVAL to run it in
+process. Only the worker holding the leader lock runs the in-process
+schedule: a session-level advisory lock on Postgres, a file lock elsewhere.
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_, text
+
+from .. import db
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+# Arbitrary constant shared by every worker; identifies the maintenance advisory lock
+ADVISORY_LOCK_KEY = 727274
+ANALYZE_TABLES = ['messages', 'message_reactions', 'channels', 'channel_memberships', 'magic_links',
+                  'analytics_rollups', 'analytics_channel_rollups']
+
+
+def purge_magic_links(now):
+    from ..models import MagicLink
+
+    removed = MagicLink.query.filter(
+        or_(MagicLink.used_at.isnot(None), MagicLink.expires_at < now)
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return removed
+
+
+def purge_rate_limit_buckets(now):
+    """Drop shared rate-limit buckets idle for a day; they'd be full again anyway"""
+    from ..models import RateLimitBucket
+
+    cutoff = (now - datetime(1970, 1, 1)).total_seconds() - 86400
+    removed = RateLimitBucket.query.filter(
+        RateLimitBucket.updated_at < cutoff
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return removed
+
+
+def purge_outbound_emails(app, now):
+    from .mail_queue import purge_finished
+
+    return purge_finished(now, timedelta(days=app.config['MAIL_RETENTION_DAYS']))
+
+
+def purge_deleted_messages(now, grace):
+    """Hard-delete soft-deleted messages (and their reactions) older than the grace period"""
+    from ..models import Message, MessageReaction
+
+    cutoff = now - grace
+    removed = 0
+    while True:
+        ids = [row[0] for row in db.session.query(Message.id).filter(
+            Message.deleted_at.isnot(None), Message.deleted_at < cutoff
+        ).limit(BATCH_SIZE).all()]
+        if not ids:
+            return removed
+        MessageReaction.query.filter(MessageReaction.message_id.in_(ids)).delete(synchronize_session=False)
+        Message.query.filter(Message.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        removed += len(ids)
+
+
+def purge_deleted_channels(now, grace):
+    """Hard-delete soft-deleted channels with their memberships, messages and reactions"""
+    from ..models import BotConversation, Channel, ChannelMembership, Message, MessageReaction
+
+    cutoff = now - grace
+    channel_ids = [row[0] for row in db.session.query(Channel.id).filter(
+        Channel.deleted_at.isnot(None), Channel.deleted_at < cutoff
+    ).all()]
+
+    for channel_id in channel_ids:
+        while True:
+            ids = [row[0] for row in db.session.query(Message.id).filter(
+                Message.channel_id == channel_id
+            ).limit(BATCH_SIZE).all()]
+            if not ids:
+                break
+            MessageReaction.query.filter(MessageReaction.message_id.in_(ids)).delete(synchronize_session=False)
+            Message.query.filter(Message.id.in_(ids)).delete(synchronize_session=False)
+            db.session.commit()
+
+        ChannelMembership.query.filter_by(channel_id=channel_id).delete(synchronize_session=False)
+        BotConversation.query.filter_by(channel_id=channel_id).delete(synchronize_session=False)
+        Channel.query.filter_by(id=channel_id).delete(synchronize_session=False)
+        db.session.commit()
+    return len(channel_ids)
+
+
+def rollup_analytics(app):
+    from .analytics import rollup_analytics as rollup
+
+    return rollup(app)
+
+
+def ensure_message_partitions(app):
+    from .message_partitions import ensure_partitions
+
+    return len(ensure_partitions(months_ahead=app.config['MESSAGE_PARTITIONS_AHEAD']))
+
+
+def analyze_tables():
+    for table in ANALYZE_TABLES:
+        db.session.execute(text(f"ANALYZE {table}"))
+    db.session.commit()
+    return 0
+
+
+def run_maintenance(app, now=None):
+    """Run every task once. Returns a report with rows removed and seconds per task."""
+    now = now or datetime.utcnow()
+    grace = timedelta(days=app.config['TOMBSTONE_GRACE_DAYS'])
+
+    tasks = [
+        # Before the purges, so deleted messages are still counted
+        ('rollup_analytics', lambda: rollup_analytics(app)),
+        ('purge_magic_links', lambda: purge_magic_links(now)),
+        ('purge_rate_limit_buckets', lambda: purge_rate_limit_buckets(now)),
+        ('purge_outbound_emails', lambda: purge_outbound_emails(app, now)),
+        ('purge_deleted_messages', lambda: purge_deleted_messages(now, grace)),
+        ('purge_deleted_channels', lambda: purge_deleted_channels(now, grace)),
+        ('ensure_message_partitions', lambda: ensure_message_partitions(app)),
+        ('analyze', analyze_tables),
+    ]
+
+    started = time.perf_counter()
+    results = []
+    for name, task in tasks:
+        task_started = time.perf_counter()
+        entry = {"task": name}
+        try:
+            entry["rows"] = task()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Maintenance task {name} failed: {str(e)}", exc_info=True)
+            entry["error"] = str(e)
+        entry["seconds"] = round(time.perf_counter() - task_started, 3)
+        results.append(entry)
+        logger.info(f"Maintenance {name}: {entry}")
+
+    report = {
+        "started_at": now.isoformat(),
+        "seconds": round(time.perf_counter() - started, 3),
+        "tasks": results,
+    }
+    scheduler.last_report = report
+    return report
+
+
+class LeaderLock:
+    """Cross-worker lock that stays held by whichever worker acquires it first"""
+
+    def __init__(self, app):
+        self.app = app
+        self._connection = None
+        self._file = None
+
+    def acquire(self):
+        if self.held:
+            return True
+        with self.app.app_context():
+            if db.engine.dialect.name == 'postgresql':
+                return self._acquire_advisory()
+        return self._acquire_file()
+
+    @property
+    def held(self):
+        return self._connection is not None or self._file is not None
+
+    def _acquire_advisory(self):
+        connection = db.engine.connect()
+        try:
+            locked = connection.execute(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": ADVISORY_LOCK_KEY}
+            ).scalar()
+            # Keep the lock's transaction from idling open; the lock is session-level
+            connection.commit()
+        except Exception:
+            connection.close()
+            raise
+        if locked:
+            self._connection = connection
+            return True
+        connection.close()
+        return False
+
+    def _acquire_file(self):
+        import fcntl
+
+        os.makedirs(self.app.instance_path, exist_ok=True)
+        handle = open(os.path.join(self.app.instance_path, 'maintenance.lock'), 'w')
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        self._file = handle
+        return True
+
+    def check(self):
+        """Verify the advisory lock's connection is still alive; drop leadership if not"""
+        if self._connection is None:
+            return self.held
+        try:
+            self._connection.execute(text("SELECT 1")).scalar()
+            self._connection.commit()
+            return True
+        except Exception:
+            logger.warning("Lost maintenance leader connection")
+            self.release()
+            return False
+
+    def release(self):
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except Exception:
+                pass
+            self._connection = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class MaintenanceScheduler:
+    """Runs run_maintenance every `interval` seconds on the elected leader worker"""
+
+    def __init__(self):
+        self.last_report = None
+        self.is_leader = False
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self, app, interval):
+        if self._thread is not None:
+            return
+        self._lock = LeaderLock(app)
+        self._thread = threading.Thread(
+            target=self._loop, args=(app, interval), name='maintenance', daemon=True
+        )
+        self._thread.start()
+        logger.info(f"Maintenance scheduler started (every {interval}s)")
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self, app, interval):
+        # Stagger the first run so freshly booted workers don't all race for the lock
+        if self._stop.wait(min(interval, 60)):
+            return
+        while not self._stop.is_set():
+            try:
+                self.is_leader = self._lock.acquire() and self._lock.check()
+                if self.is_leader:
+                    with app.app_context():
+                        run_maintenance(app)
+            except Exception as e:
+                logger.error(f"Maintenance run failed: {str(e)}", exc_info=True)
+            self._stop.wait(interval)
+        self._lock.release()
+
+    def status(self):
+        return {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "is_leader": self.is_leader,
+            "last_report": self.last_report,
+        }
+
+
+# Create a singleton instance
+scheduler = MaintenanceScheduler()
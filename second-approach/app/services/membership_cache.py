@@ -0,0 +1,120 @@
+# app/services/membership_cache.py
+
+import threading
+import time
+from collections import OrderedDict
+
+from .. import db
+
+
+class MembershipCache:
+    """
+    Per-process cache of the set of live channel ids each user belongs to.
+
+    Sets are loaded with one query and kept for `ttl` seconds. A channel that
+    is missing from a cached set triggers a single reload before access is
+    denied, so memberships created by another worker are picked up right away;
+    only removals rely on the TTL.
+    """
+
+    def __init__(self, max_size=4096, ttl=30):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._sets = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    def configure(self, max_size=None, ttl=None):
+        """Apply app config and start from an empty cache"""
+        if max_size is not None:
+            self.max_size = max_size
+        if ttl is not None:
+            self.ttl = ttl
+        self.clear()
+
+    def channel_ids(self, user_id):
+        """Return the frozenset of channel ids user_id is a member of"""
+        return self._lookup(user_id)[0]
+
+    def is_member(self, user_id, channel_id):
+        channel_ids, loaded = self._lookup(user_id)
+        if channel_id in channel_ids or loaded:
+            return channel_id in channel_ids
+
+        # Not in the cached set: it may have been created elsewhere since we loaded
+        with self._lock:
+            self.reloads += 1
+        return channel_id in self._load(user_id)
+
+    def _lookup(self, user_id):
+        """Return (channel_ids, loaded) where loaded means we just hit the DB"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sets.get(user_id)
+            if entry is not None and entry[1] > now:
+                self._sets.move_to_end(user_id)
+                self.hits += 1
+                return entry[0], False
+            self.misses += 1
+        return self._load(user_id), True
+
+    def _load(self, user_id):
+        from ..models import Channel, ChannelMembership
+
+        rows = db.session.query(ChannelMembership.channel_id).join(
+            Channel, Channel.id == ChannelMembership.channel_id
+        ).filter(
+            ChannelMembership.user_id == user_id,
+            Channel.deleted_at.is_(None)
+        ).all()
+        channel_ids = frozenset(row[0] for row in rows)
+
+        if self.max_size > 0 and self.ttl > 0:
+            with self._lock:
+                self._sets[user_id] = (channel_ids, time.monotonic() + self.ttl)
+                self._sets.move_to_end(user_id)
+                while len(self._sets) > self.max_size:
+                    self._sets.popitem(last=False)
+        return channel_ids
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            self._sets.pop(user_id, None)
+
+    def discard_channel(self, channel_id):
+        """Drop a deleted channel from every cached set"""
+        with self._lock:
+            for user_id, (channel_ids, expires) in list(self._sets.items()):
+                if channel_id in channel_ids:
+                    self._sets[user_id] = (channel_ids - {channel_id}, expires)
+
+    def clear(self):
+        with self._lock:
+            self._sets.clear()
+            self.hits = self.misses = self.reloads = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._sets),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "reloads": self.reloads,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def init_app(app):
+    membership_cache.configure(
+        max_size=app.config["MEMBERSHIP_CACHE_SIZE"],
+        ttl=app.config["MEMBERSHIP_CACHE_TTL"],
+    )
+
+
+# Create a singleton instance
+membership_cache = MembershipCache()
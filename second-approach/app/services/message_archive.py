@@ -0,0 +1,321 @@
+# app/services/message_archive.py
+
+"""
+Cold archival of old messages.
+
+Whole months older than the retention window are written to gzipped NDJSON
+files, one per channel (<archive dir>/<YYYY-MM>/channel-<id>.ndjson.gz),
+and then removed from the database: by dropping the month's partition when
+messages is partitioned, otherwise with DELETEs committed a batch at a time. Soft-deleted
+messages are not archived. Reads go through iter_archived_records, which the
+export and history endpoints use on demand.
+"""
+
+import gzip
+import json
+import logging
+import os
+from datetime import datetime
+
+from .. import db
+from .message_export import iter_period_records
+from .message_partitions import add_months, month_start, drop_partition, partition_exists
+
+logger = logging.getLogger(__name__)
+
+DELETE_BATCH_SIZE = 5000
+PENDING = 'pending.json'
+
+
+def month_key(start):
+    return f"{start.year:04d}-{start.month:02d}"
+
+
+def archived_months(directory):
+    """Sorted list of YYYY-MM keys whose files are complete (archived, or being deleted from the DB)"""
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        name for name in os.listdir(directory)
+        if os.path.exists(os.path.join(directory, name, 'manifest.json'))
+        or (_read_json(os.path.join(directory, name, PENDING)) or {}).get('stage') == 'deleting'
+    )
+
+
+def channel_archive_months(directory, channel_id):
+    return [
+        month for month in archived_months(directory)
+        if os.path.exists(_channel_path(directory, month, channel_id))
+    ]
+
+
+def iter_archived_records(directory, channel_id, months=None):
+    """Yield archived message dicts for a channel, oldest month first"""
+    for month in months if months is not None else channel_archive_months(directory, channel_id):
+        path = _channel_path(directory, month, channel_id)
+        if not os.path.exists(path):
+            continue
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def archive_month(directory, start):
+    """
+    Write one month of messages to archive files, then remove the month from the
+    database. Returns a summary dict.
+
+    Progress is recorded in <month>/pending.json so a run that dies part way is
+    finished by the next one: while files are being written the marker holds
+    each channel file's previous size, and a retry truncates back to it (the
+    rows are all still in the database, since nothing is deleted yet). Once the
+    files are flushed to disk the marker switches to "deleting" with the
+    archived counts and highest id, and a retry only finishes the deletes and
+    the manifest instead of exporting again.
+    """
+    from ..models import Message
+
+    end = add_months(start, 1)
+    key = month_key(start)
+    month_dir = os.path.join(directory, key)
+    os.makedirs(month_dir, exist_ok=True)
+
+    pending = _read_json(os.path.join(month_dir, PENDING))
+    if pending is not None and pending['stage'] == 'deleting':
+        logger.warning(f"Resuming the interrupted archive of {key}")
+        return _delete_and_record(month_dir, key, start, end, pending)
+    _roll_back(month_dir, pending, start, end)
+
+    # Rows inserted while we export (late history imports) are left for the next run
+    max_id = db.session.query(db.func.max(Message.id)).scalar() or 0
+    sizes = {
+        name: os.path.getsize(os.path.join(month_dir, name))
+        for name in os.listdir(month_dir) if name.endswith('.ndjson.gz')
+    }
+    _write_json(os.path.join(month_dir, PENDING), {"stage": "writing", "sizes": sizes})
+
+    counts = {}
+    current_channel = None
+    out = None
+    try:
+        for record in iter_period_records(start, end, max_id=max_id):
+            if record['channel_id'] != current_channel:
+                if out is not None:
+                    _finish(out, current_channel, month_dir)
+                current_channel = record['channel_id']
+                out = gzip.open(_channel_path(directory, key, current_channel) + '.tmp', 'wt', encoding='utf-8')
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            counts[current_channel] = counts.get(current_channel, 0) + 1
+        if out is not None:
+            _finish(out, current_channel, month_dir)
+            out = None
+    finally:
+        if out is not None:
+            out.close()
+
+    # Only once every file is safely on disk do we drop anything. The manifest
+    # totals are settled here so that replaying the last step can't count twice.
+    channel_counts = (_read_json(os.path.join(month_dir, 'manifest.json')) or {}).get('channel_counts', {})
+    for channel_id, count in counts.items():
+        channel_counts[str(channel_id)] = channel_counts.get(str(channel_id), 0) + count
+    pending = {
+        "stage": "deleting",
+        "max_id": max_id,
+        "counts": {str(channel_id): count for channel_id, count in counts.items()},
+        "channel_counts": channel_counts,
+    }
+    _write_json(os.path.join(month_dir, PENDING), pending)
+    return _delete_and_record(month_dir, key, start, end, pending)
+
+
+def _roll_back(month_dir, pending, start, end):
+    """Undo a run that died while writing files; its rows were never deleted"""
+    sizes = pending['sizes'] if pending is not None else None
+    if pending is None and not os.path.exists(os.path.join(month_dir, 'manifest.json')):
+        _check_unmarked_leftovers(month_dir, start, end)
+        sizes = {}
+    for name in os.listdir(month_dir):
+        path = os.path.join(month_dir, name)
+        if name.endswith('.tmp'):
+            os.remove(path)
+        elif sizes is not None and name.endswith('.ndjson.gz'):
+            if name not in sizes:
+                os.remove(path)
+            elif os.path.getsize(path) > sizes[name]:
+                with open(path, 'r+b') as f:
+                    f.truncate(sizes[name])
+    if pending is not None:
+        os.remove(os.path.join(month_dir, PENDING))
+
+
+def _check_unmarked_leftovers(month_dir, start, end):
+    """
+    Files with neither a marker nor a manifest come from a run that predates
+    markers. They may only be discarded if the database still holds every
+    row in them; otherwise they're the only copy.
+    """
+    from ..models import Message
+
+    for name in os.listdir(month_dir):
+        if not name.endswith('.ndjson.gz'):
+            continue
+        channel_id = int(name[len('channel-'):-len('.ndjson.gz')])
+        with gzip.open(os.path.join(month_dir, name), 'rt', encoding='utf-8') as f:
+            ids = [json.loads(line)['id'] for line in f if line.strip()]
+        present = sum(
+            db.session.query(db.func.count(Message.id)).filter(
+                Message.channel_id == channel_id,
+                Message.created_at >= start, Message.created_at < end,
+                Message.id.in_(ids[i:i + DELETE_BATCH_SIZE])
+            ).scalar()
+            for i in range(0, len(ids), DELETE_BATCH_SIZE)
+        )
+        if present != len(ids):
+            raise RuntimeError(
+                f"{month_dir}/{name} holds {len(ids) - present} messages missing from the database; "
+                f"restore them before archiving this month again"
+            )
+
+
+def _delete_and_record(month_dir, key, start, end, pending):
+    from ..models import Channel, Message
+
+    max_id = pending['max_id']
+    counts = {int(channel_id): count for channel_id, count in pending['counts'].items()}
+
+    # Drop the partition only if it holds nothing newer than what was exported
+    late = db.session.query(Message.id).filter(
+        Message.created_at >= start, Message.created_at < end, Message.id > max_id
+    ).first()
+    dropped_partition = False
+    if late is None and partition_exists(start):
+        _delete_reactions(start, end, max_id)
+        dropped_partition = drop_partition(start)
+        db.session.commit()
+    # Rows outside a monthly partition (plain table, or messages_default)
+    removed = _delete_in_batches(start, end, max_id)
+
+    if counts:
+        db.session.query(Channel).filter(Channel.id.in_(counts.keys())).update(
+            {Channel.change_seq: Channel.change_seq + 1}, synchronize_session=False
+        )
+    db.session.commit()
+
+    summary = {
+        "month": key,
+        "archived": sum(counts.values()),
+        "channels": len(counts),
+        "dropped_partition": dropped_partition,
+        "deleted_rows": removed,
+        "archived_at": datetime.utcnow().isoformat(),
+    }
+    # channel_counts includes earlier archives of the month (history imported after the fact)
+    _write_json(os.path.join(month_dir, 'manifest.json'), dict(summary, channel_counts=pending['channel_counts']))
+    os.remove(os.path.join(month_dir, PENDING))
+
+    logger.info(f"Archived {summary['archived']} messages from {key} across {summary['channels']} channels")
+    return summary
+
+
+def archive_older_than(directory, retention_months, now=None):
+    """Archive every month that ends before the retention window"""
+    from ..models import Message
+
+    cutoff = add_months(month_start(now or datetime.utcnow()), -retention_months)
+    summaries = []
+    start = None
+    while True:
+        # Jump straight to the next month that has rows, skipping empty gaps
+        query = db.session.query(db.func.min(Message.created_at))
+        if start is not None:
+            query = query.filter(Message.created_at >= start)
+        oldest = query.scalar()
+        if oldest is None or oldest >= cutoff:
+            return summaries
+        start = month_start(oldest)
+        summaries.append(archive_month(directory, start))
+        start = add_months(start, 1)
+
+
+def _archived_ids(start, end, max_id, after_id):
+    from ..models import Message
+
+    return [row[0] for row in db.session.query(Message.id).filter(
+        Message.created_at >= start, Message.created_at < end,
+        Message.id <= max_id, Message.id > after_id
+    ).order_by(Message.id).limit(DELETE_BATCH_SIZE).all()]
+
+
+def _delete_reactions(start, end, max_id):
+    """Remove the reactions of a month about to be dropped as a partition, a batch per commit"""
+    from ..models import MessageReaction
+
+    after_id = 0
+    while True:
+        ids = _archived_ids(start, end, max_id, after_id)
+        if not ids:
+            return
+        MessageReaction.query.filter(MessageReaction.message_id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        after_id = ids[-1]
+
+
+def _delete_in_batches(start, end, max_id):
+    """Delete archived messages and their reactions, committing each batch"""
+    from ..models import Message, MessageReaction
+
+    removed = 0
+    while True:
+        ids = _archived_ids(start, end, max_id, 0)
+        if not ids:
+            return removed
+        MessageReaction.query.filter(MessageReaction.message_id.in_(ids)).delete(synchronize_session=False)
+        Message.query.filter(Message.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        removed += len(ids)
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_json(path, data):
+    with open(path + '.tmp', 'w') as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + '.tmp', path)
+
+
+def _channel_path(directory, month, channel_id):
+    return os.path.join(directory, month, f"channel-{channel_id}.ndjson.gz")
+
+
+def _finish(out, channel_id, month_dir):
+    out.close()
+    final = os.path.join(month_dir, f"channel-{channel_id}.ndjson.gz")
+    if not os.path.exists(final):
+        _fsync(final + '.tmp')
+        os.replace(final + '.tmp', final)
+        return
+
+    # Concatenated gzip members read back as one stream, so append rather than overwrite
+    with open(final, 'ab') as dest, open(final + '.tmp', 'rb') as src:
+        while True:
+            block = src.read(1024 * 1024)
+            if not block:
+                break
+            dest.write(block)
+        dest.flush()
+        os.fsync(dest.fileno())
+    os.remove(final + '.tmp')
+
+
+def _fsync(path):
+    with open(path, 'rb') as f:
+        os.fsync(f.fileno())
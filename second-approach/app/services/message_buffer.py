@@ -0,0 +1,296 @@
+# app/services/message_buffer.py
+
+import json
+import threading
+from collections import OrderedDict
+
+from .. import db
+
+# Rough per-entry bookkeeping overhead on top of the serialized size
+ENTRY_OVERHEAD = 200
+TOMBSTONE_SIZE = 100
+
+
+def _size(entry):
+    return len(json.dumps(entry, ensure_ascii=False)) + ENTRY_OVERHEAD
+
+
+class ChannelBuffer:
+    """
+    The newest messages of one channel, already in the list_messages shape.
+
+    Everything created after `window_start` is present (all of the channel
+    when `complete`), and `tombstones` holds every message deleted after it,
+    so any poll whose cursor is at or after `window_start` can be answered
+    exactly. `seq` is the channel's change_seq the contents reflect.
+    """
+
+    def __init__(self, seq, capacity):
+        self.seq = seq
+        self.capacity = capacity
+        self.live = OrderedDict()  # id -> (created_at, entry), oldest first
+        self.tombstones = {}  # id -> deleted_at
+        self.window_start = None
+        self.complete = True
+        self.bytes = 0
+
+    def covers(self, after):
+        if after is None:
+            return self.complete
+        return self.complete or after >= self.window_start
+
+    def read(self, after):
+        messages = [entry for created_at, entry in self.live.values() if after is None or created_at > after]
+        deleted = [message_id for message_id, deleted_at in self.tombstones.items()
+                   if after is None or deleted_at > after]
+        return messages, deleted
+
+    def add(self, created_at, entry):
+        if entry["id"] in self.live:
+            return
+        self.live[entry["id"]] = (created_at, entry)
+        self.bytes += _size(entry)
+        if len(self.live) > 1 and created_at < next(reversed(self.live.values()))[0]:
+            # Committed out of timestamp order; keep reads ordered by created_at
+            self.live = OrderedDict(sorted(self.live.items(), key=lambda item: (item[1][0], item[0])))
+        while len(self.live) > self.capacity:
+            self._evict_oldest()
+
+    def _evict_oldest(self):
+        _, (created_at, entry) = self.live.popitem(last=False)
+        self.bytes -= _size(entry)
+        self.complete = False
+        self.window_start = max(self.window_start or created_at, created_at)
+        # Polls from before the window are answered by the DB, so older tombstones can go
+        for message_id, deleted_at in list(self.tombstones.items()):
+            if deleted_at <= self.window_start:
+                del self.tombstones[message_id]
+                self.bytes -= TOMBSTONE_SIZE
+
+    def delete(self, message_id, deleted_at):
+        item = self.live.pop(message_id, None)
+        if item is not None:
+            self.bytes -= _size(item[1])
+        if message_id not in self.tombstones:
+            self.tombstones[message_id] = deleted_at
+            self.bytes += TOMBSTONE_SIZE
+
+    def react(self, message_id, emoji, user_id, added):
+        """Idempotent: a reload may already include a write made just before it"""
+        item = self.live.get(message_id)
+        if item is None:
+            return
+        entry = item[1]
+        self.bytes -= _size(entry)
+        reactions = entry["reactions"]
+        users = reactions.get(emoji, {"users": []})["users"]
+        if added and user_id not in users:
+            users = users + [user_id]
+        elif not added:
+            users = [u for u in users if u != user_id]
+        if users:
+            reactions[emoji] = {"count": len(users), "users": users}
+        else:
+            reactions.pop(emoji, None)
+        self.bytes += _size(entry)
+
+
+class MessageBuffer:
+    """
+    Per-process ring buffers of the last `capacity` serialized messages of
+    each recently polled channel, for list_messages.
+
+    A buffer is only used while its seq matches the channel's change_seq,
+    which the poll reads for its ETag anyway, so writes made by other
+    workers turn into a reload instead of stale reads. Writes made here are
+    applied in place once committed. Buffers are evicted least recently used
+    first to keep the total under `max_bytes`.
+    """
+
+    def __init__(self, capacity=200, max_bytes=64 * 1024 * 1024):
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self._buffers = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def configure(self, capacity=None, max_bytes=None):
+        """Apply app config and start from an empty cache"""
+        if capacity is not None:
+            self.capacity = capacity
+        if max_bytes is not None:
+            self.max_bytes = max_bytes
+        self.clear()
+
+    @property
+    def enabled(self):
+        return self.capacity > 0 and self.max_bytes > 0
+
+    def read(self, channel_id, seq, after):
+        """Return (messages, deleted_ids) for a poll, or None if the DB has to answer it"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            buffer = self._buffers.get(channel_id)
+            if buffer is not None and buffer.seq == seq:
+                self._buffers.move_to_end(channel_id)
+                if buffer.covers(after):
+                    self.hits += 1
+                    return buffer.read(after)
+                # The cursor is older than the window; a reload wouldn't help
+                self.misses += 1
+                return None
+            self.misses += 1
+
+        buffer = self._load(channel_id, seq)
+        if buffer is None or not buffer.covers(after):
+            return None
+        with self._lock:
+            return buffer.read(after)
+
+    def _load(self, channel_id, seq):
+        from ..models import Message
+
+        # One past capacity: the extra row marks where the window starts
+        rows = Message.query.filter(
+            Message.channel_id == channel_id,
+            Message.deleted_at.is_(None)
+        ).order_by(Message.created_at.desc(), Message.id.desc()).limit(self.capacity + 1).all()
+
+        buffer = ChannelBuffer(seq, self.capacity)
+        if len(rows) > self.capacity:
+            buffer.complete = False
+            buffer.window_start = rows.pop().created_at
+
+        deleted = db.session.query(Message.id, Message.deleted_at).filter(
+            Message.channel_id == channel_id,
+            Message.deleted_at.isnot(None)
+        )
+        if not buffer.complete:
+            deleted = deleted.filter(Message.deleted_at > buffer.window_start)
+
+        for message, entry in zip(reversed(rows), serialize_messages(list(reversed(rows)))):
+            buffer.add(message.created_at, entry)
+        for message_id, deleted_at in deleted.all():
+            buffer.delete(message_id, deleted_at)
+
+        with self._lock:
+            self.reloads += 1
+            if buffer.bytes > self.max_bytes:
+                return buffer
+            self._buffers[channel_id] = buffer
+            self._buffers.move_to_end(channel_id)
+            self._enforce_limit()
+        return buffer
+
+    def _enforce_limit(self):
+        total = sum(buffer.bytes for buffer in self._buffers.values())
+        while total > self.max_bytes and self._buffers:
+            _, evicted = self._buffers.popitem(last=False)
+            total -= evicted.bytes
+            self.evictions += 1
+
+    def _apply(self, channel_id, seq, change):
+        """Apply a committed write that moved the channel to `seq`"""
+        with self._lock:
+            buffer = self._buffers.get(channel_id)
+            if buffer is None:
+                return
+            if seq is not None and seq <= buffer.seq:
+                # Loaded after this write committed, so it's already in there
+                return
+            if seq is None or seq - buffer.seq > 1:
+                # Another write landed in between that we didn't see
+                del self._buffers[channel_id]
+                self.invalidations += 1
+                return
+            change(buffer)
+            buffer.seq = seq
+            self._enforce_limit()
+
+    def message_created(self, channel_id, seq, messages):
+        """messages: [(created_at, entry)] in the list_messages shape"""
+        def change(buffer):
+            for created_at, entry in messages:
+                buffer.add(created_at, entry)
+        self._apply(channel_id, seq, change)
+
+    def message_deleted(self, channel_id, seq, message_id, deleted_at):
+        self._apply(channel_id, seq, lambda buffer: buffer.delete(message_id, deleted_at))
+
+    def reaction_changed(self, channel_id, seq, message_id, emoji, user_id, added):
+        self._apply(channel_id, seq, lambda buffer: buffer.react(message_id, emoji, user_id, added))
+
+    def invalidate(self, channel_id):
+        with self._lock:
+            if self._buffers.pop(channel_id, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._buffers.clear()
+            self.hits = self.misses = self.reloads = self.evictions = self.invalidations = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._buffers),
+                "messages": sum(len(buffer.live) for buffer in self._buffers.values()),
+                "bytes": sum(buffer.bytes for buffer in self._buffers.values()),
+                "max_bytes": self.max_bytes,
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "reloads": self.reloads,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def serialize_messages(messages):
+    """format_message_with_reactions for a batch: one query for authors, one for reactions"""
+    from ..models import MessageReaction, User
+
+    if not messages:
+        return []
+    user_ids = {message.user_id for message in messages}
+    emails = dict(db.session.query(User.id, User.email).filter(User.id.in_(user_ids)).all())
+
+    reactions = {message.id: {} for message in messages}
+    rows = db.session.query(MessageReaction.message_id, MessageReaction.emoji, MessageReaction.user_id).filter(
+        MessageReaction.message_id.in_(list(reactions))
+    ).order_by(MessageReaction.id).all()
+    for message_id, emoji, user_id in rows:
+        grouped = reactions[message_id].setdefault(emoji, {"count": 0, "users": []})
+        grouped["count"] += 1
+        grouped["users"].append(user_id)
+
+    return [serialize_message(message, emails.get(message.user_id), reactions[message.id]) for message in messages]
+
+
+def serialize_message(message, user_email, reactions=None):
+    return {
+        "id": message.id,
+        "user_id": message.user_id,
+        "user_email": user_email,
+        "content": message.content,
+        "created_at": message.created_at.isoformat(),
+        "reactions": reactions or {},
+    }
+
+
+def init_app(app):
+    message_buffer.configure(
+        capacity=app.config["MESSAGE_BUFFER_SIZE"],
+        max_bytes=app.config["MESSAGE_BUFFER_MAX_BYTES"],
+    )
+
+
+# Create a singleton instance
+message_buffer = MessageBuffer()
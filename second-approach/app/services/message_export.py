@@ -0,0 +1,119 @@
+# app/services/message_export.py
+
+"""
+Streaming channel export as newline-delimited JSON.
+
+Messages are read through a server-side cursor in fixed-size partitions;
+authors and reactions are fetched per partition, so memory use depends on
+the partition size and not on the size of the channel.
+"""
+
+import json
+import zlib
+
+from sqlalchemy import select
+
+from .. import db
+
+BUFFER_SIZE = 64 * 1024
+
+
+def iter_export_records(channel_id, chunk_size=1000, include_deleted=False):
+    """Yield one dict per message, oldest first, with author email and reactions"""
+    from ..models import Message
+
+    stmt = _message_columns().where(Message.channel_id == channel_id)
+    if not include_deleted:
+        stmt = stmt.where(Message.deleted_at.is_(None))
+    stmt = stmt.order_by(Message.created_at, Message.id)
+    return _iter_records(stmt, chunk_size, include_deleted)
+
+
+def iter_period_records(start, end, chunk_size=1000, max_id=None):
+    """Yield live messages created in [start, end), grouped by channel and oldest first"""
+    from ..models import Message
+
+    stmt = _message_columns().where(
+        Message.created_at >= start,
+        Message.created_at < end,
+        Message.deleted_at.is_(None)
+    )
+    if max_id is not None:
+        stmt = stmt.where(Message.id <= max_id)
+    stmt = stmt.order_by(Message.channel_id, Message.created_at, Message.id)
+    return _iter_records(stmt, chunk_size, include_deleted=False)
+
+
+def _message_columns():
+    from ..models import Message
+
+    return select(
+        Message.id, Message.channel_id, Message.user_id,
+        Message.content, Message.created_at, Message.deleted_at
+    )
+
+
+def _iter_records(stmt, chunk_size, include_deleted):
+    """Run stmt through a server-side cursor and attach authors and reactions per partition"""
+    from ..models import MessageReaction, User
+
+    stmt = stmt.execution_options(stream_results=True, yield_per=chunk_size)
+
+    emails = {}
+    result = db.session.execute(stmt)
+    for rows in result.partitions():
+        message_ids = [row.id for row in rows]
+
+        unknown = {row.user_id for row in rows} - emails.keys()
+        if unknown:
+            emails.update(db.session.query(User.id, User.email).filter(User.id.in_(unknown)).all())
+
+        reactions = {}
+        for message_id, user_id, emoji in db.session.query(
+            MessageReaction.message_id, MessageReaction.user_id, MessageReaction.emoji
+        ).filter(MessageReaction.message_id.in_(message_ids)).order_by(MessageReaction.id):
+            grouped = reactions.setdefault(message_id, {})
+            if emoji not in grouped:
+                grouped[emoji] = {'count': 0, 'users': []}
+            grouped[emoji]['count'] += 1
+            grouped[emoji]['users'].append(user_id)
+
+        for row in rows:
+            record = {
+                "id": row.id,
+                "channel_id": row.channel_id,
+                "user_id": row.user_id,
+                "user_email": emails.get(row.user_id),
+                "content": row.content,
+                "created_at": row.created_at.isoformat(),
+                "reactions": reactions.get(row.id, {})
+            }
+            if include_deleted:
+                record["deleted_at"] = row.deleted_at.isoformat() if row.deleted_at else None
+            yield record
+
+
+def iter_ndjson(records):
+    """Encode records as NDJSON, buffered into ~64KB byte chunks"""
+    buffer = []
+    size = 0
+    for record in records:
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8')
+        buffer.append(line)
+        size += len(line)
+        if size >= BUFFER_SIZE:
+            yield b"".join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def iter_gzip(chunks, level=6):
+    """Gzip a stream of byte chunks on the fly"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
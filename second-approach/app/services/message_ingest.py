@@ -0,0 +1,165 @@
+# app/services/message_ingest.py
+
+"""
+Bulk message ingestion for imports and integrations.
+
+Items are validated in a single pass, authors are resolved with one query,
+and valid rows are written with set-based INSERTs committed in batches.
+Authors that have to be created are inserted in the same transaction as the
+first batch that needs them, so a failed batch leaves no accounts behind.
+Bulk-ingested messages never trigger bot responses, and are never
+attributed to the bot.
+"""
+
+import logging
+from datetime import datetime, timezone
+
+from flask import current_app
+from sqlalchemy import insert
+
+from .. import db
+from .poll_validators import bump_channel_seq
+
+logger = logging.getLogger(__name__)
+
+MAX_CONTENT_LENGTH = 40000
+
+
+def parse_timestamp(value):
+    """Parse an ISO-8601 timestamp into the naive UTC datetime the models store"""
+    if isinstance(value, str) and value.endswith('Z'):
+        value = value[:-1] + '+00:00'
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def validate_items(items, allow_authors):
+    """
+    Validate raw items in one pass.
+    Returns (rows, results): rows are (index, values) for valid items and
+    results holds an error entry for each invalid one, keyed by index.
+    """
+    rows = []
+    results = {}
+    now = datetime.utcnow()
+
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[index] = {"index": index, "error": "Item must be an object"}
+            continue
+
+        content = item.get('content')
+        if not isinstance(content, str) or not content.strip():
+            results[index] = {"index": index, "error": "Message content cannot be empty"}
+            continue
+        if len(content) > MAX_CONTENT_LENGTH:
+            results[index] = {"index": index, "error": "Message content is too long"}
+            continue
+
+        created_at = now
+        if item.get('created_at') is not None:
+            try:
+                created_at = parse_timestamp(item['created_at'])
+            except (TypeError, ValueError):
+                results[index] = {"index": index, "error": "Invalid timestamp format"}
+                continue
+
+        user_email = item.get('user_email')
+        if user_email is not None:
+            if not allow_authors:
+                results[index] = {"index": index, "error": "Not authorized to set user_email"}
+                continue
+            if not isinstance(user_email, str) or not user_email.strip():
+                results[index] = {"index": index, "error": "Invalid user_email"}
+                continue
+            user_email = user_email.strip().lower()
+
+        rows.append((index, {
+            "content": content,
+            "created_at": created_at,
+            "user_email": user_email,
+        }))
+
+    return rows, results
+
+
+def resolve_authors(emails):
+    """Map author emails to user ids with one query"""
+    from ..models import User
+
+    if not emails:
+        return {}
+    return dict(db.session.query(User.email, User.id).filter(User.email.in_(emails)).all())
+
+
+def create_authors(emails):
+    """Insert users for `emails` in the current transaction; returns {email: id}"""
+    from ..models import User
+
+    now = datetime.utcnow()
+    db.session.execute(insert(User), [{"email": email, "created_at": now} for email in emails])
+    return dict(db.session.query(User.email, User.id).filter(User.email.in_(emails)).all())
+
+
+def ingest_messages(channel_id, items, default_user_id, allow_authors=False,
+                    create_users=False, batch_size=1000):
+    """
+    Insert a list of raw message items into a channel.
+    Returns one result per item, in input order: {"index", "id"} on success
+    or {"index", "error"} on failure.
+    """
+    from ..models import Message
+
+    rows, results = validate_items(items, allow_authors)
+    bot_user_id = current_app.config['BOT_USER_ID']
+
+    emails = sorted({values["user_email"] for _, values in rows if values["user_email"]})
+    authors = resolve_authors(emails)
+
+    pending = []
+    for index, values in rows:
+        email = values.pop("user_email")
+        if email is None:
+            values["user_id"] = default_user_id
+        elif email in authors:
+            values["user_id"] = authors[email]
+        elif create_users:
+            values["user_email"] = email  # created with its batch
+        else:
+            results[index] = {"index": index, "error": f"Unknown user {email}"}
+            continue
+        if values.get("user_id") == bot_user_id:
+            results[index] = {"index": index, "error": "Messages can't be attributed to the bot"}
+            continue
+        values["channel_id"] = channel_id
+        pending.append((index, values))
+
+    stmt = insert(Message).returning(Message.id, sort_by_parameter_order=True)
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        try:
+            missing = sorted({values["user_email"] for _, values in batch if "user_email" in values} - authors.keys())
+            created = create_authors(missing) if missing else {}
+            for _, values in batch:
+                if "user_email" in values:
+                    email = values["user_email"]
+                    values["user_id"] = authors.get(email) or created[email]
+            ids = db.session.scalars(stmt, [
+                {key: value for key, value in values.items() if key != "user_email"} for _, values in batch
+            ]).all()
+            bump_channel_seq(channel_id)
+            db.session.commit()
+            authors.update(created)
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Bulk insert into channel {channel_id} failed: {str(e)}")
+            for index, _ in batch:
+                results[index] = {"index": index, "error": "Insert failed"}
+            continue
+
+        for (index, _), message_id in zip(batch, ids):
+            results[index] = {"index": index, "id": message_id}
+
+    return [results[index] for index in range(len(items))]
@@ -0,0 +1,182 @@
+# app/services/message_partitions.py
+
+"""
+Monthly range partitioning of messages on Postgres.
+
+`flask partition-messages` converts the plain messages table into a table
+partitioned by created_at (one partition per month plus a DEFAULT catch-all)
+so timestamp-bounded reads only touch the months they need and old months
+can be archived by dropping a partition instead of deleting rows.
+
+Postgres requires the partition key in every unique constraint, so the
+primary key becomes (id, created_at) and message_reactions loses its foreign
+key to messages; reactions of archived or purged messages are removed by the
+application instead.
+"""
+
+import logging
+from datetime import datetime
+
+from sqlalchemy import text
+
+from .. import db
+
+logger = logging.getLogger(__name__)
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1)
+
+
+def add_months(value, months):
+    index = value.year * 12 + value.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(start):
+    return f"messages_y{start.year:04d}m{start.month:02d}"
+
+
+def is_supported():
+    return db.engine.dialect.name == 'postgresql'
+
+
+def is_partitioned():
+    if not is_supported():
+        return False
+    relkind = db.session.execute(text(
+        "SELECT relkind FROM pg_class WHERE relname = 'messages' AND relnamespace = 'public'::regnamespace"
+    )).scalar()
+    return relkind == 'p'
+
+
+def existing_partitions():
+    """Return {partition name: month start} for the monthly partitions of messages"""
+    if not is_partitioned():
+        return {}
+    names = db.session.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE parent.relname = 'messages'"
+    )).scalars().all()
+
+    partitions = {}
+    for name in names:
+        try:
+            partitions[name] = datetime.strptime(name, "messages_y%Ym%m")
+        except ValueError:
+            continue  # messages_default
+    return partitions
+
+
+def create_partition(start):
+    """Create the partition for the month starting at `start` if it's missing"""
+    end = add_months(start, 1)
+    db.session.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(start)} PARTITION OF messages "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    ))
+
+
+def ensure_partitions(months_ahead=3, now=None):
+    """Make sure partitions exist for the current month and the next months_ahead"""
+    if not is_partitioned():
+        return []
+
+    current = month_start(now or datetime.utcnow())
+    existing = existing_partitions()
+    created = []
+    for offset in range(months_ahead + 1):
+        start = add_months(current, offset)
+        if partition_name(start) in existing:
+            continue
+        try:
+            create_partition(start)
+            db.session.commit()
+            created.append(partition_name(start))
+        except Exception as e:
+            # Usually rows for that month already landed in messages_default
+            db.session.rollback()
+            logger.error(f"Could not create partition {partition_name(start)}: {str(e)}")
+    return created
+
+
+def convert_to_partitioned(months_ahead=3):
+    """
+    Rebuild messages as a monthly partitioned table, copying existing rows.
+    Runs in one transaction holding an exclusive lock on messages.
+    """
+    if not is_supported():
+        raise RuntimeError("Message partitioning requires Postgres")
+    if is_partitioned():
+        return False
+
+    def execute(sql):
+        db.session.execute(text(sql))
+
+    execute("LOCK TABLE messages IN ACCESS EXCLUSIVE MODE")
+    oldest = db.session.execute(text("SELECT min(created_at) FROM messages")).scalar()
+
+    # Foreign keys into messages can't survive the new composite primary key
+    for table, name in db.session.execute(text(
+        "SELECT conrelid::regclass::text, conname FROM pg_constraint "
+        "WHERE confrelid = 'messages'::regclass AND contype = 'f'"
+    )).all():
+        execute(f"ALTER TABLE {table} DROP CONSTRAINT {name}")
+
+    execute("ALTER TABLE messages RENAME TO messages_unpartitioned")
+    execute("ALTER INDEX IF EXISTS messages_pkey RENAME TO messages_unpartitioned_pkey")
+    execute("ALTER INDEX IF EXISTS ix_messages_channel_created RENAME TO ix_messages_channel_created_old")
+    execute("ALTER INDEX IF EXISTS ix_messages_search RENAME TO ix_messages_search_old")
+
+    execute(
+        "CREATE TABLE messages ("
+        "  id INTEGER NOT NULL DEFAULT nextval('messages_id_seq'),"
+        "  user_id INTEGER NOT NULL REFERENCES users(id),"
+        "  channel_id INTEGER NOT NULL REFERENCES channels(id),"
+        "  content TEXT NOT NULL,"
+        "  created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,"
+        "  deleted_at TIMESTAMP WITHOUT TIME ZONE,"
+        "  generation_ms INTEGER,"
+        "  search_vector tsvector GENERATED ALWAYS AS (to_tsvector('english', content)) STORED,"
+        "  PRIMARY KEY (id, created_at)"
+        ") PARTITION BY RANGE (created_at)"
+    )
+    execute("CREATE TABLE messages_default PARTITION OF messages DEFAULT")
+
+    current = month_start(datetime.utcnow())
+    start = month_start(oldest) if oldest else current
+    while start <= add_months(current, months_ahead):
+        create_partition(start)
+        start = add_months(start, 1)
+
+    execute("CREATE INDEX ix_messages_channel_created ON messages (channel_id, created_at)")
+    execute("CREATE INDEX ix_messages_search ON messages USING GIN (search_vector)")
+
+    execute(
+        "INSERT INTO messages (id, user_id, channel_id, content, created_at, deleted_at, generation_ms) "
+        "SELECT id, user_id, channel_id, content, COALESCE(created_at, now() at time zone 'utc'), deleted_at, generation_ms "
+        "FROM messages_unpartitioned"
+    )
+    # The id sequence is owned by the old table; move it before dropping that table
+    execute("ALTER SEQUENCE messages_id_seq OWNED BY messages.id")
+    execute("DROP TABLE messages_unpartitioned")
+    db.session.commit()
+
+    logger.info("Converted messages to a monthly partitioned table")
+    return True
+
+
+def partition_exists(start):
+    return partition_name(start) in existing_partitions()
+
+
+def drop_partition(start):
+    """Detach and drop a month's partition; returns False if it doesn't exist"""
+    name = partition_name(start)
+    if not partition_exists(start):
+        return False
+    db.session.execute(text(f"ALTER TABLE messages DETACH PARTITION {name}"))
+    db.session.execute(text(f"DROP TABLE {name}"))
+    return True
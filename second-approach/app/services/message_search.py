@@ -0,0 +1,196 @@
+# app/services/message_search.py
+
+"""
+Full-text search over message content.
+
+Postgres: a generated tsvector column on messages with a GIN index, so every
+insert (including bulk imports) is indexed by the database itself.
+SQLite (development): an external-content FTS5 table kept in sync by triggers.
+
+Results are ranked (higher score is better) and paginated with an opaque
+keyset cursor of (score, id), so deep pages cost the same as the first.
+"""
+
+import base64
+import html
+import json
+import logging
+import re
+
+from sqlalchemy import bindparam, text
+
+from .. import db
+
+logger = logging.getLogger(__name__)
+
+# Highlight markers that can't appear in escaped text; swapped for <mark> after escaping
+MARK_START = '\x02'
+MARK_END = '\x03'
+
+POSTGRES_SCHEMA = [
+    "ALTER TABLE messages ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('english', content)) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_messages_search ON messages USING GIN (search_vector)",
+]
+
+SQLITE_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN "
+    "INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN "
+    "INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content); END",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN "
+    "INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+    "INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content); END",
+]
+
+POSTGRES_QUERY = f"""
+    SELECT hits.id, hits.channel_id, hits.user_id, hits.created_at, hits.score,
+           users.email AS user_email,
+           ts_headline('english', messages.content, hits.query,
+                       'StartSel={MARK_START}, StopSel={MARK_END}, MaxWords=30, MinWords=10, MaxFragments=2')
+               AS snippet
+    FROM (
+        SELECT * FROM (
+            SELECT m.id, m.channel_id, m.user_id, m.created_at, q.query,
+                   ts_rank_cd(m.search_vector, q.query) AS score
+            FROM messages m, websearch_to_tsquery('english', :q) AS q(query)
+            WHERE m.search_vector @@ q.query
+              AND m.channel_id IN :channel_ids
+              AND m.deleted_at IS NULL
+        ) ranked
+        WHERE :after_id IS NULL
+           OR ranked.score < CAST(:after_score AS real)
+           OR (ranked.score = CAST(:after_score AS real) AND ranked.id < :after_id)
+        ORDER BY ranked.score DESC, ranked.id DESC
+        LIMIT :limit
+    ) hits
+    JOIN messages ON messages.id = hits.id
+    JOIN users ON users.id = hits.user_id
+    ORDER BY hits.score DESC, hits.id DESC
+"""
+
+SQLITE_QUERY = f"""
+    SELECT * FROM (
+        SELECT m.id, m.channel_id, m.user_id, m.created_at,
+               -bm25(messages_fts) AS score,
+               users.email AS user_email,
+               snippet(messages_fts, 0, '{MARK_START}', '{MARK_END}', '…', 16) AS snippet
+        FROM messages_fts
+        JOIN messages m ON m.id = messages_fts.rowid
+        JOIN users ON users.id = m.user_id
+        WHERE messages_fts MATCH :q
+          AND m.channel_id IN :channel_ids
+          AND m.deleted_at IS NULL
+    ) ranked
+    WHERE :after_id IS NULL
+       OR ranked.score < :after_score
+       OR (ranked.score = :after_score AND ranked.id < :after_id)
+    ORDER BY ranked.score DESC, ranked.id DESC
+    LIMIT :limit
+"""
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def init_app(app):
+    """Create the dialect-specific search structures if they don't exist yet"""
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        for statement in POSTGRES_SCHEMA:
+            db.session.execute(text(statement))
+    elif dialect == 'sqlite':
+        exists = db.session.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'"
+        )).first()
+        if not exists:
+            db.session.execute(text(
+                "CREATE VIRTUAL TABLE messages_fts USING fts5("
+                "content, content='messages', content_rowid='id', tokenize='porter unicode61')"
+            ))
+            # Index whatever history is already there
+            db.session.execute(text("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')"))
+        for statement in SQLITE_TRIGGERS:
+            db.session.execute(text(statement))
+    else:
+        logger.warning(f"Message search is not supported on {dialect}")
+    db.session.commit()
+
+
+def encode_cursor(score, message_id):
+    raw = json.dumps({"s": score, "id": message_id}).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return float(data["s"]), int(data["id"])
+    except (ValueError, KeyError, TypeError):
+        raise InvalidCursor("Invalid cursor")
+
+
+def to_fts5_query(q):
+    """Turn free text into an FTS5 query that ANDs quoted terms, so user input can't inject syntax"""
+    terms = re.findall(r'\w+', q)
+    return ' '.join(f'"{term}"' for term in terms)
+
+
+def highlight(snippet):
+    """Escape a raw snippet and turn the match markers into <mark> tags"""
+    escaped = html.escape(snippet or '')
+    return escaped.replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+
+
+def search_messages(q, channel_ids, limit=20, cursor=None):
+    """
+    Search message content within channel_ids.
+    Returns (results, next_cursor); next_cursor is None on the last page.
+    """
+    if not channel_ids:
+        return [], None
+
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        sql, query = POSTGRES_QUERY, q
+    elif dialect == 'sqlite':
+        sql, query = SQLITE_QUERY, to_fts5_query(q)
+        if not query:
+            return [], None
+    else:
+        raise RuntimeError(f"Message search is not supported on {dialect}")
+
+    after_score, after_id = decode_cursor(cursor) if cursor else (None, None)
+
+    stmt = text(sql).bindparams(bindparam('channel_ids', expanding=True))
+    rows = db.session.execute(stmt, {
+        "q": query,
+        "channel_ids": sorted(channel_ids),
+        "after_score": after_score,
+        "after_id": after_id,
+        "limit": limit + 1,
+    }).mappings().all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    results = [{
+        "id": row["id"],
+        "channel_id": row["channel_id"],
+        "user_id": row["user_id"],
+        "user_email": row["user_email"],
+        "created_at": _isoformat(row["created_at"]),
+        "snippet": highlight(row["snippet"]),
+        "score": row["score"],
+    } for row in rows]
+
+    next_cursor = None
+    if has_more and rows:
+        next_cursor = encode_cursor(rows[-1]["score"], rows[-1]["id"])
+    return results, next_cursor
+
+
+def _isoformat(value):
+    # Raw SQL on SQLite hands timestamps back as strings
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value).replace(' ', 'T')
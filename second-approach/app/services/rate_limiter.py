@@ -0,0 +1,278 @@
+# app/services/rate_limiter.py
+
+"""
+Token-bucket rate limiting for expensive endpoints.
+
+Every limit is a (per-user, per-IP) pair of "<count>/<period>" rules; a
+request spends one token from the signed-in user's bucket and one from the
+client IP's bucket, and is refused with 429 and Retry-After when either is
+empty. A refused request costs nothing: tokens already taken for it are put
+back, so a client locked out by one bucket doesn't drain the others. Limits come from app.config['RATE_LIMITS'] and can be overridden with
+RATE_LIMIT_<NAME>="10/minute,60/minute" ("off" disables a side).
+
+The memory backend keeps buckets in this process. With several workers, set
+RATE_LIMIT_BACKEND=database so every worker spends from the same buckets in
+the rate_limit_buckets table (one upsert per bucket). Other shared stores
+plug in through set_backend() with any object that has take(key, rate,
+capacity, now) returning the seconds to wait (0 when allowed) and
+refund(key, capacity) putting one taken token back.
+
+check() costs a few microseconds on the memory backend (measured by
+tests/test_rate_limiter.py); the database backend adds one round trip per
+bucket.
+"""
+
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import jsonify, request
+from flask_login import current_user
+
+from .. import db
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+DEFAULT_LIMITS = {
+    'bot_message': ('10/minute', '30/minute'),
+    'magic_link': (None, '5/minute'),
+    'message_bulk': ('10/minute', '30/minute'),
+    'message_post': ('60/minute', '300/minute'),
+    'user_search': ('60/minute', '300/minute'),
+}
+
+
+def parse_rule(rule):
+    """'10/minute' -> (tokens per second, capacity); None or 'off' -> None"""
+    if rule is None or rule.strip().lower() in ('', 'off', 'none'):
+        return None
+    count, _, period = rule.strip().partition('/')
+    count = int(count)
+    seconds = PERIODS.get(period.strip().lower())
+    if seconds is None:
+        seconds = int(period)
+    return count / seconds, count
+
+
+class MemoryBackend:
+    """Buckets in a bounded LRU dict; oldest idle buckets are evicted first"""
+
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, capacity, now):
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                tokens = capacity
+                if len(self._buckets) >= self.max_size:
+                    self._buckets.popitem(last=False)
+            else:
+                tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+                self._buckets.move_to_end(key)
+
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                return 0
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) / rate
+
+    def refund(self, key, capacity):
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                self._buckets[key] = (min(capacity, bucket[0] + 1), bucket[1])
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class DatabaseBackend:
+    """Buckets shared by every worker through one atomic upsert per take"""
+
+    def take(self, key, rate, capacity, now):
+        from ..models import RateLimitBucket
+
+        if db.engine.dialect.name == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+            least = db.func.least
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+            least = db.func.min
+
+        bucket = RateLimitBucket.__table__
+        refilled = least(capacity, bucket.c.tokens + (now - bucket.c.updated_at) * rate)
+        stmt = insert(bucket).values(key=key, tokens=capacity - 1, updated_at=now, allowed=True)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[bucket.c.key],
+            set_={
+                'tokens': db.case((refilled >= 1, refilled - 1), else_=refilled),
+                'updated_at': now,
+                'allowed': refilled >= 1,
+            }
+        ).returning(bucket.c.tokens, bucket.c.allowed)
+
+        # Own connection so a 429 never commits or rolls back the request's session
+        with db.engine.begin() as connection:
+            tokens, allowed = connection.execute(stmt).one()
+        return 0 if allowed else (1 - tokens) / rate
+
+    def refund(self, key, capacity):
+        from ..models import RateLimitBucket
+
+        least = db.func.least if db.engine.dialect.name == 'postgresql' else db.func.min
+        bucket = RateLimitBucket.__table__
+        stmt = bucket.update().where(bucket.c.key == key).values(tokens=least(capacity, bucket.c.tokens + 1))
+        with db.engine.begin() as connection:
+            connection.execute(stmt)
+
+
+class RateLimiter:
+    def __init__(self):
+        self.limits = {}
+        self.backend = MemoryBackend()
+        self.enabled = True
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.limited = {}
+
+    def configure(self, limits, backend=None, enabled=True):
+        """Apply app config: {name: (user rule, ip rule)}"""
+        self.limits = {
+            name: (parse_rule(user_rule), parse_rule(ip_rule))
+            for name, (user_rule, ip_rule) in limits.items()
+        }
+        if backend is not None:
+            self.backend = backend
+        self.enabled = enabled
+        self.allowed = 0
+        self.limited = {}
+
+    def set_backend(self, backend):
+        self.backend = backend
+
+    def check(self, names, user_id=None, ip=None):
+        """
+        Spend one token for each of `names` (a name or a list of them);
+        returns seconds to wait, 0 when allowed. Nothing is spent when any
+        bucket refuses.
+        """
+        if isinstance(names, str):
+            names = (names,)
+        names = [name for name in names if name in self.limits]
+        if not self.enabled or not names:
+            return 0
+        now = time.time()
+
+        spent = []
+        wait = 0
+        try:
+            for name in names:
+                for key, (rate, capacity) in self._buckets(name, user_id, ip):
+                    wait = self.backend.take(key, rate, capacity, now)
+                    if wait:
+                        break
+                    spent.append((key, capacity))
+                if wait:
+                    for key, capacity in spent:
+                        self.backend.refund(key, capacity)
+                    break
+        except Exception as e:
+            # A broken shared store shouldn't take the endpoints down with it
+            logger.error(f"Rate limit backend failed, allowing request: {str(e)}")
+            return 0
+
+        with self._lock:
+            if wait:
+                self.limited[name] = self.limited.get(name, 0) + 1
+            else:
+                self.allowed += 1
+        return wait
+
+    def refund(self, names, user_id=None, ip=None):
+        """Give back what check() spent for a request that was then turned away (e.g. shed)"""
+        if isinstance(names, str):
+            names = (names,)
+        if not self.enabled:
+            return
+        try:
+            for name in names:
+                if name in self.limits:
+                    for key, (_, capacity) in self._buckets(name, user_id, ip):
+                        self.backend.refund(key, capacity)
+        except Exception as e:
+            logger.error(f"Rate limit backend failed, refund dropped: {str(e)}")
+
+    def _buckets(self, name, user_id, ip):
+        """[(key, (rate, capacity))] for the buckets a request spends from under `name`"""
+        user_rule, ip_rule = self.limits[name]
+        buckets = []
+        if user_rule and user_id is not None:
+            buckets.append((f"{name}:user:{user_id}", user_rule))
+        if ip_rule and ip:
+            buckets.append((f"{name}:ip:{ip}", ip_rule))
+        return buckets
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "backend": type(self.backend).__name__,
+                "allowed": self.allowed,
+                "limited": dict(self.limited),
+            }
+
+
+def check_rate_limit(*names):
+    """Return a 429 response if the current request is over any of the `names` limits, else None"""
+    user_id = current_user.id if current_user.is_authenticated else None
+    wait = rate_limiter.check(names, user_id=user_id, ip=request.remote_addr)
+    if not wait:
+        return None
+    response = jsonify({"error": "Too many requests, please slow down"})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(max(1, math.ceil(wait)))
+    return response
+
+
+def refund_rate_limit(*names):
+    """Return the tokens check_rate_limit(*names) spent for the current request"""
+    user_id = current_user.id if current_user.is_authenticated else None
+    rate_limiter.refund(names, user_id=user_id, ip=request.remote_addr)
+
+
+def rate_limit(name):
+    """Decorator form of check_rate_limit; place it below @login_required"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            limited = check_rate_limit(name)
+            if limited is not None:
+                return limited
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def init_app(app):
+    backend = DatabaseBackend() if app.config['RATE_LIMIT_BACKEND'] == 'database' else MemoryBackend()
+    rate_limiter.configure(
+        app.config['RATE_LIMITS'],
+        backend=backend,
+        enabled=app.config['RATE_LIMIT_ENABLED'],
+    )
+
+
+# Create a singleton instance
+rate_limiter = RateLimiter()
@@ -0,0 +1,77 @@
+# app/services/read_state.py
+
+"""
+Per-member read watermarks and unread counts.
+
+Each ChannelMembership stores the id of the newest message its user has
+read. Message ids only grow, so a channel's unread count is the number of
+live messages above the watermark that someone else wrote. Counts for all of
+a user's channels come from one grouped query that range-scans the
+(channel_id, id) index once per channel.
+"""
+
+from sqlalchemy import and_, func, or_, update
+
+from .. import db
+
+
+def unread_counts(user_id, channel_id=None):
+    """Return {channel_id: (last_read_message_id, unread_count)} for every membership, or just one"""
+    from ..models import ChannelMembership, Message
+
+    watermark = func.coalesce(ChannelMembership.last_read_message_id, 0)
+    query = db.session.query(
+        ChannelMembership.channel_id,
+        ChannelMembership.last_read_message_id,
+        func.count(Message.id)
+    ).outerjoin(
+        Message,
+        and_(
+            Message.channel_id == ChannelMembership.channel_id,
+            Message.id > watermark,
+            Message.deleted_at.is_(None),
+            Message.user_id != user_id
+        )
+    ).filter(
+        ChannelMembership.user_id == user_id
+    )
+    if channel_id is not None:
+        query = query.filter(ChannelMembership.channel_id == channel_id)
+
+    rows = query.group_by(
+        ChannelMembership.channel_id,
+        ChannelMembership.last_read_message_id
+    ).all()
+    return {row[0]: (row[1], row[2]) for row in rows}
+
+
+def latest_message_id(channel_id):
+    from ..models import Message
+
+    return db.session.query(func.max(Message.id)).filter(Message.channel_id == channel_id).scalar()
+
+
+def mark_read(user_id, channel_id, message_id):
+    """
+    Advance the user's watermark to message_id. Never moves it backwards, so
+    out-of-order requests from several tabs can't resurrect read messages.
+    Returns the watermark after the update.
+    """
+    from ..models import ChannelMembership
+
+    db.session.execute(
+        update(ChannelMembership)
+        .where(
+            ChannelMembership.user_id == user_id,
+            ChannelMembership.channel_id == channel_id,
+            or_(
+                ChannelMembership.last_read_message_id.is_(None),
+                ChannelMembership.last_read_message_id < message_id
+            )
+        )
+        .values(last_read_message_id=message_id)
+    )
+    return db.session.query(func.max(ChannelMembership.last_read_message_id)).filter(
+        ChannelMembership.user_id == user_id,
+        ChannelMembership.channel_id == channel_id
+    ).scalar()
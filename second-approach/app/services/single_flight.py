@@ -0,0 +1,70 @@
+# app/services/single_flight.py
+
+"""
+Single-flight coalescing for expensive blocking calls.
+
+The first caller for a key becomes the leader and runs the call; anyone
+asking for the same key while it is in flight blocks on the leader's
+concurrent.futures.Future instead of starting their own. No event loop is
+involved, so it works the same on OS threads and on gevent greenlets, whose
+monkey-patched locks park the follower and let the leader run.
+"""
+
+import concurrent.futures
+import re
+import threading
+
+from ..metrics import registry
+
+coalesced_calls = registry.counter(
+    'chat_single_flight_coalesced_total', 'Calls answered by another caller\'s in-flight result', ('name',)
+)
+leader_calls = registry.counter(
+    'chat_single_flight_leader_total', 'Calls that went upstream', ('name',)
+)
+
+
+def normalize_question(text):
+    """Case, whitespace and trailing punctuation don't change what's being asked"""
+    return re.sub(r'\s+', ' ', text).strip().rstrip('?!.').strip().casefold()
+
+
+class SingleFlight:
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, call):
+        """Return call(), sharing one in-flight call per key"""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = concurrent.futures.Future()
+
+        if not leader:
+            coalesced_calls.inc(1, self.name)
+            return future.result()
+
+        leader_calls.inc(1, self.name)
+        try:
+            result = call()
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        except BaseException:
+            # The leader was killed (GreenletExit, KeyboardInterrupt): re-raised in a
+            # follower that would end its greenlet quietly, so hand them a plain error
+            future.set_exception(RuntimeError(f"{self.name}: the in-flight call was aborted"))
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
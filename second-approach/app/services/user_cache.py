@@ -0,0 +1,130 @@
+# app/services/user_cache.py
+
+import threading
+import time
+from collections import OrderedDict
+
+from flask_login import UserMixin
+from sqlalchemy import event
+
+
+class CachedUser(UserMixin):
+    """
+    Detached, read-only snapshot of a User row.
+    This is what Flask-Login hands back as current_user on cache hits, so it
+    only carries the fields the routes and templates actually read.
+    """
+
+    def __init__(self, id, email, created_at=None):
+        self.id = id
+        self.email = email
+        self.created_at = created_at
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(id=user.id, email=user.email, created_at=user.created_at)
+
+    def __repr__(self):
+        return f'<CachedUser {self.id} - {self.email}>'
+
+
+class UserCache:
+    """
+    Per-process TTL + LRU cache of CachedUser records keyed by user id.
+    Entries expire after `ttl` seconds and the least recently used entry is
+    evicted once `max_size` is reached.
+    """
+
+    def __init__(self, max_size=1024, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def configure(self, max_size=None, ttl=None):
+        """Apply app config and start from an empty cache"""
+        if max_size is not None:
+            self.max_size = max_size
+        if ttl is not None:
+            self.ttl = ttl
+        self.clear()
+
+    def get(self, user_id, loader):
+        """
+        Return the cached record for user_id, calling loader(user_id) on a miss.
+        loader must return a User (or None); misses are not cached.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        user = loader(user_id)
+        if user is None:
+            return None
+
+        record = CachedUser.from_user(user)
+        if self.max_size <= 0 or self.ttl <= 0:
+            return record
+
+        with self._lock:
+            self._entries[user_id] = (record, now + self.ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return record
+
+    def invalidate(self, user_id):
+        with self._lock:
+            if self._entries.pop(user_id, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def init_app(app):
+    """Configure the shared cache and drop entries whenever a User row changes"""
+    from ..models import User
+
+    user_cache.configure(
+        max_size=app.config["USER_CACHE_SIZE"],
+        ttl=app.config["USER_CACHE_TTL"],
+    )
+
+    if not event.contains(User, "after_update", _invalidate_user):
+        event.listen(User, "after_update", _invalidate_user)
+        event.listen(User, "after_delete", _invalidate_user)
+
+
+def _invalidate_user(mapper, connection, target):
+    user_cache.invalidate(target.id)
+
+
+# Create a singleton instance
+user_cache = UserCache()
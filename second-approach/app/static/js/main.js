@@ -3,6 +3,8 @@ let lastChannelTimestamp = null;
 let lastMessageTimestamp = null;
 let channelPollInterval = null;
 let messagePollInterval = null;
+let channelListEtag = null;
+let messageListEtag = null;
 
 const POLL_INTERVAL = 2000; // Poll every 2 seconds
 
@@ -46,12 +48,16 @@ async function pollNewChannels() {
             ? `/api/channels?after=${encodeURIComponent(lastChannelTimestamp)}`
             : '/api/channels';
             
-        const response = await fetch(url, { credentials: 'include' });
+        const headers = channelListEtag ? { 'If-None-Match': channelListEtag } : {};
+        const response = await fetch(url, { credentials: 'include', headers });
         if (response.status === 401) {
             window.location.href = '/api/auth/login';
             return;
         }
+        // Nothing changed since the last poll
+        if (response.status === 304) return;
         const data = await handleFetchErrors(response);
+        channelListEtag = response.headers.get('ETag');
         
         // Handle deleted channels
         if (data.deleted_channel_ids && data.deleted_channel_ids.length > 0) {
@@ -85,8 +91,10 @@ async function pollNewChannels() {
 async function pollNewMessages(channelId) {
     try {
         // Always fetch all messages in the channel
+        const headers = messageListEtag ? { 'If-None-Match': messageListEtag } : {};
         const response = await fetch(`/api/channels/${channelId}/messages`, {
-            credentials: 'include'
+            credentials: 'include',
+            headers
         });
         
         if (response.status === 401) {
@@ -94,7 +102,12 @@ async function pollNewMessages(channelId) {
             return;
         }
         
+        // Nothing changed since the last poll
+        if (response.status === 304) return;
         const data = await handleFetchErrors(response);
+        // Ignore responses for a channel we've since switched away from
+        if (channelId !== selectedChannelId) return;
+        messageListEtag = response.headers.get('ETag');
         console.log('[DEBUG] Polling received messages:', data.messages);
         
         // Handle deleted messages
@@ -417,8 +430,9 @@ function selectChannel(channelId, channelName) {
         channelName ? `Channel: ${channelName}` : `Channel ID: ${channelId}`;
     document.getElementById("message-form").style.display = "block";
     
-    // Reset message timestamp when switching channels
+    // Reset message timestamp and validator when switching channels
     lastMessageTimestamp = null;
+    messageListEtag = null;
     
     // Restart polling with new channel
     stopPolling();
@@ -0,0 +1,24 @@
+# benchmarks/__init__.py
+
+"""
+Reproducible load tests for the chat API.
+
+    python -m benchmarks.run --users 200 --messages 50000 --output bench.json
+    python -m benchmarks.run --scenario polling_storm --baseline bench.json
+
+The runner seeds a database with synthetic data (datagen.py), swaps the
+OpenAI/Pinecone bot for a fake with configurable latency (fake_bot.py) and
+drives the app in process through Flask test clients, one per simulated
+user thread (scenarios.py). It reports throughput and p50/p95/p99 latency
+per endpoint as JSON; with --baseline it exits non-zero when an endpoint
+got slower than the tolerance allows.
+
+benchmarks.retrieval measures the bot's retrieval path offline instead:
+recall@k, MRR, query latency and prompt tokens per chunking/k/backend
+configuration (python -m benchmarks.retrieval --help).
+
+Without DATABASE_URL the data goes to a throwaway SQLite file; point
+DATABASE_URL at a scratch Postgres database to measure production-like
+behaviour. The database is dropped and recreated, so never point it at
+real data.
+"""
@@ -0,0 +1,176 @@
+# benchmarks/datagen.py
+
+"""
+Seeded synthetic workspace: users, channels, DMs, messages and reactions.
+
+Activity is skewed the way real workspaces are: channel popularity and user
+chattiness follow Zipf-like weights, so a few channels and users produce
+most of the traffic, message lengths are log-normal and timestamps are
+spread over the last `days` days. The same seed always yields the same data.
+"""
+
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from app import db
+
+WORDS = (
+    "the a to and of in is it for on that this with you we be are have deploy "
+    "meeting review ship bug fix test build release lunch today tomorrow please "
+    "thanks update doc api db cache query latency bot question answer channel "
+    "customer demo sprint plan blocked merged branch prod staging alert oncall"
+).split()
+EMOJIS = ['👍', '❤️', '😂', '🎉', '👀', '🚀', '✅', '🙏']
+INSERT_BATCH = 5000
+
+
+@dataclass
+class Dataset:
+    seed: int
+    user_ids: list = field(default_factory=list)
+    channel_ids: list = field(default_factory=list)
+    memberships: dict = field(default_factory=dict)  # user id -> [channel ids]
+    bot_dms: dict = field(default_factory=dict)  # user id -> bot DM channel id
+    message_count: int = 0
+    reaction_count: int = 0
+
+    def summary(self):
+        return {
+            "seed": self.seed,
+            "users": len(self.user_ids),
+            "channels": len(self.channel_ids),
+            "memberships": sum(len(c) for c in self.memberships.values()),
+            "bot_dms": len(self.bot_dms),
+            "messages": self.message_count,
+            "reactions": self.reaction_count,
+        }
+
+
+def zipf_weights(n, s=1.1):
+    return [1.0 / (rank + 1) ** s for rank in range(n)]
+
+
+def generate(bot_user_id, users=100, channels=20, dms=50, bot_dms=20,
+             messages=10000, reaction_rate=0.15, days=30, seed=42):
+    """Insert a synthetic workspace into the current app's database"""
+    from app.models import User, Channel, ChannelMembership, Message, MessageReaction
+
+    rng = random.Random(seed)
+    dataset = Dataset(seed=seed)
+    now = datetime.utcnow()
+    start = now - timedelta(days=days)
+
+    # Users, with shuffled chattiness so ids don't predict activity
+    user_ids = _insert_returning_ids(User, [
+        {"email": f"user{i}@bench.gauntletai.com", "created_at": start} for i in range(users)
+    ])
+    dataset.user_ids = user_ids
+    chattiness = dict(zip(user_ids, rng.sample(zipf_weights(users), users)))
+
+    # Public channels; popular channels attract more members and more messages
+    channel_ids = _insert_returning_ids(Channel, [
+        {"name": f"channel-{i}", "creator_id": rng.choice(user_ids), "created_at": start,
+         "is_dm": False, "is_bot_dm": False}
+        for i in range(channels)
+    ])
+    popularity = dict(zip(channel_ids, zipf_weights(channels, s=0.9)))
+    members = {channel_id: set() for channel_id in channel_ids}
+    for channel_id in channel_ids:
+        share = 0.1 + 0.8 * popularity[channel_id]
+        members[channel_id] = {u for u in user_ids if rng.random() < share} or {rng.choice(user_ids)}
+
+    # DMs between random pairs, plus bot DMs for the first bot_dms users
+    pairs = set()
+    while len(pairs) < min(dms, users * (users - 1) // 2):
+        a, b = rng.sample(user_ids, 2)
+        pairs.add((min(a, b), max(a, b)))
+    pairs = sorted(pairs)
+    dm_ids = _insert_returning_ids(Channel, [
+        {"name": f"DM: {a} & {b}", "creator_id": a, "created_at": start, "is_dm": True, "is_bot_dm": False}
+        for a, b in pairs
+    ])
+    for channel_id, (a, b) in zip(dm_ids, pairs):
+        members[channel_id] = {a, b}
+        popularity[channel_id] = 0.2
+
+    bot_users = user_ids[:bot_dms]
+    bot_dm_ids = _insert_returning_ids(Channel, [
+        {"name": "DM: bot", "creator_id": u, "created_at": start, "is_dm": True, "is_bot_dm": True}
+        for u in bot_users
+    ])
+    for channel_id, user_id in zip(bot_dm_ids, bot_users):
+        members[channel_id] = {user_id, bot_user_id}
+        popularity[channel_id] = 0.1
+        dataset.bot_dms[user_id] = channel_id
+
+    dataset.channel_ids = channel_ids + dm_ids + bot_dm_ids
+    _insert(ChannelMembership, [
+        {"user_id": u, "channel_id": c, "joined_at": start}
+        for c in dataset.channel_ids for u in sorted(members[c])
+    ])
+    for channel_id in dataset.channel_ids:
+        for user_id in members[channel_id]:
+            dataset.memberships.setdefault(user_id, []).append(channel_id)
+
+    # Messages, written oldest first in batches
+    all_channels = dataset.channel_ids
+    channel_weights = [popularity[c] for c in all_channels]
+    author_lists = {c: sorted(members[c]) for c in all_channels}
+    author_weights = {c: [chattiness.get(u, 0.05) for u in author_lists[c]] for c in all_channels}
+    offsets = sorted(rng.random() * days * 86400 for _ in range(messages))
+
+    reactions = []
+    for batch_start in range(0, messages, INSERT_BATCH):
+        rows = []
+        for offset in offsets[batch_start:batch_start + INSERT_BATCH]:
+            channel_id = rng.choices(all_channels, channel_weights)[0]
+            author = rng.choices(author_lists[channel_id], author_weights[channel_id])[0]
+            rows.append({
+                "channel_id": channel_id,
+                "user_id": author,
+                "content": _sentence(rng),
+                "created_at": start + timedelta(seconds=offset),
+            })
+        message_ids = _insert_returning_ids(Message, rows)
+        for message_id, row in zip(message_ids, rows):
+            if rng.random() >= reaction_rate:
+                continue
+            candidates = author_lists[row["channel_id"]]
+            for user_id in rng.sample(candidates, min(len(candidates), rng.randint(1, 3))):
+                reactions.append({
+                    "message_id": message_id,
+                    "user_id": user_id,
+                    "emoji": rng.choices(EMOJIS, zipf_weights(len(EMOJIS)))[0],
+                    "created_at": row["created_at"],
+                })
+    _insert(MessageReaction, reactions)
+    db.session.commit()
+
+    dataset.message_count = messages
+    dataset.reaction_count = len(reactions)
+    return dataset
+
+
+def _sentence(rng):
+    length = max(1, min(120, int(rng.lognormvariate(2.2, 0.7))))
+    return " ".join(rng.choice(WORDS) for _ in range(length))
+
+
+def _insert(model, rows):
+    for i in range(0, len(rows), INSERT_BATCH):
+        db.session.execute(insert(model), rows[i:i + INSERT_BATCH])
+
+
+def _insert_returning_ids(model, rows):
+    if not rows:
+        return []
+    ids = []
+    for i in range(0, len(rows), INSERT_BATCH):
+        ids.extend(db.session.scalars(
+            insert(model).returning(model.id, sort_by_parameter_order=True),
+            rows[i:i + INSERT_BATCH]
+        ).all())
+    return ids
@@ -0,0 +1,46 @@
+# benchmarks/fake_bot.py
+
+"""Stand-in for BotService that answers after a simulated model latency"""
+
+import random
+import sys
+import time
+import types
+
+
+class FakeBotService:
+    def __init__(self, latency=0.05, jitter=0.02, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = 0
+        self._random = random.Random(seed)
+
+    def get_response(self, message_content: str, history=None) -> str:
+        self.calls += 1
+        delay = max(0.0, self._random.gauss(self.latency, self.jitter))
+        time.sleep(delay)
+        return f"Here is what I found about: {message_content[:200]}"
+
+    def summarize(self, summary: str, turns: list) -> str:
+        # Cap the fake summary like max_tokens caps the real one
+        lines = " ".join(content for _, content in turns)
+        return f"{summary} {lines}".strip()[-1000:]
+
+
+def install(latency=0.05, jitter=0.02, seed=0):
+    """
+    Register the fake as app.services.bot_service. Must run before the app is
+    imported, since the real module connects to OpenAI and Pinecone on import.
+    """
+    if 'app.services.bot_service' in sys.modules and not getattr(
+        sys.modules['app.services.bot_service'], 'IS_FAKE', False
+    ):
+        raise RuntimeError("install() must be called before importing the app")
+
+    bot = FakeBotService(latency=latency, jitter=jitter, seed=seed)
+    module = types.ModuleType('app.services.bot_service')
+    module.BotService = FakeBotService
+    module.bot_service = bot
+    module.IS_FAKE = True
+    sys.modules['app.services.bot_service'] = module
+    return bot
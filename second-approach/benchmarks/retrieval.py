@@ -0,0 +1,459 @@
+# benchmarks/retrieval.py
+
+"""
+Offline benchmark for the bot's retrieval path.
+
+    python -m benchmarks.retrieval --output retrieval.json
+    python -m benchmarks.retrieval --corpus kb/ --questions kb-questions.json \\
+        --config chunk_size=4000,chunk_overlap=400,k=3 \\
+        --config chunk_size=2000,chunk_overlap=200,k=5 --baseline retrieval.json
+
+Each configuration chunks the corpus with load_documents.py's splitter,
+embeds the chunks, indexes them in a vector backend and answers every
+question in the question set. It reports recall@k, MRR, per-query latency
+percentiles and the prompt tokens the bot would send for that k.
+
+The question file is a JSON list of {"question", "relevant_sources",
+"relevant_text"}: a retrieved chunk counts as relevant if it comes from one
+of the sources (file names) or contains one of the text snippets, so labels
+survive changes to chunking. Without --corpus a seeded synthetic corpus with
+planted facts is generated, so the benchmark runs with no data at all.
+
+Embeddings are a deterministic hashed bag of words by default, so runs are
+offline and repeatable. `--embeddings openai` uses the real model through a
+SQLite cache; once the cache is warm, that also runs offline.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import json
+import os
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+import zlib
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from .run import git_revision, percentile
+
+ROOT = Path(__file__).resolve().parent.parent
+RECALL_CUTOFFS = (1, 3, 5, 10)
+DEFAULT_CONFIG = "chunk_size=4000,chunk_overlap=400,k=3"
+TOKEN_RE = re.compile(r"\w+")
+
+
+class HashingEmbeddings:
+    """
+    Signed feature hashing of the distinct words in a text: purely lexical,
+    but deterministic and free. Presence rather than counts, so long chunks
+    that repeat common words don't outrank the one holding the rare term.
+    """
+
+    model = 'hashing'
+
+    def __init__(self, dimensions=1536):
+        self.dimensions = dimensions
+
+    def _embed(self, text):
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for token in set(TOKEN_RE.findall(text.lower())):
+            h = zlib.crc32(token.encode('utf-8'))
+            vector[h % self.dimensions] += 1.0 if h & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+class CachedEmbeddings:
+    """Wraps an embeddings model with a SQLite cache keyed by model and text"""
+
+    def __init__(self, inner, path):
+        self.inner = inner
+        self.model = getattr(inner, 'model', type(inner).__name__)
+        self.db = sqlite3.connect(path)
+        self.db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)")
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, text):
+        return hashlib.sha1(f"{self.model}\0{text}".encode('utf-8')).hexdigest()
+
+    def embed_documents(self, texts):
+        keys = [self._key(text) for text in texts]
+        cached = {}
+        for i in range(0, len(keys), 500):
+            batch = keys[i:i + 500]
+            rows = self.db.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})", batch
+            ).fetchall()
+            cached.update((key, np.frombuffer(blob, dtype=np.float32)) for key, blob in rows)
+
+        missing = [i for i, key in enumerate(keys) if key not in cached]
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            vectors = self.inner.embed_documents([texts[i] for i in missing])
+            rows = []
+            for i, vector in zip(missing, vectors):
+                cached[keys[i]] = np.asarray(vector, dtype=np.float32)
+                rows.append((keys[i], cached[keys[i]].tobytes()))
+            self.db.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?)", rows)
+            self.db.commit()
+        return [cached[key] for key in keys]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class ExactIndex:
+    """Brute-force cosine similarity over every chunk; the reference backend"""
+
+    def __init__(self, vectors):
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        self.matrix = matrix / np.where(norms == 0, 1, norms)
+
+    def search(self, vector, k):
+        scores = self.matrix @ (np.asarray(vector, dtype=np.float32) / (np.linalg.norm(vector) or 1))
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return top.tolist(), scores[top].tolist()
+
+
+BACKENDS = {
+    'exact': ExactIndex,
+}
+
+
+# dedup=true uses dedup_chunks' own default threshold
+DEDUP_DEFAULT_THRESHOLD = 0.85
+BOOLEANS = {'true': True, 'yes': True, 'on': True, 'false': False, 'no': False, 'off': False}
+
+
+def parse_dedup(value):
+    """'true'/'false' or a similarity threshold in [0, 1] -> threshold (0 disables)"""
+    if value.lower() in BOOLEANS:
+        return DEDUP_DEFAULT_THRESHOLD if BOOLEANS[value.lower()] else 0.0
+    try:
+        threshold = float(value)
+    except ValueError:
+        threshold = None
+    if threshold is None or not 0 <= threshold <= 1:
+        raise ValueError(f"dedup must be true, false or a threshold between 0 and 1, not {value!r}")
+    return threshold
+
+
+def parse_config(text):
+    """'chunk_size=4000,chunk_overlap=400,k=3' -> dict, with defaults for missing keys"""
+    config = {"chunk_size": 4000, "chunk_overlap": 400, "k": 3, "backend": "exact", "dedup": 0.0}
+    for part in filter(None, text.split(',')):
+        key, _, value = part.partition('=')
+        key, value = key.strip(), value.strip()
+        if key not in config:
+            raise ValueError(f"Unknown config key {key!r}; expected one of {sorted(config)}")
+        if key == "dedup":
+            config[key] = parse_dedup(value)
+            continue
+        try:
+            config[key] = type(config[key])(value)
+        except ValueError:
+            raise ValueError(f"{key} must be {type(config[key]).__name__}, not {value!r}")
+    if config["backend"] not in BACKENDS:
+        raise ValueError(f"Unknown backend {config['backend']!r}; expected one of {sorted(BACKENDS)}")
+    return config
+
+
+def config_name(config):
+    return ",".join(f"{key}={value}" for key, value in config.items())
+
+
+def load_splitter():
+    """load_documents.py lives in scripts/, outside any package"""
+    scripts = str(ROOT / 'scripts')
+    if scripts not in sys.path:
+        sys.path.insert(0, scripts)
+    import load_documents
+    import dedup_chunks
+    return load_documents, dedup_chunks
+
+
+def synthetic_corpus(directory, documents=30, facts_per_document=4, paragraphs=40, seed=42):
+    """
+    Write filler documents with planted one-sentence facts and return the
+    questions that ask for them. Vocabulary is pseudo-words, so only the
+    planted sentence shares rare terms with its question.
+    """
+    rng = random.Random(seed)
+    relations = [
+        ("was designed by {who} in {year}", "Who designed the {subject}?"),
+        ("was first tested by {who} in {year}", "Who first tested the {subject}?"),
+        ("was patented by {who} in {year}", "Who patented the {subject}, and when?"),
+        ("is manufactured by {who} since {year}", "Which company manufactures the {subject}?"),
+    ]
+    syllables = ["ka", "lo", "mi", "ter", "vo", "sha", "rin", "dex", "pa", "qui", "zor", "nel", "bu", "fa", "gri"]
+
+    def word(parts):
+        return "".join(rng.choice(syllables) for _ in range(parts))
+
+    filler = [word(rng.randint(1, 3)) for _ in range(3000)]
+    questions = []
+    directory.mkdir(parents=True, exist_ok=True)
+    for d in range(documents):
+        body = []
+        for _ in range(paragraphs):
+            sentences = [" ".join(rng.choices(filler, k=rng.randint(8, 20))).capitalize() + "." for _ in range(5)]
+            body.append(" ".join(sentences))
+        filename = f"doc-{d:03d}.txt"
+        for _ in range(facts_per_document):
+            subject, who, year = word(4), word(3).capitalize(), rng.randint(1900, 2020)
+            statement, question = rng.choice(relations)
+            fact = f"The {subject} " + statement.format(who=who, year=year) + "."
+            body.insert(rng.randrange(len(body) + 1), fact)
+            questions.append({
+                "question": question.format(subject=subject),
+                "relevant_sources": [],
+                "relevant_text": [fact],
+            })
+        (directory / filename).write_text("\n\n".join(body), encoding='utf-8')
+    return questions
+
+
+def normalize_text(text):
+    return " ".join(TOKEN_RE.findall(text.lower()))
+
+
+def relevant_items(question):
+    """Labels of a question; each is ('source', name) or ('text', normalized snippet)"""
+    items = [('source', name) for name in question.get("relevant_sources", [])]
+    items += [('text', normalize_text(snippet)) for snippet in question.get("relevant_text", [])]
+    return items
+
+
+def matches(item, chunk):
+    kind, value = item
+    if kind == 'source':
+        return chunk["filename"] == value or value in chunk.get("duplicate_sources", [])
+    return value in chunk["normalized"]
+
+
+def load_chunks(corpus, config, dedup_chunks_module, load_documents_module):
+    files = sorted(corpus.glob("*.txt")) if corpus.is_dir() else [corpus]
+    documents = []
+    # load_documents reports progress on stdout, which may be carrying the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        for path in files:
+            documents.extend(asyncio.run(load_documents_module.process_text_file(
+                path, chunk_size=config["chunk_size"], chunk_overlap=config["chunk_overlap"]
+            )))
+    dedup_report = None
+    if config["dedup"] > 0:
+        documents, dedup_report = dedup_chunks_module.dedup_documents(documents, threshold=config["dedup"])
+    chunks = [{
+        "text": doc.page_content,
+        "normalized": normalize_text(doc.page_content),
+        "filename": doc.metadata.get("filename"),
+        "duplicate_sources": doc.metadata.get("duplicate_sources", []),
+    } for doc in documents]
+    return chunks, dedup_report
+
+
+def evaluate(chunks, questions, config, embeddings, prompt_tokens_base, count_tokens):
+    """Run every question against one configuration and return its metrics"""
+    k = config["k"]
+    depth = max(k, *RECALL_CUTOFFS)
+
+    started = time.perf_counter()
+    vectors = embeddings.embed_documents([chunk["text"] for chunk in chunks])
+    embed_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    index = BACKENDS[config["backend"]](vectors)
+    index_seconds = time.perf_counter() - started
+
+    chunk_tokens = [count_tokens(chunk["text"]) for chunk in chunks]
+    cutoffs = sorted(set(RECALL_CUTOFFS) | {k})
+    recall = {cutoff: [] for cutoff in cutoffs}
+    reciprocal_ranks, query_seconds, search_seconds, prompt_tokens, per_question = [], [], [], [], []
+
+    for question in questions:
+        items = relevant_items(question)
+        started = time.perf_counter()
+        vector = embeddings.embed_query(question["question"])
+        searched = time.perf_counter()
+        ranked, scores = index.search(vector, depth)
+        finished = time.perf_counter()
+        query_seconds.append(finished - started)
+        search_seconds.append(finished - searched)
+
+        first_relevant = None
+        for rank, chunk_index in enumerate(ranked, start=1):
+            if any(matches(item, chunks[chunk_index]) for item in items):
+                first_relevant = rank
+                break
+        reciprocal_ranks.append(1 / first_relevant if first_relevant and first_relevant <= k else 0.0)
+        for cutoff in cutoffs:
+            found = sum(1 for item in items if any(matches(item, chunks[i]) for i in ranked[:cutoff]))
+            recall[cutoff].append(found / len(items) if items else 0.0)
+
+        # What the bot would send: system prompt + question + the top-k chunks
+        tokens = prompt_tokens_base + count_tokens(question["question"]) + sum(chunk_tokens[i] for i in ranked[:k])
+        prompt_tokens.append(tokens)
+        per_question.append({
+            "question": question["question"],
+            "first_relevant_rank": first_relevant,
+            "top_scores": [round(score, 4) for score in scores[:k]],
+            "prompt_tokens": tokens,
+        })
+
+    def ms(values, pct):
+        return round(percentile(sorted(values), pct) * 1000, 3) if values else None
+
+    n = len(questions) or 1
+    return {
+        "config": config,
+        "chunks": len(chunks),
+        "mean_chunk_tokens": round(sum(chunk_tokens) / len(chunk_tokens), 1) if chunk_tokens else 0,
+        "embed_seconds": round(embed_seconds, 3),
+        "index_seconds": round(index_seconds, 3),
+        "questions": len(questions),
+        f"recall@{k}": round(sum(recall[k]) / n, 4),
+        "recall": {f"@{cutoff}": round(sum(values) / n, 4) for cutoff, values in recall.items()},
+        "mrr": round(sum(reciprocal_ranks) / n, 4),
+        "query_ms": {"p50": ms(query_seconds, 50), "p95": ms(query_seconds, 95), "p99": ms(query_seconds, 99)},
+        "search_ms": {"p50": ms(search_seconds, 50), "p95": ms(search_seconds, 95), "p99": ms(search_seconds, 99)},
+        "prompt_tokens": {
+            "mean": round(sum(prompt_tokens) / n, 1),
+            "p50": percentile(sorted(prompt_tokens), 50),
+            "p95": percentile(sorted(prompt_tokens), 95),
+            "max": max(prompt_tokens) if prompt_tokens else None,
+        },
+        "per_question": per_question,
+    }
+
+
+def compare(report, baseline, tolerance, latency_tolerance):
+    """Regressions against a baseline: recall/MRR down by more than `tolerance`, or a slower p95"""
+    regressions = []
+    for name, result in report["configs"].items():
+        before = baseline.get("configs", {}).get(name)
+        if not before:
+            continue
+        for metric in ("mrr",):
+            if result[metric] < before[metric] - tolerance:
+                regressions.append(f"{name} {metric}: {before[metric]} -> {result[metric]}")
+        for cutoff, value in result["recall"].items():
+            old = before["recall"].get(cutoff)
+            if old is not None and value < old - tolerance:
+                regressions.append(f"{name} recall{cutoff}: {old} -> {value}")
+        old_p95 = before["query_ms"]["p95"]
+        if old_p95 and result["query_ms"]["p95"] > old_p95 * (1 + latency_tolerance):
+            regressions.append(f"{name} query p95_ms: {old_p95} -> {result['query_ms']['p95']}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure retrieval recall, MRR, latency and prompt size offline")
+    parser.add_argument('--corpus', help="text file or directory of .txt files; default generates a synthetic corpus")
+    parser.add_argument('--questions', help="JSON question set with relevant_sources/relevant_text labels")
+    parser.add_argument('--config', action='append',
+                        help=f"chunk_size,chunk_overlap,k,backend,dedup as key=value pairs (repeatable; default {DEFAULT_CONFIG})")
+    parser.add_argument('--embeddings', choices=['hashing', 'openai'], default='hashing')
+    parser.add_argument('--embedding-cache', default=os.path.join(tempfile.gettempdir(), 'chat-retrieval-embeddings.sqlite'),
+                        help="SQLite cache for --embeddings openai")
+    parser.add_argument('--seed', type=int, default=42, help="seed for the synthetic corpus")
+    parser.add_argument('--details', action='store_true', help="include per-question results in the report")
+    parser.add_argument('--output', help="write the JSON report here instead of stdout")
+    parser.add_argument('--baseline', help="earlier report to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.02, help="allowed absolute drop in recall and MRR")
+    parser.add_argument('--latency-tolerance', type=float, default=0.2,
+                        help="allowed query p95 slowdown vs baseline (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    try:
+        configs = [parse_config(text) for text in (args.config or [DEFAULT_CONFIG])]
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.corpus:
+        if not args.questions:
+            parser.error("--questions is required with --corpus")
+        corpus = Path(args.corpus).expanduser()
+    else:
+        corpus = Path(tempfile.mkdtemp(prefix='chat-retrieval-'))
+        synthetic_questions = synthetic_corpus(corpus, seed=args.seed)
+    if args.questions:
+        with open(args.questions) as f:
+            questions = json.load(f)
+    else:
+        questions = synthetic_questions
+
+    if args.embeddings == 'openai':
+        from app.services.http_clients import clients
+        embeddings = CachedEmbeddings(clients.embeddings(api_key=os.environ.get('OPENAI_API_KEY')), args.embedding_cache)
+    else:
+        embeddings = HashingEmbeddings()
+
+    from app.services.bot_tracing import count_tokens
+    system_prompt = (ROOT / 'app' / 'services' / 'bot_system_prompt.md').read_text(encoding='utf-8')
+    prompt_tokens_base = count_tokens(system_prompt) + count_tokens("Context information is below:\n")
+
+    load_documents_module, dedup_chunks_module = load_splitter()
+    report = {
+        "meta": {
+            "generated_at": datetime.utcnow().isoformat(),
+            "git_revision": git_revision(),
+            "corpus": str(corpus) if args.corpus else f"synthetic(seed={args.seed})",
+            "questions": len(questions),
+            "embeddings": args.embeddings,
+        },
+        "configs": {},
+    }
+
+    for config in configs:
+        chunks, dedup_report = load_chunks(corpus, config, dedup_chunks_module, load_documents_module)
+        result = evaluate(chunks, questions, config, embeddings, prompt_tokens_base, count_tokens)
+        if dedup_report:
+            result["dedup"] = dedup_report
+        if not args.details:
+            result.pop("per_question")
+        name = config_name(config)
+        report["configs"][name] = result
+        k = config["k"]
+        print(f"{name}: recall@{k}={result[f'recall@{k}']} mrr={result['mrr']} "
+              f"p95={result['query_ms']['p95']}ms prompt_tokens={result['prompt_tokens']['mean']}", file=sys.stderr)
+
+    if isinstance(embeddings, CachedEmbeddings):
+        report["meta"]["embedding_cache"] = {"hits": embeddings.hits, "misses": embeddings.misses}
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance, args.latency_tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
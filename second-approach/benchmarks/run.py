@@ -0,0 +1,182 @@
+# benchmarks/run.py
+
+"""Command-line entry point: python -m benchmarks.run --help"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from . import fake_bot
+from .scenarios import SCENARIOS
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values), math.ceil(pct / 100 * len(sorted_values))) - 1)
+    return sorted_values[rank]
+
+
+def summarize(recorder, elapsed):
+    endpoints = {}
+    total = 0
+    for label, samples in sorted(recorder.samples.items()):
+        latencies = sorted(seconds for _, seconds in samples)
+        statuses = {}
+        for status, _ in samples:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        total += len(samples)
+        endpoints[label] = {
+            "requests": len(samples),
+            "errors": sum(1 for status, _ in samples if status >= 500),
+            "status": statuses,
+            "throughput_rps": round(len(samples) / elapsed, 1) if elapsed else None,
+            "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+            "max_ms": round(latencies[-1] * 1000, 3),
+        }
+    return {
+        "seconds": round(elapsed, 3),
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 1) if elapsed else None,
+        "endpoints": endpoints,
+    }
+
+
+def compare(report, baseline, tolerance):
+    """Return a list of human-readable regressions against a baseline report"""
+    regressions = []
+    for scenario, result in report["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(scenario)
+        if not old:
+            continue
+        for label, stats in result["endpoints"].items():
+            before = old["endpoints"].get(label)
+            if not before:
+                continue
+            for metric in ("p50_ms", "p95_ms", "p99_ms"):
+                if before[metric] and stats[metric] > before[metric] * (1 + tolerance):
+                    regressions.append(
+                        f"{scenario} {label} {metric}: {before[metric]} -> {stats[metric]}"
+                    )
+            if before["throughput_rps"] and stats["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+                regressions.append(
+                    f"{scenario} {label} throughput_rps: {before['throughput_rps']} -> {stats['throughput_rps']}"
+                )
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Seed synthetic data and load-test the chat API in process")
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help="scenario to run (repeatable); default runs them all")
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--channels', type=int, default=20)
+    parser.add_argument('--dms', type=int, default=50)
+    parser.add_argument('--bot-dms', type=int, default=20)
+    parser.add_argument('--messages', type=int, default=10000)
+    parser.add_argument('--reaction-rate', type=float, default=0.15)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--concurrency', type=int, default=8, help="simulated users per scenario")
+    parser.add_argument('--requests', type=int, default=200, help="iterations per simulated user")
+    parser.add_argument('--bot-latency', type=float, default=0.05, help="fake bot latency in seconds")
+    parser.add_argument('--output', help="write the JSON report here instead of stdout")
+    parser.add_argument('--baseline', help="earlier report to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed slowdown vs baseline (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    # The real bot talks to OpenAI and Pinecone; limits would throttle the load itself
+    bot = fake_bot.install(latency=args.bot_latency, seed=args.seed)
+    os.environ['RATE_LIMIT_ENABLED'] = 'false'
+    os.environ.setdefault('MAINTENANCE_INTERVAL', '0')
+    os.environ.setdefault('MAIL_QUEUE_INTERVAL', '0')
+    scratch = None
+    if not os.environ.get('DATABASE_URL'):
+        scratch = tempfile.mkdtemp(prefix='chat-bench-')
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(scratch, 'bench.db')}"
+
+    import logging
+    logging.disable(logging.INFO)
+
+    from app import create_app, db
+    from . import datagen
+    from .scenarios import run_scenario
+
+    app = create_app()
+    if scratch is None:
+        # Start from an empty schema so runs are comparable, then redo startup on it
+        with app.app_context():
+            db.drop_all()
+        app = create_app()
+
+    with app.app_context():
+        started = time.perf_counter()
+        dataset = datagen.generate(
+            app.config['BOT_USER_ID'], users=args.users, channels=args.channels, dms=args.dms,
+            bot_dms=args.bot_dms, messages=args.messages, reaction_rate=args.reaction_rate, seed=args.seed
+        )
+        seed_seconds = time.perf_counter() - started
+        dialect = db.engine.dialect.name
+
+    report = {
+        "meta": {
+            "generated_at": datetime.utcnow().isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": dialect,
+            "concurrency": args.concurrency,
+            "requests_per_worker": args.requests,
+            "bot_latency_seconds": args.bot_latency,
+        },
+        "dataset": dict(datagen_seconds=round(seed_seconds, 3), **dataset.summary()),
+        "scenarios": {},
+    }
+
+    for name in args.scenario or list(SCENARIOS):
+        recorder, elapsed = run_scenario(
+            app, dataset, name, concurrency=args.concurrency,
+            requests_per_worker=args.requests, seed=args.seed
+        )
+        report["scenarios"][name] = summarize(recorder, elapsed)
+        print(f"{name}: {report['scenarios'][name]['throughput_rps']} req/s", file=sys.stderr)
+    report["meta"]["bot_calls"] = bot.calls
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
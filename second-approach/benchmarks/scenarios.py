@@ -0,0 +1,159 @@
+# benchmarks/scenarios.py
+
+"""
+Scripted load scenarios.
+
+Each scenario runs `concurrency` threads for `requests_per_worker`
+iterations. A worker is one simulated user with its own test client and
+session; every request is timed and recorded under an endpoint label.
+"""
+
+import random
+import threading
+import time
+from datetime import datetime
+
+
+class Recorder:
+    """Collects (label, status, seconds) samples from every worker"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+
+    def record(self, label, status, seconds):
+        with self._lock:
+            self.samples.setdefault(label, []).append((status, seconds))
+
+
+class Worker:
+    def __init__(self, app, user_id, dataset, recorder, seed):
+        self.client = app.test_client()
+        with self.client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+        self.user_id = user_id
+        self.channels = dataset.memberships.get(user_id, [])
+        self.bot_dm = dataset.bot_dms.get(user_id)
+        self.recorder = recorder
+        self.random = random.Random(seed)
+        self.etags = {}
+        self.last_seen = {}
+
+    def request(self, label, method, url, **kwargs):
+        started = time.perf_counter()
+        response = self.client.open(url, method=method, **kwargs)
+        elapsed = time.perf_counter() - started
+        self.recorder.record(label, response.status_code, elapsed)
+        return response
+
+    def poll(self, label, url, key):
+        """Conditional GET the way static/js/main.js polls"""
+        headers = {'If-None-Match': self.etags[key]} if key in self.etags else {}
+        response = self.request(label, 'GET', url, headers=headers)
+        if response.status_code == 200 and response.headers.get('ETag'):
+            self.etags[key] = response.headers['ETag']
+        return response
+
+
+def polling_storm(worker):
+    """Every user polls the channel list and the open channel, as the web client does"""
+    worker.poll('GET /api/channels', '/api/channels', 'channels')
+    if worker.channels:
+        channel_id = worker.random.choice(worker.channels[:3])
+        after = worker.last_seen.get(channel_id)
+        url = f'/api/channels/{channel_id}/messages' + (f'?after={after}' if after else '')
+        response = worker.poll('GET /api/channels/<id>/messages', url, ('messages', channel_id))
+        if response.status_code == 200:
+            worker.last_seen.setdefault(channel_id, datetime.utcnow().isoformat())
+
+
+def post_messages(worker):
+    if not worker.channels:
+        return
+    channel_id = worker.random.choice(worker.channels)
+    if channel_id == worker.bot_dm:
+        return
+    worker.request('POST /api/channels/<id>/messages', 'POST', f'/api/channels/{channel_id}/messages',
+                   json={"content": f"benchmark message {worker.random.random():.6f}"})
+
+
+def hot_channel(worker):
+    """Everyone posts to the same channel, the worst case for its change_seq row"""
+    worker.request('POST /api/channels/<id>/messages (hot)', 'POST', f'/api/channels/{worker.channels[0]}/messages',
+                   json={"content": f"benchmark message {worker.random.random():.6f}"})
+
+
+def list_channels(worker):
+    """Full (unconditional) channel list, the first request of every page load"""
+    worker.request('GET /api/channels (full)', 'GET', '/api/channels')
+
+
+def bot_dms(worker):
+    if worker.bot_dm is None:
+        return
+    worker.request('POST /api/channels/<id>/messages (bot)', 'POST', f'/api/channels/{worker.bot_dm}/messages',
+                   json={"content": worker.random.choice([
+                       "What is the refund policy?", "How do I reset my password?",
+                       "Summarize the onboarding guide", "Who owns the billing service?"
+                   ])})
+
+
+def mixed(worker):
+    """Roughly the traffic of a busy workspace: mostly polling, some posting"""
+    roll = worker.random.random()
+    if roll < 0.8:
+        polling_storm(worker)
+    elif roll < 0.95:
+        post_messages(worker)
+    elif roll < 0.98:
+        list_channels(worker)
+    else:
+        bot_dms(worker)
+
+
+SCENARIOS = {
+    'polling_storm': polling_storm,
+    'post_messages': post_messages,
+    'hot_channel': hot_channel,
+    'list_channels': list_channels,
+    'bot_dms': bot_dms,
+    'mixed': mixed,
+}
+
+
+def run_scenario(app, dataset, name, concurrency=8, requests_per_worker=200, seed=0):
+    """Run one scenario and return (recorder, wall seconds)"""
+    step = SCENARIOS[name]
+    rng = random.Random(f"{seed}:{name}")
+    if name == 'bot_dms':
+        candidates = sorted(dataset.bot_dms)
+    elif name == 'hot_channel':
+        # channel_ids[0] is the most popular channel; its members list it first
+        hot = dataset.channel_ids[0]
+        candidates = [u for u in dataset.user_ids if dataset.memberships.get(u, [None])[0] == hot]
+    else:
+        candidates = [u for u in dataset.user_ids if dataset.memberships.get(u)]
+    users = [rng.choice(candidates) for _ in range(concurrency)]
+
+    recorder = Recorder()
+    workers = [Worker(app, user_id, dataset, recorder, seed=rng.random()) for user_id in users]
+    errors = []
+
+    def loop(worker):
+        try:
+            for _ in range(requests_per_worker):
+                step(worker)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=loop, args=(worker,)) for worker in workers]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    if errors:
+        raise errors[0]
+    return recorder, elapsed
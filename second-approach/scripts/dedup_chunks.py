@@ -0,0 +1,196 @@
+import argparse
+import hashlib
+import json
+import re
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+# MinHash over word shingles, with LSH banding to find candidate pairs.
+# Signatures are 32-bit, so 100k chunks x 128 permutations is ~50MB.
+HASH_PRIME = np.uint64(4294967291)  # largest prime below 2**32
+MAX_HASH = np.uint64(2 ** 32 - 1)
+SHINGLE_MULTIPLIER = np.uint64(1099511628211)  # FNV-1 64-bit prime
+TOKEN_RE = re.compile(r"\w+")
+
+
+def normalize(text: str) -> list:
+    """Word tokens with case folded; punctuation and whitespace runs don't count"""
+    return TOKEN_RE.findall(text.lower())
+
+
+def shingle_hashes(tokens: list, size: int) -> np.ndarray:
+    """32-bit hashes of the word `size`-grams, combined from per-token hashes in numpy"""
+    if not tokens:
+        return np.empty(0, dtype=np.uint64)
+    token_hashes = np.fromiter(
+        (zlib.crc32(t.encode("utf-8")) for t in tokens), dtype=np.uint64, count=len(tokens)
+    )
+    size = min(size, len(tokens))
+    count = len(tokens) - size + 1
+    combined = np.zeros(count, dtype=np.uint64)
+    for offset in range(size):
+        # uint64 arithmetic wraps, which is fine for hashing
+        combined = combined * SHINGLE_MULTIPLIER + token_hashes[offset:offset + count]
+    return np.unique((combined ^ (combined >> np.uint64(32))) & MAX_HASH)
+
+
+def choose_bands(num_perm: int, threshold: float, recall: float = 0.95) -> tuple:
+    """
+    Pick (bands, rows) for LSH: the most selective split that still makes a
+    pair at exactly `threshold` a candidate with probability >= `recall`.
+    Candidates are verified against the signature, so misses cost more than
+    extra candidates.
+    """
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        if 1 - (1 - threshold ** rows) ** bands >= recall:
+            best = (bands, rows)
+    return best
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = 128, seed: int = 1):
+        rng = np.random.RandomState(seed)
+        # a < 2**31 and hashes < 2**32 keep a * x + b inside uint64
+        self.a = rng.randint(1, 2 ** 31, size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, 2 ** 31, size=num_perm, dtype=np.uint64)
+        self.num_perm = num_perm
+
+    def signature(self, hashes: np.ndarray) -> np.ndarray:
+        if not len(hashes):
+            return np.full(self.num_perm, MAX_HASH, dtype=np.uint32)
+        permuted = (np.outer(hashes, self.a) + self.b) % HASH_PRIME
+        return permuted.min(axis=0).astype(np.uint32)
+
+
+class ChunkDeduplicator:
+    """
+    Drops chunks whose estimated Jaccard similarity to an already-kept chunk
+    is at least `threshold`. Each dropped chunk's source is merged into the
+    kept chunk's `duplicate_sources` metadata so provenance isn't lost.
+    """
+
+    def __init__(self, threshold: float = 0.85, num_perm: int = 128, shingle_size: int = 5):
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.hasher = MinHasher(num_perm)
+        self.bands, self.rows = choose_bands(num_perm, threshold)
+        self.tables = [dict() for _ in range(self.bands)]
+        self.exact = {}
+        self.signatures = np.empty((1024, num_perm), dtype=np.uint32)
+        self.kept = []
+        self.stats = {
+            "input_chunks": 0,
+            "kept_chunks": 0,
+            "exact_duplicates": 0,
+            "near_duplicates": 0,
+            "input_chars": 0,
+            "removed_chars": 0,
+        }
+
+    def add(self, doc) -> bool:
+        """Offer a chunk; returns True if it was kept"""
+        text = doc.page_content
+        tokens = normalize(text)
+        self.stats["input_chunks"] += 1
+        self.stats["input_chars"] += len(text)
+
+        digest = hashlib.sha1(" ".join(tokens).encode("utf-8")).digest()
+        original = self.exact.get(digest)
+        if original is not None:
+            self._merge(original, doc)
+            self.stats["exact_duplicates"] += 1
+            self.stats["removed_chars"] += len(text)
+            return False
+
+        signature = self.hasher.signature(shingle_hashes(tokens, self.shingle_size))
+        keys = [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+        candidates = set()
+        for table, key in zip(self.tables, keys):
+            candidates.update(table.get(key, ()))
+        if candidates:
+            candidates = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+            similarity = (self.signatures[candidates] == signature).mean(axis=1)
+            best = int(similarity.argmax())
+        if len(candidates) and similarity[best] >= self.threshold:
+            self._merge(int(candidates[best]), doc)
+            self.stats["near_duplicates"] += 1
+            self.stats["removed_chars"] += len(text)
+            return False
+
+        index = len(self.kept)
+        self.kept.append(doc)
+        if index == len(self.signatures):
+            self.signatures = np.resize(self.signatures, (index * 2, self.hasher.num_perm))
+        self.signatures[index] = signature
+        self.exact[digest] = index
+        for table, key in zip(self.tables, keys):
+            table.setdefault(key, []).append(index)
+        self.stats["kept_chunks"] += 1
+        return True
+
+    def _merge(self, index, duplicate):
+        kept = self.kept[index]
+        source = duplicate.metadata.get("filename") or duplicate.metadata.get("source")
+        if source and source != kept.metadata.get("filename"):
+            sources = kept.metadata.setdefault("duplicate_sources", [])
+            if source not in sources:
+                sources.append(source)
+
+    def report(self) -> dict:
+        stats = dict(self.stats)
+        removed = stats["exact_duplicates"] + stats["near_duplicates"]
+        stats.update({
+            "removed_chunks": removed,
+            "removed_ratio": round(removed / stats["input_chunks"], 4) if stats["input_chunks"] else 0.0,
+            # ~4 characters per token for English text
+            "estimated_tokens_saved": stats["removed_chars"] // 4,
+            "threshold": self.threshold,
+            "lsh_bands": self.bands,
+            "lsh_rows": self.rows,
+        })
+        return stats
+
+
+def dedup_documents(documents: list, threshold: float = 0.85, num_perm: int = 128, shingle_size: int = 5):
+    """Return (kept documents, report dict)"""
+    dedup = ChunkDeduplicator(threshold=threshold, num_perm=num_perm, shingle_size=shingle_size)
+    for doc in documents:
+        dedup.add(doc)
+    return dedup.kept, dedup.report()
+
+
+def print_report(report: dict):
+    print(
+        f"Dedup: kept {report['kept_chunks']} of {report['input_chunks']} chunks; "
+        f"removed {report['exact_duplicates']} exact and {report['near_duplicates']} near duplicates "
+        f"({report['removed_ratio']:.1%}, ~{report['estimated_tokens_saved']} embedding tokens saved)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report near-duplicate chunks in text file(s) without loading them')
+    parser.add_argument('path', type=str, help='Path to text file or directory containing text files')
+    parser.add_argument('--threshold', type=float, default=0.85, help='Jaccard similarity at or above which chunks are duplicates')
+    parser.add_argument('--report', type=str, help='Write the report as JSON to this path')
+    args = parser.parse_args()
+
+    import asyncio
+    from load_documents import process_text_file, process_directory
+
+    path = Path(args.path).expanduser()
+    documents = asyncio.run(process_text_file(path) if path.is_file() else process_directory(path))
+    _, report = dedup_documents(documents, threshold=args.threshold)
+    print_report(report)
+    if args.report:
+        Path(args.report).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,27 @@
 import os
+import json
 import asyncio
+import importlib.util
 from pathlib import Path
 import argparse
-from langchain_openai import OpenAIEmbeddings
 from langchain_pinecone import PineconeVectorStore
 from langchain_community.document_loaders import TextLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from pinecone import Pinecone, ServerlessSpec
+from pinecone import ServerlessSpec
 from dotenv import load_dotenv
 from tqdm import tqdm
 
+from dedup_chunks import dedup_documents, print_report
+
+# Share the app's pooled OpenAI/Pinecone clients. Loaded by path so the script
+# doesn't need Flask and the rest of the app installed.
+_spec = importlib.util.spec_from_file_location(
+    "http_clients", Path(__file__).resolve().parent.parent / "app" / "services" / "http_clients.py"
+)
+_http_clients = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(_http_clients)
+clients = _http_clients.clients
+
 # Try to load from different possible .env locations
 for env_file in ['.env.prod', '../.env.prod']:
     if Path(env_file).exists():
@@ -26,8 +38,8 @@ async def initialize_pinecone():
     if not openai_api_key:
         raise ValueError("OPENAI_API_KEY environment variable is required")
 
-    # Initialize Pinecone with new syntax
-    pc = Pinecone(api_key=api_key)
+    # Initialize Pinecone through the shared client registry
+    pc = clients.pinecone(api_key=api_key)
     index_name = os.environ.get('PINECONE_INDEX_NAME', 'chatgenius')
 
     # Create index if it doesn't exist
@@ -46,12 +58,12 @@ async def initialize_pinecone():
         print(f"Using existing index: {index_name}")
     
     return PineconeVectorStore(
-        index_name=index_name,
-        embedding=OpenAIEmbeddings(openai_api_key=openai_api_key),
+        index=clients.pinecone_index(index_name, api_key=api_key),
+        embedding=clients.embeddings(openai_api_key=openai_api_key),
         text_key="text"
     )
 
-async def process_text_file(file_path: Path) -> list:
+async def process_text_file(file_path: Path, chunk_size: int = 4000, chunk_overlap: int = 400) -> list:
     """Process a text file and split it into chunks"""
     print(f"Processing {file_path}...")
     
@@ -61,8 +73,8 @@ async def process_text_file(file_path: Path) -> list:
     
     # Split text into chunks
     text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=4000,
-        chunk_overlap=400,
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
         length_function=len,
         separators=["\n\n\n", "\n\n", "\n", ".", " ", ""]
     )
@@ -111,6 +123,10 @@ async def process_directory(dir_path: Path) -> list:
 async def main():
     parser = argparse.ArgumentParser(description='Load text file(s) into Pinecone')
     parser.add_argument('path', type=str, help='Path to text file or directory containing text files')
+    parser.add_argument('--dedup-threshold', type=float, default=float(os.environ.get('DEDUP_THRESHOLD', 0.85)),
+                        help='Drop chunks at least this similar (MinHash Jaccard) to one already kept')
+    parser.add_argument('--no-dedup', action='store_true', help='Embed every chunk, duplicates included')
+    parser.add_argument('--dedup-report', type=str, help='Write the dedup report as JSON to this path')
     args = parser.parse_args()
 
     path = Path(args.path).expanduser()  # Handle ~ in paths
@@ -129,11 +145,20 @@ async def main():
         else:
             documents = await process_directory(path)
             print(f"Total chunks across all files: {len(documents)}")
+
+        # Near-duplicate chunks (repeated boilerplate, overlapping exports)
+        # cost embeddings and crowd out distinct results at query time
+        if documents and not args.no_dedup:
+            documents, report = dedup_documents(documents, threshold=args.dedup_threshold)
+            print_report(report)
+            if args.dedup_report:
+                Path(args.dedup_report).write_text(json.dumps(report, indent=2))
         
         # Add to Pinecone
         if documents:
             print("Adding documents to Pinecone...")
-            await vectorstore.aadd_documents(documents)
+            # Sync upserts run in parallel on the index's pooled connections
+            vectorstore.add_documents(documents)
             print(f"Successfully added {len(documents)} chunks to the knowledge base")
         else:
             print("No documents to process")
@@ -0,0 +1,156 @@
+# tests/gevent_harness.py
+
+"""
+Posts bot DM questions concurrently on greenlets, the way the production
+gevent worker serves them, through the real bot_service with only the
+OpenAI and Pinecone round trips replaced by blocking sleeps.
+
+Monkey-patching has to happen before anything else is imported, so tests
+run this as `python -m tests.gevent_harness` in a subprocess and read the
+JSON report it prints last.
+"""
+
+try:
+    # Not a dependency, but httpcore imports it when installed, and it needs
+    # the unpatched select.epoll at import time
+    import trio  # noqa: F401
+except ImportError:
+    pass
+
+from gevent import monkey
+monkey.patch_all()
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import gevent
+
+
+class FakeEmbeddings:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def embed_query(self, text):
+        time.sleep(self.latency)
+        return [0.1] * 8
+
+
+class FakeVectorStore:
+    def similarity_search_by_vector_with_score(self, embedding, k=3):
+        from langchain.schema import Document
+        return [(Document(page_content="Refunds are processed within five days."), 0.9)]
+
+
+class FakeChat:
+    """Blocks like a completion call and records how many run at once"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def invoke(self, prompt_value):
+        from langchain.schema import AIMessage
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.latency)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+        question = prompt_value.to_messages()[-1].content
+        return AIMessage(content=f"answer to {question}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--question', action='append', required=True, help="one concurrent bot DM per question")
+    parser.add_argument('--latency', type=float, default=0.2, help="seconds per blocking upstream call")
+    parser.add_argument('--admission', default='8,32,10', help="ADMISSION_BOT_GENERATION")
+    args = parser.parse_args(argv)
+
+    scratch = tempfile.mkdtemp(prefix='chat-gevent-')
+    os.environ.update({
+        'DATABASE_URL': f"sqlite:///{os.path.join(scratch, 'app.db')}",
+        'OPENAI_API_KEY': os.environ.get('OPENAI_API_KEY', 'sk-test'),
+        'PINECONE_API_KEY': os.environ.get('PINECONE_API_KEY', 'pc-test'),
+        'ADMISSION_BOT_GENERATION': args.admission,
+        'RATE_LIMIT_ENABLED': 'false',
+        'MAINTENANCE_INTERVAL': '0',
+        'MAIL_QUEUE_INTERVAL': '0',
+    })
+
+    import logging
+    logging.disable(logging.CRITICAL)
+
+    # A host-addressed Index skips the control-plane lookup, so nothing leaves the machine
+    from app.services.http_clients import clients
+    clients.pinecone_index = lambda name, api_key=None: clients.pinecone(api_key).Index(host='https://index.invalid')
+    from app.services.bot_service import bot_service
+    chat = FakeChat(args.latency)
+    bot_service.embeddings = FakeEmbeddings(args.latency / 4)
+    bot_service.vectorstore = FakeVectorStore()
+    bot_service.chat = chat
+
+    from app import create_app, db
+    from app.models import User, Channel, ChannelMembership
+
+    app = create_app()
+    clients_by_question = []
+    with app.app_context():
+        bot_id = app.config['BOT_USER_ID']
+        for i, question in enumerate(args.question):
+            user = User(email=f"user{i}@gauntletai.com")
+            db.session.add(user)
+            db.session.flush()
+            channel = Channel(creator_id=user.id, is_dm=True, is_bot_dm=True)
+            db.session.add(channel)
+            db.session.flush()
+            db.session.add_all([
+                ChannelMembership(user_id=user.id, channel_id=channel.id),
+                ChannelMembership(user_id=bot_id, channel_id=channel.id),
+            ])
+            clients_by_question.append((user.id, channel.id, question))
+        db.session.commit()
+
+    def ask(user_id, channel_id, question):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+        response = client.post(f'/api/channels/{channel_id}/messages', json={"content": question})
+        return response.status_code, response.get_json()
+
+    started = time.perf_counter()
+    greenlets = [gevent.spawn(ask, *entry) for entry in clients_by_question]
+    gevent.joinall(greenlets)
+    elapsed = time.perf_counter() - started
+
+    responses = [g.value for g in greenlets]
+    with app.app_context():
+        from app.models import Message
+        replies = [
+            [m.content for m in Message.query.filter_by(channel_id=channel_id, user_id=bot_id)]
+            for _, channel_id, _ in clients_by_question
+        ]
+    print(json.dumps({
+        "statuses": [status for status, _ in responses],
+        "errors": [body.get("error") for status, body in responses if status >= 300],
+        "replies": replies,
+        "upstream_calls": chat.calls,
+        "max_in_flight": chat.max_in_flight,
+        "seconds": round(elapsed, 3),
+    }))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
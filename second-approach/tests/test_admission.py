@@ -0,0 +1,124 @@
+# tests/test_admission.py
+
+import threading
+
+import pytest
+from app import create_app, db
+from app.models import User, Channel, ChannelMembership, Message
+from app.services.admission import Overloaded, Pool, admission, DEFAULT_POOLS
+
+def test_pool_queues_then_sheds():
+    pool = Pool('test', concurrency=1, queue=1, timeout=0.05)
+    pool.acquire()
+
+    # One waiter fits in the queue and times out; while it waits, a third is refused outright
+    errors = []
+    def wait():
+        try:
+            pool.acquire()
+        except Overloaded as e:
+            errors.append(e.reason)
+    waiter = threading.Thread(target=wait)
+    waiter.start()
+    while not pool.waiting:
+        pass
+    with pytest.raises(Overloaded) as shed:
+        pool.acquire()
+    waiter.join()
+    assert shed.value.reason == 'queue_full'
+    assert shed.value.retry_after >= 1
+    assert errors == ['timeout']
+
+    # A released slot goes to the next waiter
+    waiter = threading.Thread(target=pool.acquire)
+    waiter.start()
+    while not pool.waiting:
+        pass
+    pool.release(0.01)
+    waiter.join()
+    assert pool.stats()["in_flight"] == 1
+    assert pool.stats()["admitted"] == 2
+    assert pool.stats()["shed"] == {'queue_full': 1, 'timeout': 1}
+
+def test_waiters_are_admitted_in_arrival_order():
+    pool = Pool('test', concurrency=1, queue=10, timeout=5)
+    pool.acquire()
+
+    order = []
+    def job(n):
+        pool.acquire()
+        order.append(n)
+        pool.release(0.01)
+    threads = []
+    for n in range(5):
+        threads.append(threading.Thread(target=job, args=(n,)))
+        threads[-1].start()
+        while pool.waiting <= n:
+            pass
+
+    pool.release(0.01)
+    for thread in threads:
+        thread.join()
+    assert order == [0, 1, 2, 3, 4]
+    assert pool.stats()["in_flight"] == 0
+
+def test_newcomers_cannot_take_a_slot_handed_to_a_waiter():
+    pool = Pool('test', concurrency=1, queue=2, timeout=0.1)
+    pool.acquire()
+    admitted = []
+    waiter = threading.Thread(target=lambda: admitted.append(pool.acquire()))
+    waiter.start()
+    while not pool.waiting:
+        pass
+
+    # The freed slot already belongs to the waiter, even before it wakes up
+    pool.release(0.01)
+    with pytest.raises(Overloaded) as shed:
+        pool.acquire()
+    assert shed.value.reason == 'timeout'
+    waiter.join()
+    assert len(admitted) == 1
+    assert pool.stats()["in_flight"] == 1
+
+@pytest.fixture
+def client():
+    app = create_app()
+    app.config['TESTING'] = True
+
+    with app.app_context():
+        db.create_all()
+        user = User(email="tester@gauntletai.com")
+        db.session.add(user)
+        db.session.flush()
+        channel = Channel(creator_id=user.id, is_dm=True, is_bot_dm=True)
+        db.session.add(channel)
+        db.session.flush()
+        db.session.add_all([
+            ChannelMembership(user_id=user.id, channel_id=channel.id),
+            ChannelMembership(user_id=app.config['BOT_USER_ID'], channel_id=channel.id),
+        ])
+        db.session.commit()
+
+        client = app.test_client()
+        client.channel_id = channel.id
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user.id)
+        yield client
+        db.drop_all()
+    admission.configure(DEFAULT_POOLS)
+
+def test_bot_messages_over_capacity_are_shed(client):
+    admission.configure({'bot_generation': (0, 0, 1.0)})
+    resp = client.post(f'/api/channels/{client.channel_id}/messages', json={"content": "hello?"})
+    assert resp.status_code == 503
+    assert int(resp.headers['Retry-After']) >= 1
+    # Nothing was stored for the shed question
+    assert Message.query.filter_by(channel_id=client.channel_id).count() == 0
+
+    # Cheap requests don't go through the pool
+    assert client.get(f'/api/channels/{client.channel_id}/messages').status_code == 200
+
+    admission.configure({'bot_generation': (1, 0, 1.0)})
+    resp = client.post(f'/api/channels/{client.channel_id}/messages', json={"content": "hello?"})
+    assert resp.status_code == 201
+    assert admission.stats()["pools"]["bot_generation"]["in_flight"] == 0
@@ -0,0 +1,73 @@
+# tests/test_analytics.py
+
+from datetime import datetime, timedelta
+
+import pytest
+from app import create_app, db
+from app.models import User, Channel, Message, MessageReaction
+from app.services.analytics import rollup_analytics
+
+@pytest.fixture
+def app():
+    app = create_app()
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['ADMIN_EMAILS'] = {"tester@gauntletai.com"}
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+def test_rollups_fold_only_new_rows(app):
+    user = User(email="tester@gauntletai.com")
+    db.session.add(user)
+    db.session.flush()
+    channel = Channel(name="general", creator_id=user.id)
+    db.session.add(channel)
+    db.session.flush()
+
+    now = datetime.utcnow()
+    hour = now.replace(minute=0, second=0, microsecond=0)
+    posted = hour - timedelta(minutes=30)
+    bot_id = app.config['BOT_USER_ID']
+    messages = [
+        Message(channel_id=channel.id, user_id=user.id, content="q1", created_at=posted),
+        Message(channel_id=channel.id, user_id=bot_id, content="a1", created_at=posted, generation_ms=800),
+        Message(channel_id=channel.id, user_id=user.id, content="q2", created_at=posted),
+        Message(channel_id=channel.id, user_id=bot_id, content="a2", created_at=posted, generation_ms=1200),
+        # Too recent to be settled; left for the next run
+        Message(channel_id=channel.id, user_id=user.id, content="late", created_at=now),
+    ]
+    db.session.add_all(messages)
+    db.session.flush()
+    db.session.add(MessageReaction(message_id=messages[1].id, user_id=user.id, emoji="👍", created_at=posted))
+    db.session.commit()
+
+    assert rollup_analytics(app, now=now) == 5
+    assert rollup_analytics(app, now=now) == 0
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+
+    data = client.get('/api/analytics/usage?period=hour&count=2').get_json()
+    assert [b["start"] for b in data["buckets"]] == [(hour - timedelta(hours=1)).isoformat(), hour.isoformat()]
+    previous = data["buckets"][0]
+    assert previous["messages"] == 4
+    assert previous["reactions"] == 1
+    assert previous["active_users"] == 1
+    assert previous["bot_replies"] == 2
+    assert previous["bot_latency_ms_avg"] == 1000
+    assert previous["bot_latency_ms_max"] == 1200
+    assert data["buckets"][1]["messages"] == 0
+
+    rollup_analytics(app, now=now + timedelta(minutes=5))
+    day = client.get('/api/analytics/usage?period=day&count=1').get_json()["buckets"][-1]
+    if posted.date() == now.date():
+        assert day["messages"] == 5
+        assert day["active_users"] == 1
+
+    hourly = client.get(f'/api/analytics/channels/{channel.id}?count=2').get_json()["buckets"]
+    assert [b["messages"] for b in hourly] == [4, 1]
+    assert [b["reactions"] for b in hourly] == [1, 0]
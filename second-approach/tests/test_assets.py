@@ -0,0 +1,42 @@
+# tests/test_assets.py
+
+import gzip
+import re
+
+import pytest
+from app import create_app
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv('ASSETS_DIR', str(tmp_path / 'assets'))
+    app = create_app()
+    app.config['TESTING'] = True
+    return app
+
+
+def test_templates_link_fingerprinted_assets(app):
+    html = app.test_client().get('/api/auth/login').get_data(as_text=True)
+    assert re.search(r'href="/assets/css/styles\.[0-9a-f]{12}\.css"', html)
+
+
+def test_assets_are_precompressed_and_immutable(app):
+    client = app.test_client()
+    with app.test_request_context():
+        url = app.jinja_env.globals['asset_url']('js/main.js')
+    with open(app.static_folder + '/js/main.js', 'rb') as f:
+        original = f.read()
+
+    resp = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert resp.status_code == 200
+    assert resp.headers['Content-Encoding'] == 'gzip'
+    assert 'immutable' in resp.headers['Cache-Control']
+    assert 'Accept-Encoding' in resp.headers['Vary']
+    assert gzip.decompress(resp.get_data()) == original
+
+    resp = client.get(url, headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in resp.headers
+    assert resp.get_data() == original
+
+    # Only names from the manifest are served
+    assert client.get('/assets/js/main.js').status_code == 404
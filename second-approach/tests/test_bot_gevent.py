@@ -0,0 +1,48 @@
+# tests/test_bot_gevent.py
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip('gevent')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LATENCY = 0.3
+
+def run_harness(*questions, admission=None):
+    """Post `questions` as concurrent bot DMs on greenlets; see tests/gevent_harness.py"""
+    args = [sys.executable, '-m', 'tests.gevent_harness', '--latency', str(LATENCY)]
+    for question in questions:
+        args += ['--question', question]
+    if admission:
+        args += ['--admission', admission]
+    result = subprocess.run(args, cwd=ROOT, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr[-2000:]
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def test_concurrent_bot_dms_are_all_answered():
+    report = run_harness("What is the refund policy?", "Who owns billing?")
+    assert report["statuses"] == [201, 201]
+    assert report["replies"] == [["answer to What is the refund policy?"], ["answer to Who owns billing?"]]
+    # The blocking upstream calls overlapped instead of running one after the other
+    assert report["max_in_flight"] == 2
+    assert report["seconds"] < 2 * LATENCY
+
+def test_identical_concurrent_questions_share_one_upstream_call():
+    report = run_harness("When is the launch?", "when is the launch", "WHEN is the launch??", "When is the launch")
+    assert report["statuses"] == [201] * 4
+    assert report["upstream_calls"] == 1
+    # Every DM got the leader's answer, not an error
+    assert len({tuple(replies) for replies in report["replies"]}) == 1
+    assert report["replies"][0] == ["answer to When is the launch?"]
+
+def test_bot_generation_pool_runs_its_full_concurrency():
+    questions = [f"Question number {n}?" for n in range(4)]
+    report = run_harness(*questions, admission="2,8,10")
+    assert report["statuses"] == [201] * 4
+    # Two slots really are in flight at once, and the other two queue for them
+    assert report["max_in_flight"] == 2
+    assert 2 * LATENCY <= report["seconds"] < 3 * LATENCY
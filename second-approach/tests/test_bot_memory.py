@@ -0,0 +1,38 @@
+# tests/test_bot_memory.py
+
+from app.services.bot_memory import trim_history
+from app.services.bot_tracing import count_tokens
+
+SUMMARY = "The user asked about refunds and was told they take five days."
+TURNS = [
+    ('human', "What is the refund policy for annual plans?"),
+    ('ai', "Annual plans are refunded pro rata within thirty days."),
+    ('human', "And monthly plans?"),
+    ('ai', "Monthly plans are not refunded, but you can cancel at any time."),
+]
+
+def size(summary, turns):
+    return (count_tokens(summary) if summary else 0) + sum(count_tokens(c) for _, c in turns)
+
+def test_history_that_fits_is_kept_whole():
+    assert trim_history(SUMMARY, TURNS, size(SUMMARY, TURNS)) == (SUMMARY, TURNS)
+
+def test_oldest_turns_go_first():
+    for keep in range(len(TURNS), 0, -1):
+        budget = size(SUMMARY, TURNS[-keep:])
+        assert trim_history(SUMMARY, TURNS, budget) == (SUMMARY, TURNS[-keep:])
+        # One token short drops exactly one more turn
+        assert trim_history(SUMMARY, TURNS, budget - 1) == (SUMMARY, TURNS[-keep + 1:] if keep > 1 else [])
+
+def test_summary_goes_after_every_turn():
+    assert trim_history(SUMMARY, TURNS, count_tokens(SUMMARY)) == (SUMMARY, [])
+
+def test_an_oversized_summary_leaves_room_for_recent_turns():
+    summary = " ".join([SUMMARY] * 4)
+    budget = size('', TURNS[-2:])
+    assert count_tokens(summary) > budget
+    assert trim_history(summary, TURNS, budget) == ('', TURNS[-2:])
+
+def test_no_budget_means_no_history():
+    assert trim_history(SUMMARY, TURNS, 0) == ('', [])
+    assert trim_history(SUMMARY, TURNS, -50) == ('', [])
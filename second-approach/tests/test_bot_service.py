@@ -0,0 +1,130 @@
+# tests/test_bot_service.py
+
+import importlib.util
+import os
+
+import pytest
+from langchain.schema import AIMessage, Document
+from app.services.bot_tracing import count_tokens
+from app.services.http_clients import clients
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DOCS = [
+    "Refunds for annual plans are paid pro rata within thirty days of the request.",
+    "Monthly plans are never refunded, but they can be cancelled at any time.",
+    "Billing questions go to the finance team, who answer within two working days.",
+]
+SUMMARY = "The user is on an annual plan and asked how refunds are paid."
+TURNS = [
+    ('human', "Can I get a refund for my annual plan?"),
+    ('ai', "Yes, annual plans are refunded pro rata within thirty days."),
+    ('human', "How long does the money take to arrive?"),
+    ('ai', "Usually five working days after the refund is approved."),
+]
+QUESTION = "Who do I ask about an invoice that looks wrong?"
+
+
+class FakeEmbeddings:
+    def embed_query(self, text):
+        return [0.1] * 8
+
+
+class FakeVectorStore:
+    def similarity_search_by_vector_with_score(self, embedding, k=3):
+        return [(Document(page_content=text), 0.9 - i / 10) for i, text in enumerate(DOCS[:k])]
+
+
+class FakeChat:
+    def __init__(self):
+        self.prompts = []
+
+    def invoke(self, prompt_value):
+        self.prompts.append(prompt_value.to_messages())
+        return AIMessage(content="ask finance")
+
+
+@pytest.fixture
+def service(monkeypatch):
+    """
+    The real BotService, built without credentials or network: a
+    host-addressed Pinecone Index skips the control-plane lookup. Loaded from
+    its file because importing app.services.bot_service needs both API keys.
+    """
+    monkeypatch.setenv('OPENAI_API_KEY', os.environ.get('OPENAI_API_KEY', 'sk-test'))
+    monkeypatch.setenv('PINECONE_API_KEY', os.environ.get('PINECONE_API_KEY', 'pc-test'))
+    monkeypatch.setattr(
+        clients, 'pinecone_index',
+        lambda name, api_key=None: clients.pinecone(api_key).Index(host='https://index.invalid')
+    )
+    path = os.path.join(ROOT, 'app', 'services', 'bot_service.py')
+    spec = importlib.util.spec_from_file_location('app.services.bot_service', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    service = module.bot_service
+    service.embeddings = FakeEmbeddings()
+    service.vectorstore = FakeVectorStore()
+    service.chat = FakeChat()
+    return service
+
+
+def prompt_tokens(messages):
+    return sum(count_tokens(m.content) for m in messages)
+
+
+def ask(service, cap, summary=SUMMARY, turns=TURNS, question=QUESTION):
+    service.prompt_token_cap = cap
+    assert service._generate_response(question, summary, list(turns)) == "ask finance"
+    return service.chat.prompts[-1]
+
+
+def parts(messages):
+    """(documents, summary, turns) that made it into the prompt"""
+    context = messages[1].content
+    docs = [doc for doc in DOCS if doc in context]
+    history = messages[2:-1]
+    summary = history[0].content if history and history[0].type == 'system' else ''
+    turns = [('human' if m.type == 'human' else 'ai', m.content) for m in history if m.type != 'system']
+    return docs, summary, turns
+
+
+def test_everything_is_sent_under_a_generous_cap(service):
+    messages = ask(service, 100000)
+    docs, summary, turns = parts(messages)
+    assert docs == DOCS
+    assert SUMMARY in summary
+    assert turns == TURNS
+    assert messages[-1].content == QUESTION
+
+
+def test_prompt_stays_under_the_cap(service):
+    full = prompt_tokens(ask(service, 100000))
+    for cap in range(full, 0, -max(1, full // 40)):
+        messages = ask(service, cap)
+        assert messages[-1].content == QUESTION
+        if cap >= service.system_tokens + count_tokens(QUESTION):
+            assert prompt_tokens(messages) <= cap, cap
+
+
+def test_history_is_dropped_before_documents(service):
+    full = ask(service, 100000)
+    history_tokens = prompt_tokens(full[2:-1])
+    # Just short of room for everything: the oldest turn goes, the documents stay
+    docs, summary, turns = parts(ask(service, prompt_tokens(full) - 1))
+    assert docs == DOCS
+    assert turns == TURNS[1:]
+
+    # Without room for any history the lowest-ranked document goes, and
+    # whatever it frees is handed back to the newest turns
+    docs, summary, turns = parts(ask(service, prompt_tokens(full) - history_tokens - 1))
+    assert docs == DOCS[:-1]
+    assert turns == TURNS[len(TURNS) - len(turns):]
+
+
+def test_a_question_over_the_cap_is_sent_alone(service):
+    # The question is never cut, so it goes out with the system prompt and nothing else
+    question = " ".join([QUESTION] * 20)
+    messages = ask(service, service.system_tokens + count_tokens(question) - 1, question=question)
+    docs, summary, turns = parts(messages)
+    assert (docs, summary, turns) == ([], '', [])
+    assert messages[-1].content == question
@@ -2,6 +2,7 @@
 
 import pytest
 from app import create_app, db
+from app.models import User, Channel, ChannelMembership, Message
 
 @pytest.fixture
 def client():
@@ -11,13 +12,19 @@ def client():
 
     with app.app_context():
         db.create_all()
-        yield app.test_client()
+        user = User(email="tester@gauntletai.com")
+        db.session.add(user)
+        db.session.commit()
+
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user.id)
+        yield client
         db.drop_all()
 
 def test_create_channel(client):
     resp = client.post('/api/channels', json={
         "name": "test-channel",
-        "creator_id": 1,
         "is_dm": False
     })
     assert resp.status_code == 201
@@ -28,13 +35,60 @@ def test_list_channels(client):
     # create one channel
     client.post('/api/channels', json={
         "name": "test-channel",
-        "creator_id": 1,
         "is_dm": False
     })
     # list
     resp = client.get('/api/channels')
     assert resp.status_code == 200
     data = resp.get_json()
-    assert len(data) == 1
-    assert data[0]["name"] == "test-channel"
+    assert len(data["channels"]) == 1
+    assert data["channels"][0]["name"] == "test-channel"
+    assert data["deleted_channel_ids"] == []
+
+def test_unread_counts_and_mark_read(client):
+    channel_id = client.post('/api/channels', json={"name": "general"}).get_json()["channel_id"]
+    other = User(email="other@gauntletai.com")
+    db.session.add(other)
+    db.session.flush()
+    db.session.add(ChannelMembership(user_id=other.id, channel_id=channel_id))
+    messages = [Message(channel_id=channel_id, user_id=other.id, content=f"m{i}") for i in range(3)]
+    db.session.add_all(messages)
+    db.session.commit()
+
+    channel = client.get('/api/channels').get_json()["channels"][0]
+    assert channel["unread_count"] == 3
+    assert channel["last_read_message_id"] is None
+
+    resp = client.post(f'/api/channels/{channel_id}/read', json={"message_id": messages[1].id})
+    assert resp.get_json()["unread_count"] == 1
+
+    # The watermark never moves backwards
+    resp = client.post(f'/api/channels/{channel_id}/read', json={"message_id": messages[0].id})
+    assert resp.get_json()["last_read_message_id"] == messages[1].id
+
+    client.post(f'/api/channels/{channel_id}/read')
+    assert client.get('/api/channels').get_json()["channels"][0]["unread_count"] == 0
+
+def test_reactions_outside_your_channels_look_missing(client):
+    other = User(email="other@gauntletai.com")
+    db.session.add(other)
+    db.session.flush()
+    channel = Channel(name="private", creator_id=other.id)
+    db.session.add(channel)
+    db.session.flush()
+    db.session.add(ChannelMembership(user_id=other.id, channel_id=channel.id))
+    message = Message(channel_id=channel.id, user_id=other.id, content="hi")
+    db.session.add(message)
+    db.session.commit()
+
+    # A non-member gets the same answer for a real message as for one that doesn't exist
+    for target in (message.id, message.id + 1000):
+        resp = client.post(f'/api/messages/{target}/reactions', json={"emoji": "👍"})
+        assert (resp.status_code, resp.get_json()) == (404, {"error": "Message not found"})
+        resp = client.delete(f'/api/messages/{target}/reactions/👍')
+        assert (resp.status_code, resp.get_json()) == (404, {"error": "Message not found"})
 
+    channel_id = client.post('/api/channels', json={"name": "general"}).get_json()["channel_id"]
+    own = client.post(f'/api/channels/{channel_id}/messages', json={"content": "mine"}).get_json()["message_id"]
+    assert client.post(f'/api/messages/{own}/reactions', json={"emoji": "👍"}).status_code == 201
+    assert client.delete(f'/api/messages/{own}/reactions/👍').status_code == 200
@@ -0,0 +1,66 @@
+# tests/test_compression.py
+
+import gzip
+import json
+
+import pytest
+from flask import Response
+from app import create_app, compression
+
+@pytest.fixture
+def app():
+    app = create_app()
+    app.config['TESTING'] = True
+
+    payload = json.dumps({"messages": [{"content": f"message {i}"} for i in range(100)]})
+
+    @app.route('/test/payload')
+    def payload_view():
+        return Response(payload, mimetype='application/json')
+
+    @app.route('/test/small')
+    def small_view():
+        return Response('{"ok": true}', mimetype='application/json')
+
+    @app.route('/test/passthrough')
+    def passthrough_view():
+        return Response(payload, mimetype='application/json', direct_passthrough=True)
+
+    app.payload = payload.encode()
+    return app
+
+def fetch(app, url, accept):
+    headers = {'Accept-Encoding': accept} if accept else {}
+    return app.test_client().get(url, headers=headers)
+
+def test_gzip_when_accepted(app):
+    resp = fetch(app, '/test/payload', 'gzip, deflate')
+    assert resp.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in resp.headers['Vary']
+    assert gzip.decompress(resp.get_data()) == app.payload
+    assert int(resp.headers['Content-Length']) < len(app.payload)
+
+def test_identity_when_nothing_useful_is_accepted(app):
+    for accept in (None, 'identity', 'deflate', 'gzip;q=0'):
+        resp = fetch(app, '/test/payload', accept)
+        assert 'Content-Encoding' not in resp.headers
+        assert resp.get_data() == app.payload
+
+def test_brotli_preferred_when_installed(app):
+    brotli = pytest.importorskip('brotli')
+    resp = fetch(app, '/test/payload', 'gzip, br')
+    assert resp.headers['Content-Encoding'] == 'br'
+    assert brotli.decompress(resp.get_data()) == app.payload
+
+def test_gzip_fallback_without_brotli(app, monkeypatch):
+    monkeypatch.setattr(compression, 'brotli', None)
+    resp = fetch(app, '/test/payload', 'br, gzip')
+    assert resp.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(resp.get_data()) == app.payload
+
+def test_small_and_passthrough_responses_are_left_alone(app):
+    assert 'Content-Encoding' not in fetch(app, '/test/small', 'gzip').headers
+
+    resp = fetch(app, '/test/passthrough', 'gzip')
+    assert 'Content-Encoding' not in resp.headers
+    assert resp.get_data() == app.payload
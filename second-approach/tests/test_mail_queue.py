@@ -0,0 +1,167 @@
+# tests/test_mail_queue.py
+
+import socket
+import threading
+
+import pytest
+from app import create_app, db
+from app.models import OutboundEmail
+from app.services.mail_queue import enqueue_email, drain_outbox, MAX_ATTEMPTS
+
+
+class LocalSMTPServer:
+    """Just enough SMTP to accept mail on localhost; records connections and messages"""
+
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(5)
+        self.port = self.sock.getsockname()[1]
+        self.connections = 0
+        self.messages = []
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            self.connections += 1
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        f = conn.makefile('rb')
+        conn.sendall(b"220 localhost ready\r\n")
+        recipients = []
+        while True:
+            line = f.readline()
+            if not line:
+                break
+            command = line.decode().strip().upper()
+            if command.startswith(('EHLO', 'HELO')):
+                conn.sendall(b"250 localhost\r\n")
+            elif command.startswith('RCPT'):
+                recipients.append(line.decode().split(':', 1)[1].strip().strip('<>'))
+                conn.sendall(b"250 OK\r\n")
+            elif command.startswith(('MAIL', 'RSET', 'NOOP')):
+                conn.sendall(b"250 OK\r\n")
+            elif command == 'DATA':
+                conn.sendall(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+                body = []
+                while True:
+                    data = f.readline()
+                    if data in (b".\r\n", b""):
+                        break
+                    body.append(data)
+                self.messages.append((recipients, b"".join(body).decode()))
+                recipients = []
+                conn.sendall(b"250 OK\r\n")
+            elif command == 'QUIT':
+                conn.sendall(b"221 Bye\r\n")
+                break
+            else:
+                conn.sendall(b"502 Not implemented\r\n")
+        conn.close()
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+@pytest.fixture
+def smtp_server():
+    server = LocalSMTPServer()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def app(smtp_server, monkeypatch):
+    monkeypatch.setenv('MAIL_SERVER', '127.0.0.1')
+    monkeypatch.setenv('MAIL_PORT', str(smtp_server.port))
+    monkeypatch.setenv('MAIL_USE_TLS', 'False')
+    monkeypatch.setenv('MAIL_DEFAULT_SENDER', 'noreply@gauntletai.com')
+    monkeypatch.setenv('MAIL_QUEUE_INTERVAL', '0')
+    app = create_app()
+    app.config['TESTING'] = True
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+
+def test_drain_delivers_queued_emails_over_one_connection(app, smtp_server):
+    for i in range(3):
+        enqueue_email(f"user{i}@gauntletai.com", "Your Chat Genius Login Link", f"link {i}")
+    db.session.commit()
+
+    assert drain_outbox(app) == 3
+
+    assert smtp_server.connections == 1
+    assert sorted(r[0] for r, _ in smtp_server.messages) == [
+        "user0@gauntletai.com", "user1@gauntletai.com", "user2@gauntletai.com"
+    ]
+    statuses = {email.status for email in OutboundEmail.query.all()}
+    assert statuses == {'sent'}
+    # The login links went out and aren't kept around in the outbox
+    assert any("link 0" in body for _, body in smtp_server.messages)
+    assert {email.body for email in OutboundEmail.query.all()} == {''}
+
+
+def test_unreachable_server_schedules_retry(app, smtp_server):
+    smtp_server.close()
+    enqueue_email("user@gauntletai.com", "Your Chat Genius Login Link", "link")
+    db.session.commit()
+
+    assert drain_outbox(app) == 0
+
+    email = OutboundEmail.query.one()
+    assert email.status == 'pending'
+    assert email.attempts == 1
+    assert email.next_attempt_at > email.created_at
+    assert email.body == "link"
+
+    # Giving up blanks the body too
+    email.attempts = MAX_ATTEMPTS - 1
+    email.next_attempt_at = email.created_at
+    db.session.commit()
+    drain_outbox(app)
+    db.session.expire_all()
+    email = OutboundEmail.query.one()
+    assert (email.status, email.body) == ('failed', '')
+
+
+def test_failed_reconnect_records_the_attempt_for_the_whole_batch(app, smtp_server, monkeypatch):
+    import smtplib
+    import flask_mail
+
+    for i in range(3):
+        enqueue_email(f"user{i}@gauntletai.com", "Your Chat Genius Login Link", f"link {i}")
+    db.session.commit()
+
+    def disconnect(self, message, envelope_from=None):
+        smtp_server.close()
+        raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+    monkeypatch.setattr(flask_mail.Connection, 'send', disconnect)
+
+    assert drain_outbox(app) == 0
+
+    db.session.expire_all()
+    emails = OutboundEmail.query.all()
+    assert [(email.status, email.attempts) for email in emails] == [('pending', 1)] * 3
+    assert emails[1].last_error.startswith("connect:")
+
+
+def test_magic_link_request_does_not_talk_to_smtp(app, smtp_server):
+    app.config['AUTH_REQUIRED'] = True
+    resp = app.test_client().post('/api/auth/magic-link', json={"email": "user@gauntletai.com"})
+
+    assert resp.status_code == 200
+    assert smtp_server.connections == 0
+    assert OutboundEmail.query.one().status == 'pending'
@@ -0,0 +1,144 @@
+# tests/test_maintenance.py
+
+from datetime import datetime, timedelta
+
+import pytest
+from app import create_app, db
+from app.models import User, Channel, ChannelMembership, Message, MessageReaction, MagicLink, RateLimitBucket, OutboundEmail
+from app.services import maintenance
+from app.services.maintenance import LeaderLock, run_maintenance
+
+NOW = datetime(2024, 6, 1, 12, 0)
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app()
+    app.config['TESTING'] = True
+    app.config['TOMBSTONE_GRACE_DAYS'] = 7
+    app.instance_path = str(tmp_path)
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+def test_only_one_worker_holds_the_leader_lock(app):
+    first, second = LeaderLock(app), LeaderLock(app)
+    assert first.acquire()
+    assert first.acquire()
+    assert first.check()
+    assert not second.acquire()
+
+    first.release()
+    assert second.acquire()
+    assert not first.acquire()
+    second.release()
+
+def test_purges_remove_only_what_is_past_its_time(app):
+    user = User(email="tester@gauntletai.com")
+    db.session.add(user)
+    db.session.flush()
+    db.session.add_all([
+        MagicLink(user_id=user.id, token="used", expires_at=NOW + timedelta(minutes=5), used_at=NOW),
+        MagicLink(user_id=user.id, token="expired", expires_at=NOW - timedelta(minutes=1)),
+        MagicLink(user_id=user.id, token="live", expires_at=NOW + timedelta(minutes=5)),
+    ])
+    epoch = (NOW - datetime(1970, 1, 1)).total_seconds()
+    db.session.add_all([
+        RateLimitBucket(key="idle", tokens=1, updated_at=epoch - 2 * 86400),
+        RateLimitBucket(key="busy", tokens=1, updated_at=epoch - 60),
+    ])
+    week_ago = NOW - timedelta(days=8)
+    db.session.add_all([
+        OutboundEmail(recipient="a@x.com", subject="s", body="", status='sent', created_at=week_ago),
+        OutboundEmail(recipient="b@x.com", subject="s", body="", status='failed', created_at=week_ago),
+        OutboundEmail(recipient="c@x.com", subject="s", body="link", status='pending', created_at=week_ago),
+        OutboundEmail(recipient="d@x.com", subject="s", body="", status='sent', created_at=NOW - timedelta(days=1)),
+    ])
+
+    channel = Channel(name="general", creator_id=user.id)
+    gone = Channel(name="gone", creator_id=user.id, deleted_at=NOW - timedelta(days=8))
+    db.session.add_all([channel, gone])
+    db.session.flush()
+    db.session.add_all([
+        ChannelMembership(user_id=user.id, channel_id=channel.id),
+        ChannelMembership(user_id=user.id, channel_id=gone.id),
+    ])
+    old_tombstone = Message(channel_id=channel.id, user_id=user.id, content="a", deleted_at=NOW - timedelta(days=8))
+    new_tombstone = Message(channel_id=channel.id, user_id=user.id, content="b", deleted_at=NOW - timedelta(days=1))
+    live = Message(channel_id=channel.id, user_id=user.id, content="c")
+    in_gone = Message(channel_id=gone.id, user_id=user.id, content="d")
+    db.session.add_all([old_tombstone, new_tombstone, live, in_gone])
+    db.session.flush()
+    db.session.add_all([
+        MessageReaction(message_id=old_tombstone.id, user_id=user.id, emoji="👍"),
+        MessageReaction(message_id=in_gone.id, user_id=user.id, emoji="👍"),
+        MessageReaction(message_id=live.id, user_id=user.id, emoji="👍"),
+    ])
+    db.session.commit()
+    gone_id, live_id = gone.id, live.id
+
+    report = run_maintenance(app, now=NOW)
+    rows = {task["task"]: task.get("rows") for task in report["tasks"]}
+    assert rows["purge_magic_links"] == 2
+    assert rows["purge_rate_limit_buckets"] == 1
+    assert rows["purge_outbound_emails"] == 2
+    assert rows["purge_deleted_messages"] == 1
+    assert rows["purge_deleted_channels"] == 1
+
+    assert [link.token for link in MagicLink.query] == ["live"]
+    assert [bucket.key for bucket in RateLimitBucket.query] == ["busy"]
+    assert sorted(email.recipient for email in OutboundEmail.query) == ["c@x.com", "d@x.com"]
+    assert sorted(m.content for m in Message.query) == ["b", "c"]
+    assert [r.message_id for r in MessageReaction.query] == [live_id]
+    assert db.session.get(Channel, gone_id) is None
+    assert ChannelMembership.query.filter_by(channel_id=gone_id).count() == 0
+
+    # Nothing left to do on the next run
+    again = {task["task"]: task.get("rows") for task in run_maintenance(app, now=NOW)["tasks"]}
+    assert again["purge_deleted_messages"] == again["purge_deleted_channels"] == 0
+
+def test_report_lists_every_task_and_survives_failures(app, monkeypatch):
+    def broken():
+        raise RuntimeError("statistics unavailable")
+    monkeypatch.setattr(maintenance, 'analyze_tables', broken)
+
+    report = run_maintenance(app, now=NOW)
+    assert report["started_at"] == NOW.isoformat()
+    assert [task["task"] for task in report["tasks"]] == [
+        'rollup_analytics', 'purge_magic_links', 'purge_rate_limit_buckets', 'purge_outbound_emails',
+        'purge_deleted_messages',
+        'purge_deleted_channels', 'ensure_message_partitions', 'analyze',
+    ]
+    assert all(task["seconds"] >= 0 for task in report["tasks"])
+    assert report["tasks"][-1]["error"] == "statistics unavailable"
+    assert all("error" not in task for task in report["tasks"][:-1])
+
+    app.config['ADMIN_EMAILS'] = {"tester@gauntletai.com"}
+    user = User(email="tester@gauntletai.com")
+    db.session.add(user)
+    db.session.commit()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+    status = client.get('/api/ops/maintenance').get_json()
+    assert status["last_report"] == report
+    assert status["running"] is False
+
+OPS_URLS = ['/api/ops/caches', '/api/ops/maintenance', '/api/ops/mail', '/api/ops/rate-limits',
+            '/api/ops/admission', '/api/ops/profiles']
+
+def test_ops_endpoints_send_anonymous_callers_to_log_in(app):
+    client = app.test_client()
+    assert all(client.get(url).status_code == 302 for url in OPS_URLS)
+
+def test_ops_endpoints_are_admin_only(app):
+    app.config['ADMIN_EMAILS'] = {"admin@gauntletai.com"}
+    user = User(email="tester@gauntletai.com")
+    db.session.add(user)
+    db.session.commit()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+    assert all(client.get(url).status_code == 403 for url in OPS_URLS)
+    assert client.post('/api/ops/profile', json={"requests": 1}).status_code == 403
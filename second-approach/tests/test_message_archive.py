@@ -0,0 +1,144 @@
+# tests/test_message_archive.py
+
+import gzip
+import json
+import os
+from datetime import datetime
+
+import pytest
+from app import create_app, db
+from app.models import User, Message, MessageReaction
+from app.services import message_archive
+from app.services.message_archive import archive_month, archive_older_than, iter_archived_records
+
+MONTH = datetime(2020, 1, 1)
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setenv('MESSAGE_ARCHIVE_DIR', str(tmp_path / 'archive'))
+    app = create_app()
+    app.config['TESTING'] = True
+
+    with app.app_context():
+        db.create_all()
+        user = User(email="tester@gauntletai.com")
+        db.session.add(user)
+        db.session.commit()
+
+        client = app.test_client()
+        client.directory = app.config['MESSAGE_ARCHIVE_DIR']
+        client.user_id = user.id
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user.id)
+        client.channel_id = client.post('/api/channels', json={"name": "general"}).get_json()["channel_id"]
+        yield client
+        db.drop_all()
+
+def add_messages(client, count, day=10):
+    messages = [Message(channel_id=client.channel_id, user_id=client.user_id, content=f"old {i}",
+                        created_at=datetime(2020, 1, day, 12, i)) for i in range(count)]
+    db.session.add_all(messages)
+    db.session.commit()
+    return [m.id for m in messages]
+
+def archived_ids(client):
+    return [r["id"] for r in iter_archived_records(client.directory, client.channel_id, months=["2020-01"])]
+
+def test_archive_moves_old_months_out_and_history_reads_them(client):
+    ids = add_messages(client, 3)
+    db.session.add(MessageReaction(message_id=ids[0], user_id=client.user_id, emoji="👍"))
+    db.session.add(Message(channel_id=client.channel_id, user_id=client.user_id, content="recent"))
+    db.session.commit()
+
+    summaries = archive_older_than(client.directory, 12)
+    assert [s["month"] for s in summaries] == ["2020-01"]
+    assert summaries[0]["archived"] == 3
+    assert Message.query.filter(Message.id.in_(ids)).count() == 0
+    assert MessageReaction.query.count() == 0
+
+    assert client.get(f'/api/channels/{client.channel_id}/history').get_json()["months"] == ["2020-01"]
+    month = client.get(f'/api/channels/{client.channel_id}/history/2020-01').get_json()["messages"]
+    assert [m["id"] for m in month] == ids
+    assert month[0]["reactions"] == {"👍": {"count": 1, "users": [client.user_id]}}
+
+    export = client.get(f'/api/channels/{client.channel_id}/export').get_data(as_text=True).splitlines()
+    assert [json.loads(line)["content"] for line in export] == ["old 0", "old 1", "old 2", "recent"]
+
+def test_crash_before_deleting_resumes_without_exporting_again(client, monkeypatch):
+    ids = add_messages(client, 3)
+
+    def crash(*args):
+        raise KeyboardInterrupt
+    monkeypatch.setattr(message_archive, '_delete_in_batches', crash)
+    with pytest.raises(KeyboardInterrupt):
+        archive_month(client.directory, MONTH)
+    monkeypatch.undo()
+
+    # Files are complete and the rows are untouched; the next run only finishes the delete
+    assert Message.query.filter(Message.id.in_(ids)).count() == 3
+    summary = archive_month(client.directory, MONTH)
+    assert summary["archived"] == 3
+    assert archived_ids(client) == ids
+    assert Message.query.filter(Message.id.in_(ids)).count() == 0
+    assert not os.path.exists(os.path.join(client.directory, "2020-01", "pending.json"))
+
+def test_crash_between_delete_batches_finishes_the_rest(client, monkeypatch):
+    ids = add_messages(client, 3)
+    monkeypatch.setattr(message_archive, 'DELETE_BATCH_SIZE', 1)
+    original = message_archive._archived_ids
+    calls = []
+    def flaky(*args):
+        calls.append(args)
+        if len(calls) == 2:
+            raise KeyboardInterrupt
+        return original(*args)
+    monkeypatch.setattr(message_archive, '_archived_ids', flaky)
+    with pytest.raises(KeyboardInterrupt):
+        archive_month(client.directory, MONTH)
+    # The first batch was committed on its own
+    assert Message.query.filter(Message.id.in_(ids)).count() == 2
+
+    monkeypatch.setattr(message_archive, '_archived_ids', original)
+    archive_month(client.directory, MONTH)
+    assert archived_ids(client) == ids
+    assert Message.query.filter(Message.id.in_(ids)).count() == 0
+    with open(os.path.join(client.directory, "2020-01", "manifest.json")) as f:
+        assert json.load(f)["channel_counts"] == {str(client.channel_id): 3}
+
+def test_crash_while_appending_to_an_archived_month_rolls_back(client, monkeypatch):
+    first = add_messages(client, 2)
+    archive_month(client.directory, MONTH)
+    late = add_messages(client, 1, day=20)
+
+    original = message_archive._finish
+    def crash_after_append(*args):
+        original(*args)
+        raise KeyboardInterrupt
+    monkeypatch.setattr(message_archive, '_finish', crash_after_append)
+    with pytest.raises(KeyboardInterrupt):
+        archive_month(client.directory, MONTH)
+    monkeypatch.undo()
+
+    archive_month(client.directory, MONTH)
+    assert archived_ids(client) == first + late
+    with open(os.path.join(client.directory, "2020-01", "manifest.json")) as f:
+        assert json.load(f)["channel_counts"] == {str(client.channel_id): 3}
+
+def test_unmarked_leftovers_are_kept_unless_the_rows_still_exist(client):
+    ids = add_messages(client, 2)
+    month_dir = os.path.join(client.directory, "2020-01")
+    os.makedirs(month_dir)
+    leftover = os.path.join(month_dir, f"channel-{client.channel_id}.ndjson.gz")
+
+    # Every row is still in the database: the leftover is discarded and the month archived
+    with gzip.open(leftover, 'wt') as f:
+        f.write(json.dumps({"id": ids[0]}) + "\n")
+    archive_month(client.directory, MONTH)
+    assert archived_ids(client) == ids
+
+    # A leftover holding rows the database no longer has is the only copy
+    os.remove(os.path.join(month_dir, "manifest.json"))
+    add_messages(client, 1)
+    with pytest.raises(RuntimeError):
+        archive_month(client.directory, MONTH)
+    assert os.path.exists(leftover)
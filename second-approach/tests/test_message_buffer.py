@@ -0,0 +1,77 @@
+# tests/test_message_buffer.py
+
+import pytest
+from app import create_app, db
+from app.models import User, Message
+from app.services.message_buffer import message_buffer
+from app.services.poll_validators import bump_channel_seq
+
+@pytest.fixture
+def client():
+    app = create_app()
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    message_buffer.configure(capacity=3)
+
+    with app.app_context():
+        db.create_all()
+        user = User(email="tester@gauntletai.com")
+        db.session.add(user)
+        db.session.commit()
+
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user.id)
+        yield client
+        db.drop_all()
+    message_buffer.configure(capacity=200)
+
+def poll(client, channel_id, after=None):
+    query = f'?after={after}' if after else ''
+    return client.get(f'/api/channels/{channel_id}/messages{query}').get_json()
+
+def from_database(client, channel_id, after=None):
+    capacity, message_buffer.capacity = message_buffer.capacity, 0
+    try:
+        return poll(client, channel_id, after)
+    finally:
+        message_buffer.capacity = capacity
+
+def test_buffered_polls_match_the_database(client):
+    channel_id = client.post('/api/channels', json={"name": "general"}).get_json()["channel_id"]
+    ids = [client.post(f'/api/channels/{channel_id}/messages', json={"content": f"m{i}"}).get_json()["message_id"]
+           for i in range(2)]
+
+    first = poll(client, channel_id)
+    assert [m["content"] for m in first["messages"]] == ["m0", "m1"]
+    cursor = first["messages"][-1]["created_at"]
+
+    # Writes made by this process are applied in place
+    client.post(f'/api/messages/{ids[0]}/reactions', json={"emoji": "👍"})
+    client.post(f'/api/channels/{channel_id}/messages', json={"content": "m2"})
+    client.delete(f'/api/channels/{channel_id}/messages/{ids[1]}')
+    assert message_buffer.stats()["invalidations"] == 0
+    hits = message_buffer.stats()["hits"]
+    assert poll(client, channel_id) == from_database(client, channel_id)
+    assert poll(client, channel_id, cursor) == from_database(client, channel_id, cursor)
+    assert message_buffer.stats()["hits"] == hits + 2
+
+    # A write the buffer never saw (another worker) forces a reload
+    db.session.add(Message(channel_id=channel_id, user_id=1, content="elsewhere"))
+    bump_channel_seq(channel_id)
+    db.session.commit()
+    assert poll(client, channel_id, cursor) == from_database(client, channel_id, cursor)
+
+def test_cursor_before_the_window_reads_the_database(client):
+    channel_id = client.post('/api/channels', json={"name": "general"}).get_json()["channel_id"]
+    for i in range(5):
+        client.post(f'/api/channels/{channel_id}/messages', json={"content": f"m{i}"})
+
+    everything = poll(client, channel_id)
+    assert [m["content"] for m in everything["messages"]] == [f"m{i}" for i in range(5)]
+    cursor = everything["messages"][0]["created_at"]
+    assert poll(client, channel_id, cursor) == from_database(client, channel_id, cursor)
+
+    stats = message_buffer.stats()
+    assert stats["messages"] == 3
+    assert stats["hits"] == 0
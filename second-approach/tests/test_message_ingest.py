@@ -0,0 +1,94 @@
+# tests/test_message_ingest.py
+
+import json
+
+import pytest
+from app import create_app, db, ECHO_BOT_EMAIL
+from app.models import User, Message
+from app.services import message_ingest
+
+@pytest.fixture
+def app():
+    app = create_app()
+    app.config['TESTING'] = True
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    user = User(email="tester@gauntletai.com")
+    db.session.add(user)
+    db.session.commit()
+
+    client = app.test_client()
+    client.user_id = user.id
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+    client.channel_id = client.post('/api/channels', json={"name": "general"}).get_json()["channel_id"]
+    return client
+
+def test_bulk_results_follow_input_order(client):
+    resp = client.post(f'/api/channels/{client.channel_id}/messages/bulk', json={"messages": [
+        {"content": "first", "created_at": "2024-01-01T10:00:00Z"},
+        {"content": "  "},
+        "not an object",
+        {"content": "second", "created_at": "yesterday"},
+        {"content": "third"},
+    ]})
+    data = resp.get_json()
+    assert resp.status_code == 200
+    assert (data["inserted"], data["failed"]) == (2, 3)
+    assert [r["index"] for r in data["results"]] == [0, 1, 2, 3, 4]
+    assert [r.get("error") for r in data["results"]] == [
+        None, "Message content cannot be empty", "Item must be an object", "Invalid timestamp format", None
+    ]
+    first = db.session.get(Message, data["results"][0]["id"])
+    assert first.content == "first"
+    assert first.created_at.isoformat() == "2024-01-01T10:00:00"
+    assert first.user_id == client.user_id
+
+def test_bulk_cannot_post_as_someone_else(client):
+    bot_id = client.application.config['BOT_USER_ID']
+    resp = client.post(f'/api/channels/{client.channel_id}/messages/bulk', json={"messages": [
+        {"content": "hi", "user_email": ECHO_BOT_EMAIL},
+        {"content": "hi", "user_email": "tester@gauntletai.com"},
+    ]})
+    assert all(r["error"] == "Not authorized to set user_email" for r in resp.get_json()["results"])
+    assert Message.query.filter_by(user_id=bot_id).count() == 0
+
+def test_bulk_is_capped(client):
+    client.application.config['BULK_MAX_MESSAGES'] = 2
+    resp = client.post(f'/api/channels/{client.channel_id}/messages/bulk',
+                       json={"messages": [{"content": "x"}] * 3})
+    assert resp.status_code == 400
+    assert Message.query.count() == 0
+
+def test_import_cli_creates_authors_with_their_batch(app, client, tmp_path, monkeypatch):
+    path = tmp_path / "history.ndjson"
+    path.write_text("\n".join(json.dumps(item) for item in [
+        {"content": "a", "user_email": "alice@example.com"},
+        {"content": "b", "user_email": "bob@example.com"},
+        {"content": "c", "user_email": ECHO_BOT_EMAIL},
+        {"content": "d"},
+    ]))
+    runner = app.test_cli_runner()
+
+    # A batch that fails to insert leaves no accounts behind
+    def fail(*args):
+        raise RuntimeError("disk full")
+    monkeypatch.setattr(message_ingest, 'bump_channel_seq', fail)
+    result = runner.invoke(args=['import-messages', str(client.channel_id), str(path), '--create-users'])
+    assert json.loads(result.output.splitlines()[-1])["inserted"] == 0
+    assert User.query.filter(User.email.in_(["alice@example.com", "bob@example.com"])).count() == 0
+    monkeypatch.undo()
+
+    result = runner.invoke(args=['import-messages', str(client.channel_id), str(path),
+                                 '--create-users', '--batch-size', '1'])
+    summary = json.loads(result.output.splitlines()[-1])
+    assert (summary["inserted"], summary["failed"]) == (3, 1)
+    assert "item 2: Messages can't be attributed to the bot" in result.output
+    authors = [m.author.email for m in Message.query.order_by(Message.id)]
+    assert authors == ["alice@example.com", "bob@example.com", "tester@gauntletai.com"]
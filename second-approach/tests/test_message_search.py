@@ -0,0 +1,104 @@
+# tests/test_message_search.py
+
+from datetime import datetime
+
+import pytest
+from sqlalchemy import text
+from app import create_app, db
+from app.models import User, Channel, ChannelMembership, Message
+
+@pytest.fixture
+def client():
+    app = create_app()
+    app.config['TESTING'] = True
+
+    with app.app_context():
+        db.create_all()
+        user = User(email="tester@gauntletai.com")
+        db.session.add(user)
+        db.session.commit()
+
+        client = app.test_client()
+        client.user_id = user.id
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user.id)
+        client.channel_id = client.post('/api/channels', json={"name": "general"}).get_json()["channel_id"]
+        yield client
+        db.drop_all()
+
+def post(client, *contents):
+    messages = [Message(channel_id=client.channel_id, user_id=client.user_id, content=c) for c in contents]
+    db.session.add_all(messages)
+    db.session.commit()
+    return [m.id for m in messages]
+
+def search(client, q, **params):
+    resp = client.get('/api/search', query_string=dict(q=q, **params))
+    assert resp.status_code == 200
+    return resp.get_json()
+
+def test_results_are_ranked_and_scoped_to_your_channels(client):
+    weak, strong, _ = post(client,
+        "the deploy went out along with a long list of other unrelated changes today",
+        "deploy deploy deploy",
+        "nothing to see here")
+    other = User(email="other@gauntletai.com")
+    db.session.add(other)
+    db.session.flush()
+    private = Channel(name="private", creator_id=other.id)
+    db.session.add(private)
+    db.session.flush()
+    db.session.add(ChannelMembership(user_id=other.id, channel_id=private.id))
+    db.session.add(Message(channel_id=private.id, user_id=other.id, content="deploy secrets"))
+    db.session.commit()
+
+    results = search(client, "deploying")["results"]
+    assert [r["id"] for r in results] == [strong, weak]
+    assert results[0]["score"] > results[1]["score"]
+    assert results[0]["user_email"] == "tester@gauntletai.com"
+
+    assert client.get('/api/search', query_string={"q": "deploy", "channel_id": private.id}).status_code == 403
+    assert search(client, "deploy", channel_id=client.channel_id)["results"][0]["id"] == strong
+
+def test_keyset_pages_cover_every_hit_once(client):
+    ids = post(client, *[f"release {'note ' * i}" for i in range(7)])
+    everything = [r["id"] for r in search(client, "release", limit=100)["results"]]
+    assert sorted(everything) == sorted(ids)
+
+    pages, cursor = [], None
+    while True:
+        params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+        data = search(client, "release", **params)
+        pages.append([r["id"] for r in data["results"]])
+        cursor = data["next_cursor"]
+        if cursor is None:
+            break
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert sum(pages, []) == everything
+
+    assert client.get('/api/search', query_string={"q": "release", "cursor": "garbage"}).status_code == 400
+
+def test_snippets_are_escaped_around_the_highlight(client):
+    post(client, '<script>alert("x")</script> & the rollout plan')
+    snippet = search(client, "rollout")["results"][0]["snippet"]
+    assert "<script>" not in snippet
+    assert "&lt;script&gt;" in snippet
+    assert "&amp;" in snippet
+    assert "<mark>rollout</mark>" in snippet
+
+    # Query syntax in user input is treated as plain words
+    assert search(client, 'rollout OR "NEAR(')["results"] == []
+    assert search(client, '"rollout"')["results"]
+
+def test_index_follows_edits_deletes_and_soft_deletes(client):
+    edited, removed, hidden = post(client, "draft agenda", "agenda item two", "agenda item three")
+
+    db.session.get(Message, edited).content = "final minutes"
+    db.session.commit()
+    db.session.execute(text("DELETE FROM messages WHERE id = :id"), {"id": removed})
+    db.session.get(Message, hidden).deleted_at = datetime.utcnow()
+    db.session.commit()
+
+    assert search(client, "agenda")["results"] == []
+    assert [r["id"] for r in search(client, "minutes")["results"]] == [edited]
+    assert db.session.execute(text("SELECT count(*) FROM messages_fts WHERE messages_fts MATCH 'agenda'")).scalar() == 1
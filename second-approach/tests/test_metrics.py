@@ -0,0 +1,28 @@
+# tests/test_metrics.py
+
+import pytest
+from app import create_app, db
+
+@pytest.fixture
+def app():
+    app = create_app()
+    app.config['TESTING'] = True
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+def test_metrics_are_hidden_without_a_token(app):
+    app.config['METRICS_TOKEN'] = None
+    assert app.test_client().get('/metrics').status_code == 404
+
+def test_metrics_require_the_bearer_token(app):
+    app.config['METRICS_TOKEN'] = 's3cret'
+    client = app.test_client()
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+
+    resp = client.get('/metrics', headers={'Authorization': 'Bearer s3cret'})
+    assert resp.status_code == 200
+    assert 'chat_http_request_duration_seconds' in resp.get_data(as_text=True)
@@ -0,0 +1,79 @@
+# tests/test_poll_validators.py
+
+import pytest
+from app import create_app, db
+from app.models import User
+
+@pytest.fixture
+def client():
+    app = create_app()
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+
+    with app.app_context():
+        db.create_all()
+        user = User(email="tester@gauntletai.com")
+        db.session.add(user)
+        db.session.commit()
+
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user.id)
+        yield client
+        db.drop_all()
+
+def poll(client, url, etag=None):
+    headers = {'If-None-Match': etag} if etag else {}
+    return client.get(url, headers=headers)
+
+def test_repeated_poll_is_not_modified(client):
+    channel_id = client.post('/api/channels', json={"name": "general"}).get_json()["channel_id"]
+    client.post(f'/api/channels/{channel_id}/messages', json={"content": "hello"})
+    url = f'/api/channels/{channel_id}/messages'
+
+    first = poll(client, url)
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+    assert etag.startswith('W/')
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+
+    again = poll(client, url, etag)
+    assert again.status_code == 304
+    assert again.get_data() == b''
+    assert again.headers['ETag'] == etag
+
+    # The query string is part of the validator
+    assert poll(client, url + '?after=2000-01-01T00:00:00', etag).status_code == 200
+
+def test_every_write_changes_the_etag(client):
+    channel_id = client.post('/api/channels', json={"name": "general"}).get_json()["channel_id"]
+    url = f'/api/channels/{channel_id}/messages'
+    seen = [poll(client, url).headers['ETag']]
+
+    def changed():
+        resp = poll(client, url, seen[-1])
+        assert resp.status_code == 200
+        assert resp.headers['ETag'] not in seen
+        seen.append(resp.headers['ETag'])
+        assert poll(client, url, seen[-1]).status_code == 304
+        return resp.get_json()
+
+    message_id = client.post(url, json={"content": "hello"}).get_json()["message_id"]
+    assert [m["content"] for m in changed()["messages"]] == ["hello"]
+
+    client.post(f'/api/messages/{message_id}/reactions', json={"emoji": "👍"})
+    assert changed()["messages"][0]["reactions"] != []
+
+    client.delete(f'/api/messages/{message_id}/reactions/👍')
+    changed()
+
+    client.delete(f'{url}/{message_id}')
+    assert changed()["deleted_message_ids"] == [message_id]
+
+def test_channel_list_etag_follows_new_messages(client):
+    channel_id = client.post('/api/channels', json={"name": "general"}).get_json()["channel_id"]
+    etag = poll(client, '/api/channels').headers['ETag']
+    assert poll(client, '/api/channels', etag).status_code == 304
+
+    client.post(f'/api/channels/{channel_id}/messages', json={"content": "hello"})
+    assert poll(client, '/api/channels', etag).status_code == 200
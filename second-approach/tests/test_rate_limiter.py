@@ -0,0 +1,136 @@
+# tests/test_rate_limiter.py
+
+import time
+
+import pytest
+from app import create_app, db
+from app.models import User, Channel, ChannelMembership
+from app.services.admission import admission, DEFAULT_POOLS
+from app.services.channel_flags import bot_dm_flags
+from app.services.rate_limiter import MemoryBackend, DatabaseBackend, RateLimiter, rate_limiter
+
+def test_bucket_refills_at_its_rate():
+    backend = MemoryBackend()
+    # 1 token per second, bursts of 2
+    assert backend.take("k", 1.0, 2, now=100.0) == 0
+    assert backend.take("k", 1.0, 2, now=100.0) == 0
+    assert backend.take("k", 1.0, 2, now=100.0) == pytest.approx(1.0)
+    assert backend.take("k", 1.0, 2, now=100.5) == pytest.approx(0.5)
+    assert backend.take("k", 1.0, 2, now=101.0) == 0
+    # A long idle period refills only up to capacity
+    assert backend.take("k", 1.0, 2, now=200.0) == 0
+    assert backend.take("k", 1.0, 2, now=200.0) == 0
+    assert backend.take("k", 1.0, 2, now=200.0) > 0
+
+def check_user_and_ip_buckets(limiter):
+    limiter.configure({'post': ('1/minute', '2/minute'), 'bot': ('5/minute', None)}, backend=limiter.backend)
+
+    assert limiter.check('post', user_id=1, ip='10.0.0.1') == 0
+    assert limiter.check('post', user_id=2, ip='10.0.0.1') == 0
+    # The shared IP is spent; user 3 is refused without losing its own token
+    assert limiter.check('post', user_id=3, ip='10.0.0.1') == pytest.approx(30, abs=1)
+    assert limiter.check('post', user_id=3, ip='10.0.0.2') == 0
+    # User 1 is refused by its own bucket and doesn't spend the new IP's tokens
+    assert limiter.check('post', user_id=1, ip='10.0.0.3') > 0
+    assert limiter.check('post', user_id=4, ip='10.0.0.3') == 0
+    assert limiter.check('post', user_id=5, ip='10.0.0.3') == 0
+
+    # A later limit refusing refunds the earlier one
+    assert limiter.check(['bot', 'post'], user_id=6, ip='10.0.0.1') > 0
+    for _ in range(5):
+        assert limiter.check('bot', user_id=6) == 0
+    assert limiter.check('bot', user_id=6) > 0
+
+    assert limiter.stats()["allowed"] == 10
+    assert limiter.stats()["limited"] == {'post': 3, 'bot': 1}
+
+def test_user_and_ip_buckets_in_memory():
+    check_user_and_ip_buckets(RateLimiter())
+
+@pytest.fixture
+def app():
+    app = create_app()
+    app.config['TESTING'] = True
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+def test_user_and_ip_buckets_in_database(app):
+    limiter = RateLimiter()
+    limiter.set_backend(DatabaseBackend())
+    check_user_and_ip_buckets(limiter)
+
+def test_backend_errors_fail_open(caplog):
+    class Broken:
+        def take(self, *args):
+            raise ConnectionError("store is down")
+
+    limiter = RateLimiter()
+    limiter.configure({'post': ('1/minute', None)}, backend=Broken())
+    assert limiter.check('post', user_id=1) == 0
+    assert limiter.check('post', user_id=1) == 0
+    assert "allowing request" in caplog.text
+
+def test_over_limit_requests_get_429_with_retry_after(app):
+    user = User(email="tester@gauntletai.com")
+    db.session.add(user)
+    db.session.commit()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+    channel_id = client.post('/api/channels', json={"name": "general"}).get_json()["channel_id"]
+
+    rate_limiter.configure({'message_bulk': ('1/minute', None)}, backend=MemoryBackend())
+    url = f'/api/channels/{channel_id}/messages/bulk'
+    assert client.post(url, json={"messages": [{"content": "a"}]}).status_code == 200
+    resp = client.post(url, json={"messages": [{"content": "b"}]})
+    assert resp.status_code == 429
+    assert resp.headers['Retry-After'] == '60'
+
+def test_rejected_and_shed_bot_messages_cost_nothing(app):
+    user = User(email="tester@gauntletai.com")
+    db.session.add(user)
+    db.session.flush()
+    channel = Channel(creator_id=user.id, is_dm=True, is_bot_dm=True)
+    db.session.add(channel)
+    db.session.flush()
+    db.session.add_all([
+        ChannelMembership(user_id=user.id, channel_id=channel.id),
+        ChannelMembership(user_id=app.config['BOT_USER_ID'], channel_id=channel.id),
+    ])
+    db.session.commit()
+    # As create_channel does; the per-process flag cache may remember this id from another test
+    bot_dm_flags.remember(channel.id, True)
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+    url = f'/api/channels/{channel.id}/messages'
+
+    rate_limiter.configure({'message_post': ('1/minute', None), 'bot_message': ('1/minute', None)}, backend=MemoryBackend())
+    try:
+        assert client.post(url, json={}).status_code == 400
+        assert client.post(url, json={"content": "   "}).status_code == 400
+        admission.configure({'bot_generation': (0, 0, 1.0)})
+        assert client.post(url, json={"content": "hello?"}).status_code == 503
+        assert client.post(url, json={"content": "hello?"}).status_code == 503
+
+        # Still one of each token left for the request that is actually served
+        admission.configure(DEFAULT_POOLS)
+        assert client.post(url, json={"content": "hello?"}).status_code == 201
+        assert client.post(url, json={"content": "again?"}).status_code == 429
+    finally:
+        admission.configure(DEFAULT_POOLS)
+
+def test_check_overhead_in_memory():
+    limiter = RateLimiter()
+    limiter.configure({'post': ('1000000/second', '1000000/second')})
+    rounds = 20000
+    started = time.perf_counter()
+    for i in range(rounds):
+        limiter.check('post', user_id=i % 100, ip='10.0.0.1')
+    per_check = (time.perf_counter() - started) / rounds
+    print(f"rate limiter check: {per_check * 1e6:.2f}us")
+    # Generous bound so slow CI machines pass; typically a few microseconds
+    assert per_check < 50e-6
@@ -0,0 +1,121 @@
+# tests/test_single_flight.py
+
+import threading
+import time
+
+import pytest
+from app.services.single_flight import SingleFlight, normalize_question
+
+
+class FakeUpstream:
+    """Stands in for the embedding + search + completion round trip"""
+
+    def __init__(self, delay=0.2):
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def answer(self, question):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        return f"answer to {question}"
+
+
+def ask_concurrently(flights, upstream, questions):
+    """What create_message does: one blocking call per request thread"""
+    results = []
+
+    def ask(question):
+        results.append(flights.do(normalize_question(question), lambda: upstream.answer(question)))
+
+    threads = [threading.Thread(target=ask, args=(q,)) for q in questions]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_identical_questions_share_one_upstream_call():
+    flights = SingleFlight('test')
+    upstream = FakeUpstream()
+    questions = ["When is the launch?", "when is the launch", "  WHEN is   the launch?? "] * 8
+
+    results = ask_concurrently(flights, upstream, questions)
+
+    assert upstream.calls == 1
+    assert len(results) == len(questions)
+    assert len(set(results)) == 1
+    assert flights.in_flight() == 0
+
+
+def test_different_questions_are_not_coalesced():
+    flights = SingleFlight('test')
+    upstream = FakeUpstream(delay=0.05)
+    ask_concurrently(flights, upstream, ["What is the refund policy?", "Who owns billing?"])
+    assert upstream.calls == 2
+
+
+def test_errors_reach_every_waiter_and_the_key_is_released():
+    flights = SingleFlight('test')
+    errors = []
+
+    def failing():
+        time.sleep(0.05)
+        raise RuntimeError("upstream down")
+
+    def ask():
+        try:
+            flights.do("q", failing)
+        except RuntimeError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=ask) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(errors) == 5
+    assert flights.in_flight() == 0
+    assert flights.do("q", lambda: "recovered") == "recovered"
+    with pytest.raises(ValueError):
+        flights.do("q", lambda: int("x"))
+
+
+def test_followers_of_an_aborted_leader_get_an_ordinary_error():
+    class Aborted(BaseException):
+        pass
+
+    flights = SingleFlight('test')
+    started = threading.Event()
+    errors = []
+
+    def leader():
+        def call():
+            started.set()
+            time.sleep(0.1)
+            raise Aborted()
+        try:
+            flights.do("q", call)
+        except Aborted:
+            pass
+
+    def follower():
+        try:
+            flights.do("q", lambda: "not the leader")
+        except RuntimeError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=leader)]
+    threads[0].start()
+    started.wait()
+    threads += [threading.Thread(target=follower) for _ in range(3)]
+    for thread in threads[1:]:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(errors) == 3
+    assert flights.in_flight() == 0